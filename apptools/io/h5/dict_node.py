@@ -1,7 +1,7 @@
-from contextlib import closing
+from contextlib import closing, contextmanager
 import json
 
-from numpy import ndarray
+from numpy import asarray, ndarray
 
 from tables import Group as PyTablesGroup
 from tables.nodes import filenode
@@ -12,6 +12,49 @@ ARRAY_PROXY_KEY = '__array__'
 NODE_KEY = 'node_name'
 
 
+class LazyArray(object):
+    """ Read-only view of an array stored in an H5 array node.
+
+    Data is only read when the view is sliced or converted to an array.
+
+    Parameters
+    ----------
+    pyt_node : PyTables Array
+        The node where the array is stored.
+    """
+
+    def __init__(self, pyt_node):
+        self._pyt_node = pyt_node
+
+    def __getitem__(self, key):
+        return self._pyt_node[key]
+
+    def __len__(self):
+        return len(self._pyt_node)
+
+    def __array__(self, dtype=None):
+        return asarray(self.read(), dtype=dtype)
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(type(self).__name__, self._pyt_node)
+
+    @property
+    def dtype(self):
+        return self._pyt_node.dtype
+
+    @property
+    def shape(self):
+        return self._pyt_node.shape
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def read(self):
+        """ Return the whole array. """
+        return self._pyt_node.read()
+
+
 class H5DictNode(object):
     """ Dictionary-like node interface.
 
@@ -20,7 +63,15 @@ class H5DictNode(object):
     different data types.
 
     Note that this is implemented using a group-node assuming that arrays are
-    valid inputs and will be stored as H5 array nodes.
+    valid inputs and will be stored as H5 array nodes. Arrays are only read
+    when their key is first accessed; use `lazy_array` to read slices of an
+    array without loading it. Until then, the array values of `data` are
+    `LazyArray` views rather than arrays.
+
+    The writes triggered by `auto_flush` rewrite the arrays whose key was
+    set, and the arrays handed out by `node[key]` or set, which may have been
+    changed in place since. The arrays not read yet are never rewritten.
+    `flush()` writes all the arrays which were read or set.
 
     Parameters
     ----------
@@ -28,12 +79,17 @@ class H5DictNode(object):
         Group node which will be used as a dictionary store.
     auto_flush : bool
         If True, write data to disk whenever the dict data is altered.
-        Otherwise, call `flush()` explicitly to write data to disk.
+        Otherwise, call `flush()` explicitly to write data to disk. Use
+        `batch()` to write a series of changes at once.
     """
 
     #: Name of filenode where dict data is stored.
     _pyobject_data_node = '_pyobject_data'
 
+    #: Name of filenode where new dict data is written before it replaces
+    #: `_pyobject_data_node`.
+    _pyobject_new_data_node = '_pyobject_new_data'
+
     def __init__(self, h5_group, auto_flush=True):
         assert self.is_dict_node(h5_group)
 
@@ -41,6 +97,15 @@ class H5DictNode(object):
         self._h5_group = h5_group
         self.auto_flush = auto_flush
 
+        # Keys set or deleted since the data was last written, or None if all
+        # the data must be written.
+        self._dirty = set()
+        # Keys of the arrays handed out or set, which are written with any
+        # change since they may have been changed in place.
+        self._shared_arrays = set()
+        # Number of nested `batch` contexts.
+        self._batch_depth = 0
+
         # Load dict data from the file node.
         dict_node = getattr(h5_group, self._pyobject_data_node)
         with closing(filenode.open_node(dict_node)) as f:
@@ -53,17 +118,25 @@ class H5DictNode(object):
     #--------------------------------------------------------------------------
 
     def __getitem__(self, key):
-        return self.data[key]
+        value = self.data[key]
+        if isinstance(value, LazyArray):
+            value = self.data[key] = value.read()
+        if isinstance(value, ndarray):
+            self._shared_arrays.add(key)
+        return value
 
     def __setitem__(self, key, value):
         self.data[key] = value
-        if self.auto_flush:
-            self.flush()
+        if isinstance(value, ndarray):
+            self._shared_arrays.add(key)
+        else:
+            self._shared_arrays.discard(key)
+        self._set_dirty(key)
 
     def __delitem__(self, key):
         del self.data[key]
-        if self.auto_flush:
-            self.flush()
+        self._shared_arrays.discard(key)
+        self._set_dirty(key)
 
     def __contains__(self, key):
         return key in self.data
@@ -77,18 +150,67 @@ class H5DictNode(object):
 
     @property
     def data(self):
+        """ The dict data, where the arrays not read yet are `LazyArray`
+        values. Setting it writes all the data with `auto_flush`.
+        """
         return self._pyobject_data
 
     @data.setter
     def data(self, new_data_dict):
         self._pyobject_data = new_data_dict
-        if self.auto_flush:
-            self.flush()
+        self._shared_arrays = set(
+            key for key, value in new_data_dict.items()
+            if isinstance(value, ndarray)
+        )
+        self._set_dirty(None)
+
+    def lazy_array(self, key):
+        """ Return the array for `key` as a `LazyArray`, unless it was
+        already read or set, in which case the array itself is returned.
+        """
+        value = self.data[key]
+        if not isinstance(value, (LazyArray, ndarray)):
+            msg = "Value for {0!r} is not an array"
+            raise TypeError(msg.format(key))
+        if isinstance(value, ndarray):
+            self._shared_arrays.add(key)
+        return value
 
     def flush(self):
-        """ Write buffered data to disk. """
-        self._remove_pyobject_node()
-        self._write_pyobject_node()
+        """ Write buffered data to disk, including all the arrays which
+        were read or set.
+        """
+        self._dirty = None
+        self._write_changes()
+
+    @contextmanager
+    def batch(self):
+        """ Context manager deferring writes until the end of the block.
+
+        With `auto_flush`, the changes made in the block are written at once
+        when it exits: the dict data is serialized once and only the arrays
+        which were set are rewritten. If the block raises an exception, the
+        keys set or deleted in the block are restored and nothing is written.
+        """
+        data = self._pyobject_data
+        saved_data = dict(data)
+        saved_dirty = None if self._dirty is None else set(self._dirty)
+
+        self._batch_depth += 1
+        try:
+            yield self
+        except:
+            data.clear()
+            data.update(saved_data)
+            self._pyobject_data = data
+            self._dirty = saved_dirty
+            raise
+        finally:
+            self._batch_depth -= 1
+
+        if self.auto_flush and self._batch_depth == 0 and \
+                self._dirty != set():
+            self._write_changes()
 
     @classmethod
     def add_to_h5file(cls, h5, node_path, data=None, **kwargs):
@@ -106,6 +228,9 @@ class H5DictNode(object):
         h5.create_group(node_path)
         group = h5[node_path]
 
+        if data is not None:
+            # The array values moved to the new nodes are replaced.
+            data = dict(data)
         cls._create_pyobject_node(h5._h5, node_path, data=data)
         return cls(group, **kwargs)
 
@@ -151,28 +276,62 @@ class H5DictNode(object):
         """
         if ARRAY_PROXY_KEY in dct:
             node_name = dct[NODE_KEY]
-            return getattr(self._h5_group, node_name)[:]
+            return LazyArray(getattr(self._h5_group, node_name))
         return dct
 
+    def _set_dirty(self, key):
+        """ Record that `key` changed, or all the data if `key` is None, and
+        write the changes if needed.
+        """
+        if key is None:
+            self._dirty = None
+        elif self._dirty is not None:
+            self._dirty.add(key)
+
+        if self.auto_flush and self._batch_depth == 0:
+            self._write_changes()
+
+    def _write_changes(self):
+        """ Write the dict data and the arrays which changed to disk. """
+        array_keys = self._dirty
+        if array_keys is not None:
+            array_keys = array_keys | self._shared_arrays
+        self._write_pyobject_node(array_keys)
+        self._dirty = set()
+
     def _remove_pyobject_node(self):
         node = getattr(self._h5_group, self._pyobject_data_node)
         node._f_remove()
 
-    def _write_pyobject_node(self):
-        pyt_file = self._h5_group._v_file
-        node_path = self._h5_group._v_pathname
-        self._create_pyobject_node(pyt_file, node_path, self.data)
+    def _write_pyobject_node(self, array_keys=None):
+        """ Write the dict data to a new filenode, which then replaces the
+        current one: the dict is kept if the data can't be written.
+        """
+        group = self._h5_group
+        new_name = self._pyobject_new_data_node
+        self._create_pyobject_node(group._v_file, group._v_pathname,
+                                   self.data, array_keys, name=new_name)
+        self._remove_pyobject_node()
+        getattr(group, new_name)._f_rename(self._pyobject_data_node)
 
     @classmethod
-    def _create_pyobject_node(cls, pyt_file, node_path, data=None):
+    def _create_pyobject_node(cls, pyt_file, node_path, data=None,
+                              array_keys=None, name=None):
         if data is None:
             data = {}
+        if name is None:
+            name = cls._pyobject_data_node
 
         # Stash the array values in their own h5 nodes and return a dictionary
         # which is appropriate for JSON serialization.
-        out_data = cls._handle_array_values(pyt_file, node_path, data)
-
-        kwargs = dict(where=node_path, name=cls._pyobject_data_node)
+        out_data = cls._handle_array_values(pyt_file, node_path, data,
+                                            array_keys)
+
+        group = pyt_file.get_node(node_path)
+        if name in group:
+            # Left over by a write which failed.
+            pyt_file.remove_node(group, name)
+        kwargs = dict(where=node_path, name=name)
         with closing(filenode.new_node(pyt_file, **kwargs)) as f:
             f.write(json.dumps(out_data).encode('ascii'))
 
@@ -199,22 +358,53 @@ class H5DictNode(object):
         return {ARRAY_PROXY_KEY: True, NODE_KEY: key}
 
     @classmethod
-    def _handle_array_values(cls, pyt_file, group_path, data):
+    def _handle_array_values(cls, pyt_file, group_path, data,
+                             array_keys=None):
+        """ Stores the array values of `data` as H5 nodes and returns the
+        data with array proxies, for JSON serialization.
+
+        Only the arrays for `array_keys` are written, and those which have no
+        node yet. All of them are written if `array_keys` is None. Arrays
+        which were not read from their node are never rewritten, but those
+        read from the node of another key are written under their key and
+        replaced in `data` by a `LazyArray` on their new node.
+        """
         group = pyt_file.get_node(group_path)
 
+        # Read the arrays to move before any node is replaced or removed.
+        moved = {}
+        for key, value in data.items():
+            if isinstance(value, LazyArray):
+                pyt_node = value._pyt_node
+                if pyt_node._v_parent is not group or \
+                        pyt_node._v_name != key:
+                    moved[key] = value.read()
+
         # Convert numpy array values to H5 array nodes.
         out_data = {}
         for key in data.keys():
             value = data[key]
-            if isinstance(value, ndarray):
-                out_data[key] = cls._array_proxy(pyt_file, group, key, value)
+            if key in moved:
+                out_data[key] = cls._array_proxy(pyt_file, group, key,
+                                                 moved[key])
+                data[key] = LazyArray(getattr(group, key))
+            elif isinstance(value, LazyArray):
+                out_data[key] = {ARRAY_PROXY_KEY: True, NODE_KEY: key}
+            elif isinstance(value, ndarray):
+                if array_keys is None or key in array_keys or \
+                        key not in group:
+                    out_data[key] = cls._array_proxy(pyt_file, group, key,
+                                                     value)
+                else:
+                    out_data[key] = {ARRAY_PROXY_KEY: True, NODE_KEY: key}
             else:
                 out_data[key] = value
 
         # Remove stored arrays which are no longer in the data dictionary.
         pyt_children = group._v_children
-        for key in pyt_children.keys():
-            if key not in data:
+        data_nodes = (cls._pyobject_data_node, cls._pyobject_new_data_node)
+        for key in list(pyt_children.keys()):
+            if key not in data and key not in data_nodes:
                 pyt_file.remove_node(group, key)
 
         return out_data
@@ -1,4 +1,4 @@
-from collections import Mapping, MutableMapping
+from collections import Mapping, MutableMapping, namedtuple
 from functools import partial
 
 import numpy as np
@@ -8,12 +8,100 @@ from .dict_node import H5DictNode
 from .table_node import H5TableNode
 
 
+#: Name of the group attribute selecting the compression profile of the
+#: arrays created in the group and its subgroups.
+PROFILE_ATTR = 'compression_profile'
+
+#: Compression and chunking settings for `H5File.create_array`: the PyTables
+#: `Filters`, the target size of a chunk in bytes (None for PyTables'
+#: automatic chunk shape) and the default access pattern the chunk shape is
+#: chosen for (see `get_chunkshape`).
+CompressionProfile = namedtuple('CompressionProfile',
+                                ['filters', 'chunk_bytes', 'access'])
+
+
+def _blosc_filters(compressor, complevel):
+    """ Return shuffled Blosc `Filters` using the given compressor, or
+    Blosc's default one if PyTables was built without it.
+    """
+    complib = 'blosc:' + compressor
+    if complib not in getattr(tables.filters, 'all_complibs', ()):
+        complib = 'blosc'
+    return tables.Filters(complib=complib, complevel=complevel, shuffle=True)
+
+
+#: The named compression profiles; more can be added. Profiles using a Blosc
+#: compressor missing from the PyTables build fall back to Blosc's default.
+COMPRESSION_PROFILES = {
+    # The default filters of `H5File`, with automatic chunk shapes.
+    'default': CompressionProfile(
+        tables.Filters(complib='blosc', complevel=5, shuffle=True),
+        None, None),
+    # Cheap compression and large chunks, for data written once in bulk.
+    'fast-write': CompressionProfile(
+        _blosc_filters('lz4', 1), 2 ** 22, 'rows'),
+    # Strong compression, for archives.
+    'small-file': CompressionProfile(
+        _blosc_filters('zstd', 9), 2 ** 20, 'rows'),
+    # Small chunks of balanced shape, so that reading a small region only
+    # decompresses a little data.
+    'random-access': CompressionProfile(
+        _blosc_filters('lz4', 5), 2 ** 16, 'blocks'),
+}
+
+
 def get_atom(dtype):
     """ Return a PyTables Atom for the given dtype or dtype string.
     """
     return tables.Atom.from_dtype(np.dtype(dtype))
 
 
+def get_chunkshape(shape, dtype, access='rows', chunk_bytes=2 ** 20):
+    """ Return a chunk shape suited to how an array is read.
+
+    Parameters
+    ----------
+    shape : tuple
+        Shape of the array. A dimension of 0 (e.g. the first dimension of an
+        extendable array) is treated as unbounded.
+    dtype : str or numpy.dtype
+        Data type of the array.
+    access : str
+        How the array is mostly read:
+
+            'rows' : Ranges of rows, e.g. `array[i:j]`, or whole scans.
+            'columns' : Slices along the first axis, e.g. `array[:, j]`.
+            'blocks' : Small regions anywhere in the array.
+
+    chunk_bytes : int
+        Approximate size of a chunk in bytes.
+    """
+    if len(shape) == 0:
+        raise ValueError("Scalar arrays can't be chunked.")
+
+    items = max(1, chunk_bytes // np.dtype(dtype).itemsize)
+    if access == 'blocks':
+        side = max(1, int(round(items ** (1.0 / len(shape)))))
+        return tuple(min(dim, side) if dim > 0 else side for dim in shape)
+
+    if access == 'rows':
+        # Fill the chunk with whole rows: start with the last axis.
+        axes = range(len(shape) - 1, -1, -1)
+    elif access == 'columns':
+        # Fill the chunk along the first axis.
+        axes = range(len(shape))
+    else:
+        raise ValueError("Unknown access pattern {0!r}".format(access))
+
+    chunkshape = [1] * len(shape)
+    for axis in axes:
+        dim = shape[axis]
+        size = min(dim, items) if dim > 0 else items
+        chunkshape[axis] = max(1, size)
+        items = max(1, items // chunkshape[axis])
+    return tuple(chunkshape)
+
+
 def iterator_length(iterator):
     return sum(1 for _ in iterator)
 
@@ -59,9 +147,9 @@ class H5File(Mapping):
     auto_open : bool
         If True, open the file automatically on initialization. Otherwise,
         you can call `H5File.open()` explicitly after initialization.
-    chunked : bool
-        If True, the default behavior of `create_array` will be a chunked
-        array (see PyTables `create_carray`).
+    h5filters : tables.Filters
+        The filters of the chunked and extendable arrays created without a
+        compression profile. Defaults to blosc compression at level 5.
 
     """
     exists_error = ("'{}' exists in '{}'; set `delete_existing` attribute "
@@ -73,8 +161,9 @@ class H5File(Mapping):
         self.delete_existing = delete_existing
         self.auto_groups = auto_groups
         if h5filters is None:
-            self.h5filters = tables.Filters(complib='blosc', complevel=5,
-                                            shuffle=True)
+            h5filters = tables.Filters(complib='blosc', complevel=5,
+                                       shuffle=True)
+        self.h5filters = h5filters
         self._h5 = None
 
         if isinstance(filename, tables.File):
@@ -134,7 +223,8 @@ class H5File(Mapping):
             yield node_path, _wrap_node(node)
 
     def create_array(self, node_path, array_or_shape, dtype=None,
-                     chunked=False, extendable=False, **kwargs):
+                     chunked=False, extendable=False, profile=None,
+                     access=None, **kwargs):
         """Create node to store an array.
 
         Parameters
@@ -150,6 +240,18 @@ class H5File(Mapping):
             Controls whether the array is chunked.
         extendable : {None | bool}
             Controls whether the array is extendable.
+        profile : str or CompressionProfile
+            The compression profile of the array, or the name of one of
+            `COMPRESSION_PROFILES`. Defaults to the profile named by the
+            `PROFILE_ATTR` attribute of the nearest parent group which has
+            one (see `set_group_profile`). A profile implies a chunked array,
+            except for the scalar and empty arrays which only have the profile
+            of their group: these are stored as plain arrays.
+        access : str
+            How the array is mostly read, to choose its chunk shape with
+            `get_chunkshape`: 'rows', 'columns' or 'blocks'. Defaults to the
+            access pattern of the profile. Implies a chunked array, unless a
+            `chunkshape` is given.
         kwargs : key/value pairs
             Keyword args passed to PyTables `File.create_(c|e)array`.
         """
@@ -173,15 +275,36 @@ class H5File(Mapping):
         path, name = self.split_path(node_path)
         if extendable:
             shape = (0,) + shape[1:]
+
+        filters = self.h5filters
+        # Scalar and empty arrays can't be chunked.
+        if not extendable and (len(shape) == 0 or 0 in shape):
+            if chunked or profile is not None or access is not None:
+                msg = "Arrays of shape {0} can't be chunked."
+                raise ValueError(msg.format(shape))
+        elif profile is None:
+            profile = self._get_group_profile(path)
+        if profile is not None:
+            profile = self.get_profile(profile)
+            filters = profile.filters
+            access = access or profile.access
+        if profile is not None or access is not None:
+            chunked = True
+            if access is not None and 'chunkshape' not in kwargs:
+                chunk_bytes = (profile and profile.chunk_bytes) or 2 ** 20
+                kwargs['chunkshape'] = get_chunkshape(shape, dtype, access,
+                                                      chunk_bytes)
+
+        if extendable:
             atom = get_atom(dtype)
             node = h5.create_earray(path, name, atom, shape,
-                                    filters=self.h5filters, **kwargs)
+                                    filters=filters, **kwargs)
             if array is not None:
                 node.append(array)
         elif chunked:
             atom = get_atom(dtype)
             node = h5.create_carray(path, name, atom, shape,
-                                    filters=self.h5filters, **kwargs)
+                                    filters=filters, **kwargs)
             if array is not None:
                 node[:] = array
         else:
@@ -190,6 +313,48 @@ class H5File(Mapping):
             node = h5.create_array(path, name, array, **kwargs)
         return node
 
+    def set_group_profile(self, group_path, profile):
+        """ Select the compression profile of the arrays created in a group
+        and its subgroups, unless they are given one.
+
+        Parameters
+        ----------
+        group_path : str
+            PyTable group path; e.g. '/path/to/group'.
+        profile : str
+            Name of one of `COMPRESSION_PROFILES`, or None to use the profile
+            of the parent group.
+        """
+        attrs = self[group_path].attrs
+        if profile is None:
+            if PROFILE_ATTR in attrs:
+                del attrs[PROFILE_ATTR]
+        else:
+            self.get_profile(profile)
+            attrs[PROFILE_ATTR] = profile
+
+    @classmethod
+    def get_profile(cls, profile):
+        """ Return a `CompressionProfile` given one or its name. """
+        if isinstance(profile, CompressionProfile):
+            return profile
+        try:
+            return COMPRESSION_PROFILES[profile]
+        except KeyError:
+            msg = "Unknown compression profile {0!r}; known profiles: {1}"
+            raise ValueError(msg.format(profile,
+                                        sorted(COMPRESSION_PROFILES)))
+
+    def _get_group_profile(self, group_path):
+        """ Return the name of the profile selected for a group, if any. """
+        while True:
+            attrs = self._h5.get_node(group_path)._v_attrs
+            if PROFILE_ATTR in attrs:
+                return str(attrs[PROFILE_ATTR])
+            if group_path == '/':
+                return None
+            group_path = self.split_path(group_path)[0]
+
     def create_group(self, group_path, **kwargs):
         """Create group.
 
@@ -446,10 +611,12 @@ class H5Group(Mapping):
 
     @h5_group_wrapper(H5File.create_array)
     def create_array(self, node_subpath, array_or_shape, dtype=None,
-                     chunked=False, extendable=False, **kwargs):
+                     chunked=False, extendable=False, profile=None,
+                     access=None, **kwargs):
         return self._delegate_to_h5file('create_array', node_subpath,
                                         array_or_shape, dtype=dtype,
                                         chunked=chunked, extendable=extendable,
+                                        profile=profile, access=access,
                                         **kwargs)
 
     @h5_group_wrapper(H5File.create_table)
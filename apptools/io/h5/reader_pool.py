@@ -0,0 +1,184 @@
+import multiprocessing
+from multiprocessing.util import Finalize
+import os
+
+import numpy as np
+import tables
+
+from .table_node import CHUNK_BYTES
+
+
+#: The read-only PyTables files of a worker process, by file name.
+_readers = {}
+
+
+class H5ReaderPool(object):
+    """ A pool of worker processes reading from an HDF5 file.
+
+    Each worker process opens its own read-only handle on the file, so that
+    arrays and tables can be read, and processed, by several processes at
+    once. The file must not be written to while the pool is in use.
+
+    The workers are forked, so the file must not be open in this process
+    when the pool is created: the workers would otherwise share the state of
+    its HDF5 handle, and a ValueError is raised.
+
+    The functions given to `map_chunks` are sent to the workers, so they must
+    be picklable, e.g. defined at the top level of a module.
+
+    Parameters
+    ----------
+    filename : str
+        HDF5 file name.
+    processes : int
+        Number of worker processes. Defaults to the number of CPUs.
+    """
+
+    def __init__(self, filename, processes=None):
+        self.filename = filename
+        if _is_open(filename):
+            msg = ("{0!r} is open in this process; close it before "
+                   "creating the pool, whose workers are forked.")
+            raise ValueError(msg.format(filename))
+        self._pool = multiprocessing.Pool(processes, _init_worker)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
+
+    def close(self):
+        """ Wait for the pending work to complete and stop the workers. """
+        self._pool.close()
+        self._pool.join()
+
+    def terminate(self):
+        """ Stop the workers without completing the pending work. """
+        self._pool.terminate()
+        self._pool.join()
+
+    def read_slices(self, node_path, slices):
+        """ Read slices of an array or table node in parallel.
+
+        Parameters
+        ----------
+        node_path : str
+            Path to an array or table node; e.g. '/path/to/node'.
+        slices : list of (start, stop) tuples
+            The ranges of rows to read.
+
+        Return
+        ------
+        data : list of ndarray
+            The data of each slice; structured arrays for a table.
+        """
+        results = [
+            self._pool.apply_async(_read_slice, (self.filename, node_path,
+                                                 start, stop))
+            for start, stop in slices
+        ]
+        return [result.get() for result in results]
+
+    def map_chunks(self, node_path, func, chunk_rows=None):
+        """ Apply a function to each chunk of rows of an array or table node,
+        in parallel.
+
+        Each chunk is read by the worker process applying `func` to it, so
+        only the results are sent back.
+
+        Parameters
+        ----------
+        node_path : str
+            Path to an array or table node; e.g. '/path/to/node'.
+        func : callable
+            A picklable function taking a chunk of rows, an ndarray or a
+            structured array for a table.
+        chunk_rows : int
+            Number of rows in each chunk. By default, chunks are about
+            `CHUNK_BYTES` in size and aligned to the HDF5 chunks of the node.
+
+        Return
+        ------
+        results : list
+            The result of `func` for each chunk, in row order.
+        """
+        nrows, row_bytes, node_chunk_rows = self._pool.apply(
+            _get_node_layout, (self.filename, node_path)
+        )
+        if chunk_rows is None:
+            chunk_rows = max(1, CHUNK_BYTES // max(row_bytes, 1))
+            if node_chunk_rows:
+                chunk_rows = max(node_chunk_rows,
+                                 chunk_rows // node_chunk_rows *
+                                 node_chunk_rows)
+
+        results = [
+            self._pool.apply_async(_map_chunk, (func, self.filename, node_path,
+                                                start, start + chunk_rows))
+            for start in range(0, nrows, chunk_rows)
+        ]
+        return [result.get() for result in results]
+
+
+def map_chunks(filename, node_path, func, chunk_rows=None, processes=None):
+    """ Apply a function to each chunk of rows of an array or table node of
+    an HDF5 file, in parallel.
+
+    See `H5ReaderPool.map_chunks`; the pool of `processes` workers is only
+    used for this call.
+    """
+    with H5ReaderPool(filename, processes) as pool:
+        return pool.map_chunks(node_path, func, chunk_rows)
+
+
+def _is_open(filename):
+    """ Return True if PyTables has the file open in this process. """
+    path = os.path.abspath(filename)
+    open_files = getattr(tables.file, '_open_files', None)
+    return any(os.path.abspath(name) == path
+               for name in getattr(open_files, 'filenames', ()))
+
+
+#------------------------------------------------------------------------------
+#  Worker functions
+#------------------------------------------------------------------------------
+
+def _init_worker():
+    """ Close the files of a worker process when it exits. """
+    Finalize(None, _close_readers, exitpriority=0)
+
+
+def _close_readers():
+    for reader in _readers.values():
+        reader.close()
+    _readers.clear()
+
+
+def _get_node(filename, node_path):
+    """ Return a node of the file, opening the file on first use. """
+    reader = _readers.get(filename)
+    if reader is None:
+        reader = _readers[filename] = tables.open_file(filename, mode='r')
+    return reader.get_node(node_path)
+
+
+def _get_node_layout(filename, node_path):
+    """ Return the number of rows, the size of a row in bytes and the number
+    of rows of an HDF5 chunk (or None) of a node.
+    """
+    node = _get_node(filename, node_path)
+    row_bytes = node.dtype.itemsize * int(np.prod(node.shape[1:]))
+    chunk_rows = node.chunkshape[0] if node.chunkshape else None
+    return node.shape[0], row_bytes, chunk_rows
+
+
+def _read_slice(filename, node_path, start, stop):
+    return _get_node(filename, node_path)[start:stop]
+
+
+def _map_chunk(func, filename, node_path, start, stop):
+    return func(_read_slice(filename, node_path, start, stop))
@@ -1,8 +1,15 @@
+import sys
+
 import numpy as np
 from pandas import DataFrame
 from tables.table import Table as PyTablesTable
 
 
+#: Approximate size in bytes of the chunks read by `H5TableNode.iter_chunks`
+#: and `H5TableNode.where` by default.
+CHUNK_BYTES = 2 ** 24
+
+
 class _TableRowAccessor(object):
     """ A simple object which provides read access to the rows in a Table.
     """
@@ -75,10 +82,24 @@ class H5TableNode(object):
 
         Parameters
         ----------
-        data : dict
-            A dictionary of column name -> values items
+        data : dict or structured array
+            A dictionary of column name -> values items, or a numpy structured
+            (or record) array with a field for each column. Data is written
+            column by column, a structured array with the dtype of the table
+            is written as is.
         """
-        rows = zip(*[data[name] for name in self.keys()])
+        table_dtype = self._h5_table.dtype
+        if isinstance(data, np.ndarray) and data.dtype == table_dtype:
+            rows = data
+        else:
+            columns = [np.asarray(data[name]) for name in self.keys()]
+            lengths = set(len(column) for column in columns)
+            if len(lengths) > 1:
+                msg = "Columns have different lengths: {0}"
+                raise ValueError(msg.format(sorted(lengths)))
+            rows = np.empty(lengths.pop() if lengths else 0, dtype=table_dtype)
+            for name, column in zip(self.keys(), columns):
+                rows[name] = column
         self._h5_table.append(rows)
 
     def __getitem__(self, col_or_cols):
@@ -101,6 +122,132 @@ class H5TableNode(object):
         column_data = [self._h5_table.col(name) for name in col_or_cols]
         return np.column_stack(column_data)
 
+    def iter_chunks(self, columns=None, chunk_rows=None):
+        """ Iterate over the table data a chunk of rows at a time.
+
+        Parameters
+        ----------
+        columns : str or list of str
+            A single column name or a list of column names. Each chunk is
+            then given as `self[columns]` would give it. If None, chunks are
+            numpy structured arrays of whole rows.
+        chunk_rows : int
+            Number of rows in each chunk. By default, chunks are about
+            `CHUNK_BYTES` in size.
+        """
+        table = self._h5_table
+        chunk_rows = self._get_chunk_rows(chunk_rows)
+        for start in range(0, table.nrows, chunk_rows):
+            stop = min(start + chunk_rows, table.nrows)
+            if columns is None:
+                yield table.read(start, stop)
+            elif isinstance(columns, basestring):
+                yield table.read(start, stop, field=columns)
+            else:
+                # Only read the fields asked for, one at a time.
+                yield np.column_stack([table.read(start, stop, field=name)
+                                       for name in columns])
+
+    def where(self, condition, columns=None, chunk_rows=None, condvars=None):
+        """ Iterate over the rows matching a condition, a chunk at a time.
+
+        The condition is evaluated by the PyTables query engine, using the
+        indexes of the columns if any. Only the matching rows of each chunk
+        are loaded, and chunks without matching rows are skipped.
+
+        Parameters
+        ----------
+        condition : str
+            A PyTables condition on the columns, e.g. '(a > 0) & (b < x)'.
+        columns : str or list of str
+            The columns to return, as for `iter_chunks`.
+        chunk_rows : int
+            Number of rows of the table searched for each chunk. By default,
+            chunks are about `CHUNK_BYTES` in size.
+        condvars : dict
+            Values of the variables of the condition which aren't columns. By
+            default, they are looked up in the caller's namespace.
+        """
+        if condvars is None:
+            condvars = self._get_condvars(condition, sys._getframe(1))
+        return self._iter_where(condition, columns,
+                                self._get_chunk_rows(chunk_rows), condvars)
+
+    def create_index(self, column, kind='medium', optlevel=6):
+        """ Create an index on a column to speed up `where` and `lookup`.
+
+        Parameters
+        ----------
+        column : str
+            The name of the column.
+        kind : str
+            The kind of PyTables index: 'ultralight', 'light', 'medium' or
+            'full', or 'csi' for a completely sorted index, that is a 'full'
+            index of `optlevel` 9.
+        optlevel : int
+            The optimization level of the index, from 0 to 9. A 'csi' index
+            is always fully optimized.
+        """
+        column = self._h5_table.colinstances[column]
+        if kind == 'csi':
+            column.create_csindex()
+        else:
+            column.create_index(optlevel=optlevel, kind=kind)
+
+    def drop_index(self, column):
+        """ Remove the index of a column. """
+        self._h5_table.colinstances[column].remove_index()
+
+    @property
+    def indexes(self):
+        """ Return a dict of the (kind, optlevel) of the index of each indexed
+        column. A completely sorted index is a ('full', 9) index.
+        """
+        indexes = {}
+        for name in self.keys():
+            index = self._h5_table.colinstances[name].index
+            if index is not None:
+                indexes[name] = (index.kind, index.optlevel)
+        return indexes
+
+    def lookup(self, column, value=None, low=None, high=None, columns=None):
+        """ Return the rows where a column is equal to a value, or within a
+        range of values.
+
+        The index of the column is used, if any; otherwise the whole table is
+        searched.
+
+        Parameters
+        ----------
+        column : str
+            The name of the column.
+        value : scalar
+            The value to look up.
+        low, high : scalar
+            The lower (included) and upper (excluded) bounds of the values to
+            look up, if no `value` is given. Either may be None for an open
+            range.
+        columns : str or list of str
+            The columns to return, as for `iter_chunks`.
+        """
+        # Name the values so that they don't clash with column names.
+        condvars = dict(_lookup_value=value, _lookup_low=low,
+                        _lookup_high=high)
+        if value is not None:
+            conditions = ['({0} == _lookup_value)'.format(column)]
+        else:
+            conditions = []
+            if low is not None:
+                conditions.append('({0} >= _lookup_low)'.format(column))
+            if high is not None:
+                conditions.append('({0} < _lookup_high)'.format(column))
+
+        if conditions:
+            rows = self._h5_table.read_where(' & '.join(conditions), condvars)
+        else:
+            rows = self._h5_table.read()
+        return self._select_columns(rows, columns)
+
     @property
     def ix(self):
         """ Return an object which provides access to row data.
@@ -132,6 +279,44 @@ class H5TableNode(object):
     #  Private interface
     #--------------------------------------------------------------------------
 
+    def _iter_where(self, condition, columns, chunk_rows, condvars):
+        table = self._h5_table
+        for start in range(0, table.nrows, chunk_rows):
+            stop = min(start + chunk_rows, table.nrows)
+            rows = table.read_where(condition, condvars, start=start,
+                                    stop=stop)
+            if len(rows) > 0:
+                yield self._select_columns(rows, columns)
+
+    def _get_chunk_rows(self, chunk_rows):
+        if chunk_rows is None:
+            chunk_rows = max(1, CHUNK_BYTES // self._h5_table.rowsize)
+        return chunk_rows
+
+    def _get_condvars(self, condition, frame):
+        """ Return the variables of `condition` defined in `frame` which are
+        not columns.
+        """
+        condvars = {}
+        names = set(compile(condition, '<string>', 'eval').co_names)
+        for name in names.difference(self.keys()):
+            if name in frame.f_locals:
+                condvars[name] = frame.f_locals[name]
+            elif name in frame.f_globals:
+                condvars[name] = frame.f_globals[name]
+        return condvars
+
+    @staticmethod
+    def _select_columns(rows, columns):
+        """ Return `columns` of `rows`, a structured array, as `__getitem__`
+        would.
+        """
+        if columns is None:
+            return rows
+        if isinstance(columns, basestring):
+            return rows[columns]
+        return np.column_stack([rows[name] for name in columns])
+
     def _f_remove(self):
         """ Implement the PyTables `Node._f_remove` method so that H5File
         doesn't choke when trying to remove our node.
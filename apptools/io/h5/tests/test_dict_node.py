@@ -1,7 +1,7 @@
 import numpy as np
 from numpy.testing import raises, assert_allclose
 
-from ..dict_node import H5DictNode
+from ..dict_node import H5DictNode, LazyArray
 from .utils import open_h5file, temp_h5_file, temp_file
 
 
@@ -100,6 +100,77 @@ def test_load_saved_dict_node_with_array():
             assert isinstance(h5dict['arr_old'], np.ndarray)
 
 
+def test_arrays_read_lazily():
+    arr = np.arange(100)
+
+    with temp_file() as filename:
+        with open_h5file(filename, 'w') as h5:
+            H5DictNode.add_to_h5file(h5, NODE, dict(a=1, arr=arr, arr1=arr))
+
+        with open_h5file(filename, mode='r+') as h5:
+            h5dict = h5[NODE]
+            lazy = h5dict.lazy_array('arr')
+            assert isinstance(lazy, LazyArray)
+            assert lazy.shape == arr.shape
+            assert lazy.dtype == arr.dtype
+            assert_allclose(lazy[10:20], arr[10:20])
+            assert_allclose(np.asarray(lazy), arr)
+
+            # The array is read on first access.
+            assert isinstance(h5dict['arr'], np.ndarray)
+            assert_allclose(h5dict['arr'], arr)
+            assert isinstance(h5dict.lazy_array('arr'), np.ndarray)
+
+            # Arrays which were not read are not rewritten.
+            arr1_node = h5dict._h5_group.arr1
+            h5dict.flush()
+            assert arr1_node._v_isopen
+
+        with open_h5file(filename) as h5:
+            h5dict = h5[NODE]
+            assert_allclose(h5dict['arr'], arr)
+            assert_allclose(h5dict['arr1'], arr)
+
+
+def test_lazy_array_moved_to_other_key():
+    arr = np.arange(100)
+
+    with temp_h5_file() as h5:
+        H5DictNode.add_to_h5file(h5, NODE, dict(arr=arr))
+        h5dict = h5[NODE]
+        h5dict['moved'] = h5dict.lazy_array('arr')
+        del h5dict['arr']
+        assert_allclose(h5dict['moved'], arr)
+        h5dict['x'] = 1
+        h5dict_from_disk = h5[NODE]
+        assert 'arr' not in h5dict_from_disk
+        assert_allclose(h5dict_from_disk['moved'], arr)
+        assert h5dict_from_disk['x'] == 1
+
+
+def test_lazy_arrays_swapped():
+    a, b = np.arange(3), np.arange(5)
+
+    with temp_h5_file() as h5:
+        H5DictNode.add_to_h5file(h5, NODE, dict(a=a, b=b))
+        h5dict = h5[NODE]
+        with h5dict.batch():
+            h5dict['a'], h5dict['b'] = (h5dict.lazy_array('b'),
+                                        h5dict.lazy_array('a'))
+        assert_allclose(h5dict['a'], b)
+        assert_allclose(h5dict['b'], a)
+        h5dict_from_disk = h5[NODE]
+        assert_allclose(h5dict_from_disk['a'], b)
+        assert_allclose(h5dict_from_disk['b'], a)
+
+
+@raises(TypeError)
+def test_lazy_array_not_array():
+    with temp_h5_file() as h5:
+        h5dict = H5DictNode.add_to_h5file(h5, NODE, dict(a=1))
+        h5dict.lazy_array('a')
+
+
 def test_keys():
     with temp_h5_file() as h5:
         keys = set(('hello', 'world', 'baz1'))
@@ -156,6 +227,104 @@ def test_auto_flush_off():
         assert h5dict_from_disk['b'] == 2
 
 
+def test_auto_flush_rewrites_changed_arrays_only():
+    with temp_h5_file() as h5:
+        data = dict(a=np.arange(10), b=np.arange(5))
+        h5dict = H5DictNode.add_to_h5file(h5, NODE, data)
+        a_node = h5dict._h5_group.a
+        b_node = h5dict._h5_group.b
+        h5dict['b'] = np.arange(3)
+        h5dict['c'] = 1
+        # The node of the unchanged array was kept.
+        assert a_node._v_isopen
+        assert not b_node._v_isopen
+        h5dict_from_disk = h5[NODE]
+        assert_allclose(h5dict_from_disk['a'], np.arange(10))
+        assert_allclose(h5dict_from_disk['b'], np.arange(3))
+        assert h5dict_from_disk['c'] == 1
+
+
+def test_array_changed_in_place():
+    with temp_h5_file() as h5:
+        h5dict = H5DictNode.add_to_h5file(h5, NODE, dict(a=np.zeros(3)))
+        h5dict['a'][0] = 1
+        # Setting another key writes the array changed in place.
+        h5dict['b'] = 1
+        assert_allclose(h5[NODE]['a'], [1, 0, 0])
+
+        # So does deleting a key, and the arrays which were set are written
+        # again too.
+        c = np.zeros(2)
+        h5dict['c'] = c
+        c[0] = 1
+        h5dict['a'][1] = 1
+        del h5dict['b']
+        assert_allclose(h5[NODE]['a'], [1, 1, 0])
+        assert_allclose(h5[NODE]['c'], [1, 0])
+
+        h5dict['a'][2] = 1
+        h5dict.flush()
+        assert_allclose(h5[NODE]['a'], [1, 1, 1])
+
+
+def test_batch():
+    with temp_h5_file() as h5:
+        h5dict = H5DictNode.add_to_h5file(h5, NODE, dict(a=1))
+        writes = []
+        write = h5dict._write_pyobject_node
+        h5dict._write_pyobject_node = lambda *args: (writes.append(args),
+                                                     write(*args))
+        with h5dict.batch():
+            for i in range(10):
+                h5dict['key%d' % i] = i
+            h5dict['arr'] = np.arange(10)
+            del h5dict['a']
+            # Nothing is written until the end of the batch.
+            assert h5[NODE]['a'] == 1
+            assert writes == []
+        assert len(writes) == 1
+        h5dict_from_disk = h5[NODE]
+        assert 'a' not in h5dict_from_disk
+        assert h5dict_from_disk['key9'] == 9
+        assert_allclose(h5dict_from_disk['arr'], np.arange(10))
+
+
+def test_failed_write_keeps_data():
+    with temp_h5_file() as h5:
+        h5dict = H5DictNode.add_to_h5file(h5, NODE, dict(a=1))
+        try:
+            h5dict['b'] = object()
+        except TypeError:
+            pass
+        else:
+            assert False, 'TypeError not raised'
+        h5dict_from_disk = h5[NODE]
+        assert list(h5dict_from_disk.keys()) == ['a']
+        del h5dict['b']
+        h5dict['c'] = 3
+        h5dict_from_disk = h5[NODE]
+        assert set(h5dict_from_disk.keys()) == set(['a', 'c'])
+
+
+def test_batch_rollback():
+    with temp_h5_file() as h5:
+        h5dict = H5DictNode.add_to_h5file(h5, NODE, dict(a=1, b=2))
+        try:
+            with h5dict.batch():
+                h5dict['a'] = 10
+                del h5dict['b']
+                h5dict['arr'] = np.arange(10)
+                raise ValueError
+        except ValueError:
+            pass
+        assert h5dict['a'] == 1
+        assert h5dict['b'] == 2
+        assert 'arr' not in h5dict
+        h5dict_from_disk = h5[NODE]
+        assert h5dict_from_disk['a'] == 1
+        assert 'arr' not in h5[NODE]
+
+
 @raises(KeyError)
 def test_undefined_key():
     with temp_h5_file() as h5:
@@ -5,7 +5,7 @@ import numpy as np
 from numpy import testing
 import tables
 
-from ..file import H5File
+from ..file import H5File, _blosc_filters, get_chunkshape
 from ..dict_node import H5DictNode
 from ..table_node import H5TableNode
 from .utils import open_h5file, temp_h5_file
@@ -141,6 +141,122 @@ def test_create_extendable_array_with_H5Group():
         assert isinstance(h5array, tables.EArray)
 
 
+def test_h5filters():
+    filters = tables.Filters(complib='zlib', complevel=3)
+    with open_h5file(H5_TEST_FILE, mode='w', h5filters=filters) as h5:
+        h5array = h5.create_array('/array', np.arange(3), chunked=True)
+        assert h5array.filters.complib == 'zlib'
+        assert h5array.filters.complevel == 3
+
+
+def test_create_array_with_profile():
+    array = np.zeros((1000, 100))
+    with open_h5file(H5_TEST_FILE, mode='w') as h5:
+        h5array = h5.create_array('/small', array, profile='small-file')
+        assert isinstance(h5array, tables.CArray)
+        assert h5array.filters.complib == 'blosc:zstd'
+        # 1 MB chunks of whole rows.
+        assert h5array.chunkshape == (1000, 100)
+        testing.assert_allclose(h5array, array)
+
+        h5array = h5.root.create_array('/random', array,
+                                       profile='random-access')
+        # 64 kB square chunks.
+        assert h5array.chunkshape == (91, 91)
+
+        h5array = h5.create_array('/columns', array, profile='fast-write',
+                                  access='columns')
+        assert h5array.filters.complib == 'blosc:lz4'
+        assert h5array.chunkshape == (1000, 100)
+
+        h5array = h5.create_array('/extendable', array, extendable=True,
+                                  profile='fast-write', chunkshape=(10, 10))
+        assert isinstance(h5array, tables.EArray)
+        assert h5array.chunkshape == (10, 10)
+        testing.assert_allclose(h5array, array)
+
+
+def test_profile_missing_compressor():
+    all_complibs = tables.filters.all_complibs
+    tables.filters.all_complibs = ['zlib', 'blosc', 'blosc:blosclz']
+    try:
+        filters = _blosc_filters('zstd', 9)
+    finally:
+        tables.filters.all_complibs = all_complibs
+    assert filters.complib == 'blosc'
+    assert filters.complevel == 9
+    assert _blosc_filters('zstd', 9).complib == 'blosc:zstd'
+
+
+@testing.raises(ValueError)
+def test_create_array_with_unknown_profile():
+    with open_h5file(H5_TEST_FILE, mode='w') as h5:
+        h5.create_array('/array', np.arange(3), profile='unknown')
+
+
+def test_group_profile():
+    with open_h5file(H5_TEST_FILE, mode='w') as h5:
+        h5.create_group('/group/subgroup')
+        h5.set_group_profile('/group', 'fast-write')
+        h5array = h5.create_array('/group/subgroup/array', np.arange(3))
+        assert isinstance(h5array, tables.CArray)
+        assert h5array.filters.complib == 'blosc:lz4'
+
+        # Explicit profiles override the group's.
+        h5array = h5.create_array('/group/array', np.arange(3),
+                                  profile='small-file')
+        assert h5array.filters.complib == 'blosc:zstd'
+
+        h5.set_group_profile('/group', None)
+        h5array = h5.create_array('/group/plain', np.arange(3))
+        assert not isinstance(h5array, tables.CArray)
+
+
+def test_group_profile_scalar_and_empty_arrays():
+    with open_h5file(H5_TEST_FILE, mode='w') as h5:
+        h5.create_group('/group')
+        h5.set_group_profile('/group', 'fast-write')
+        # Arrays which can't be chunked ignore the group's profile.
+        h5array = h5.create_array('/group/scalar', np.array(3))
+        assert not isinstance(h5array, tables.CArray)
+        assert h5array[()] == 3
+        h5array = h5.create_array('/group/empty', np.zeros((0, 3)))
+        assert not isinstance(h5array, tables.CArray)
+        assert h5array.shape == (0, 3)
+        h5array = h5.create_array('/group/earray', np.zeros((0, 3)),
+                                  extendable=True)
+        assert isinstance(h5array, tables.EArray)
+        assert h5array.filters.complib == 'blosc:lz4'
+
+
+@testing.raises(ValueError)
+def test_create_chunked_scalar_array():
+    with open_h5file(H5_TEST_FILE, mode='w') as h5:
+        h5.create_array('/array', np.array(3), profile='default')
+
+
+@testing.raises(ValueError)
+def test_create_chunked_empty_array():
+    with open_h5file(H5_TEST_FILE, mode='w') as h5:
+        h5.create_array('/array', np.zeros((0, 3)), chunked=True)
+
+def test_get_chunkshape():
+    # 1000 float64 items per chunk.
+    assert get_chunkshape((10 ** 6, 100), float, 'rows', 8000) == (10, 100)
+    assert get_chunkshape((10 ** 6, 100), float, 'columns', 8000) == (1000, 1)
+    assert get_chunkshape((10 ** 6, 100), float, 'blocks', 8000) == (32, 32)
+    assert get_chunkshape((10, 5000), float, 'rows', 8000) == (1, 1000)
+    assert get_chunkshape((50, 100), float, 'columns', 8000) == (50, 20)
+    # Unbounded dimensions.
+    assert get_chunkshape((0, 10), float, 'rows', 8000) == (100, 10)
+    assert get_chunkshape((0, 10), float, 'columns', 8000) == (1000, 1)
+
+
+@testing.raises(ValueError)
+def test_get_chunkshape_unknown_access():
+    get_chunkshape((10,), float, 'diagonals')
+
+
 def test_str_and_repr():
     array = np.arange(3)
     with open_h5file(H5_TEST_FILE, mode='w') as h5:
@@ -0,0 +1,78 @@
+import numpy as np
+from numpy.testing import assert_allclose, assert_raises
+
+from .. import reader_pool
+from ..reader_pool import H5ReaderPool, map_chunks
+from .utils import open_h5file, temp_file
+
+
+def column_sum(rows):
+    return rows['a'].sum()
+
+
+def test_map_chunks():
+    array = np.arange(1000.0).reshape(500, 2)
+
+    with temp_file(suffix='.h5') as filename:
+        with open_h5file(filename, 'w') as h5:
+            h5.create_array('/array', array)
+            h5.create_array('/carray', array, chunked=True)
+
+        with H5ReaderPool(filename, processes=2) as pool:
+            sums = pool.map_chunks('/array', np.sum, chunk_rows=60)
+            assert len(sums) == 9
+            assert_allclose(sum(sums), array.sum())
+
+            sums = pool.map_chunks('/carray', np.sum)
+            assert_allclose(sum(sums), array.sum())
+
+        sums = map_chunks(filename, '/array', np.sum, 100, processes=2)
+        assert_allclose(sums, array.reshape(5, 200).sum(axis=1))
+
+
+def test_map_chunks_table():
+    with temp_file(suffix='.h5') as filename:
+        with open_h5file(filename, 'w') as h5:
+            table = h5.create_table('/table', [('a', np.float64)])
+            table.append({'a': np.arange(100.0)})
+
+        with H5ReaderPool(filename, processes=2) as pool:
+            sums = pool.map_chunks('/table', column_sum, chunk_rows=30)
+            assert_allclose(sums, [435, 1335, 2235, 945])
+
+
+def test_read_slices():
+    array = np.arange(100)
+
+    with temp_file(suffix='.h5') as filename:
+        with open_h5file(filename, 'w') as h5:
+            h5.create_array('/array', array)
+
+        with H5ReaderPool(filename, processes=2) as pool:
+            slices = pool.read_slices('/array', [(0, 10), (50, 55), (95, 200)])
+            assert_allclose(slices[0], array[:10])
+            assert_allclose(slices[1], array[50:55])
+            assert_allclose(slices[2], array[95:])
+
+
+def test_file_open_in_parent():
+    with temp_file(suffix='.h5') as filename:
+        with open_h5file(filename, 'w') as h5:
+            h5.create_array('/array', np.arange(10))
+            assert_raises(ValueError, H5ReaderPool, filename, 1)
+
+
+def test_close_readers():
+    array = np.arange(10)
+
+    with temp_file(suffix='.h5') as filename:
+        with open_h5file(filename, 'w') as h5:
+            h5.create_array('/array', array)
+
+        # What a worker process does.
+        assert_allclose(reader_pool._read_slice(filename, '/array', 2, 4),
+                        array[2:4])
+        reader = reader_pool._readers[filename]
+        reader_pool._close_readers()
+        assert not reader.isopen
+        assert reader_pool._readers == {}
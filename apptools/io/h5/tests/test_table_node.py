@@ -1,5 +1,5 @@
 import numpy as np
-from numpy.testing import assert_allclose
+from numpy.testing import assert_allclose, raises
 from pandas import DataFrame
 
 from ..table_node import H5TableNode
@@ -29,6 +29,122 @@ def test_basics():
         assert len(repr(h5table)) > 0
 
 
+def test_append_structured_array():
+    description = [('a', np.float64), ('b', np.int32)]
+    with temp_h5_file() as h5:
+        h5table = H5TableNode.add_to_h5file(h5, NODE, description)
+        rows = np.zeros(3, dtype=description)
+        rows['a'] = [1, 2, 3]
+        rows['b'] = [4, 5, 6]
+        h5table.append(rows)
+        h5table.append(rows.view(np.recarray))
+        # Fields are matched by name.
+        other = np.zeros(2, dtype=[('b', np.int64), ('a', np.float32),
+                                   ('c', np.int8)])
+        other['a'] = [7, 8]
+        other['b'] = [9, 10]
+        h5table.append(other)
+
+        assert_allclose(h5table['a'], [1, 2, 3, 1, 2, 3, 7, 8])
+        assert_allclose(h5table['b'], [4, 5, 6, 4, 5, 6, 9, 10])
+
+
+def test_append_column_arrays():
+    description = [('a', np.float64), ('b', np.int32, (2,))]
+    with temp_h5_file() as h5:
+        h5table = H5TableNode.add_to_h5file(h5, NODE, description)
+        h5table.append({'a': np.arange(3.0), 'b': np.ones((3, 2))})
+        h5table.append({'a': [], 'b': np.ones((0, 2))})
+
+        assert_allclose(h5table['a'], [0, 1, 2])
+        assert h5table.ix[:]['b'].shape == (3, 2)
+
+
+@raises(ValueError)
+def test_append_columns_of_different_lengths():
+    description = [('a', np.float64), ('b', np.float64)]
+    with temp_h5_file() as h5:
+        h5table = H5TableNode.add_to_h5file(h5, NODE, description)
+        h5table.append({'a': [1, 2], 'b': [3]})
+
+
+def test_iter_chunks():
+    description = [('a', np.float64), ('b', np.int32)]
+    with temp_h5_file() as h5:
+        h5table = H5TableNode.add_to_h5file(h5, NODE, description)
+        h5table.append({'a': np.arange(10.0), 'b': np.arange(10) * 2})
+
+        chunks = list(h5table.iter_chunks(chunk_rows=4))
+        assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+        assert_allclose(np.concatenate(chunks)['b'], np.arange(10) * 2)
+
+        chunks = list(h5table.iter_chunks('a', chunk_rows=4))
+        assert_allclose(np.concatenate(chunks), np.arange(10.0))
+
+        chunks = list(h5table.iter_chunks(['b', 'a'], chunk_rows=4))
+        assert_allclose(np.concatenate(chunks), h5table[['b', 'a']])
+
+        assert len(list(h5table.iter_chunks())) == 1
+
+
+def test_where():
+    description = [('a', np.float64), ('b', np.int32)]
+    with temp_h5_file() as h5:
+        h5table = H5TableNode.add_to_h5file(h5, NODE, description)
+        h5table.append({'a': np.arange(10.0), 'b': np.arange(10) * 2})
+
+        # Chunks without matching rows are skipped.
+        chunks = list(h5table.where('a >= 8', chunk_rows=4))
+        assert len(chunks) == 1
+        assert_allclose(chunks[0]['b'], [16, 18])
+
+        # Variables are looked up in the caller's namespace.
+        low = 2
+        chunks = list(h5table.where('(a > low) & (b < 10)', 'a',
+                                    chunk_rows=4))
+        assert_allclose(np.concatenate(chunks), [3, 4])
+
+        chunks = list(h5table.where('a < high', ['b', 'a'],
+                                    condvars={'high': 2}))
+        assert_allclose(np.concatenate(chunks), [(0, 0), (2, 1)])
+
+
+def test_indexes():
+    description = [('id', np.int64), ('a', np.float64), ('b', np.float64)]
+    with temp_h5_file() as h5:
+        h5table = H5TableNode.add_to_h5file(h5, NODE, description)
+        h5table.append({'id': np.arange(100), 'a': np.arange(100) * 0.5,
+                        'b': np.zeros(100)})
+        assert h5table.indexes == {}
+
+        h5table.create_index('id', kind='csi')
+        h5table.create_index('a', kind='light', optlevel=3)
+        assert h5table.indexes == {'id': ('full', 9), 'a': ('light', 3)}
+        table = h5table._h5_table
+        assert table.will_query_use_indexing('id == 5') == frozenset(['id'])
+
+        h5table.drop_index('a')
+        assert h5table.indexes == {'id': ('full', 9)}
+
+
+def test_lookup():
+    description = [('id', np.int64), ('a', np.float64)]
+    with temp_h5_file() as h5:
+        h5table = H5TableNode.add_to_h5file(h5, NODE, description)
+        h5table.append({'id': np.arange(100) % 50, 'a': np.arange(100.0)})
+        for index in (False, True):
+            if index:
+                h5table.create_index('id', kind='full')
+            assert_allclose(h5table.lookup('id', 7, columns='a'), [7, 57])
+            assert len(h5table.lookup('id', 1000)) == 0
+            rows = h5table.lookup('id', low=10, high=12)
+            assert_allclose(np.sort(rows['a']), [10, 11, 60, 61])
+            assert len(h5table.lookup('id', low=48)) == 4
+            assert_allclose(h5table.lookup('id', high=1, columns=['a', 'id']),
+                            [(0, 0), (50, 0)])
+            assert len(h5table.lookup('id')) == 100
+
+
 def test_getitem():
     description = [('a', np.float64), ('b', np.float64)]
     with temp_h5_file() as h5:
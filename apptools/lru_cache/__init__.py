@@ -1,3 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from lru_cache import LRUCache
+from .lru_cache import LRUCache, lru_cached
+from .fast_lru_cache import FastLRUCache
+from .sharded_lru_cache import ShardedLRUCache
+from .spill_store import PickleDirectoryStore, SpillStore
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+# Copyright (c) 2015, Enthought, Inc.
+# All rights reserved.
+#
+# This software is provided without warranty under the terms of the BSD
+# license included in enthought/LICENSE.txt and may be redistributed only
+# under the conditions described in the aforementioned license.  The license
+# is also available online at http://www.enthought.com/licenses/BSD.txt
+# Thanks for using Enthought open source!
+#
+# Author: Enthought, Inc.
+# -----------------------------------------------------------------------------
+""" The policies choosing which items an `LRUCache` evicts.
+
+A policy only tracks the keys of the items in memory, the cache keeps the
+values.  The policies are only called with the lock of their cache held.
+"""
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+
+class EvictionPolicy(object):
+    """ The interface of the eviction policies. """
+
+    def add(self, key):
+        """ Track a key newly added to the cache. """
+        raise NotImplementedError
+
+    def touch(self, key):
+        """ Record an access to (or an overwrite of) a tracked key. """
+        raise NotImplementedError
+
+    def remove(self, key):
+        """ Stop tracking a key removed from the cache by other means than
+        `evict`.
+        """
+        raise NotImplementedError
+
+    def evict(self):
+        """ Choose the key to evict, stop tracking it and return it. """
+        raise NotImplementedError
+
+    def clear(self):
+        """ Stop tracking all the keys. """
+        raise NotImplementedError
+
+
+def _move_to_end(ordered_dict, key):
+    ordered_dict[key] = ordered_dict.pop(key)
+
+
+class LRUPolicy(EvictionPolicy):
+    """ Evict the least recently used key. """
+
+    def __init__(self):
+        self._keys = OrderedDict()
+
+    def add(self, key):
+        self._keys[key] = None
+
+    def touch(self, key):
+        _move_to_end(self._keys, key)
+
+    def remove(self, key):
+        del self._keys[key]
+
+    def evict(self):
+        return self._keys.popitem(last=False)[0]
+
+    def clear(self):
+        self._keys.clear()
+
+
+class TwoQueuePolicy(EvictionPolicy):
+    """ The 2Q policy, which resists scans.
+
+    New keys go to a FIFO queue ("A1in") and are evicted from there first,
+    so a single pass over many keys does not flush the frequently used ones.
+    The keys evicted from that queue are remembered for a while ("A1out"):
+    if one of them is added again it goes to the main LRU queue ("Am").
+
+    As for `SegmentedLRUPolicy`, the sizes of the queues are relative to
+    the number of keys cached when an eviction is needed.
+
+    See T. Johnson and D. Shasha, "2Q: A Low Overhead High Performance
+    Buffer Management Replacement Algorithm", VLDB 1994.
+
+    Parameters
+    ----------
+    in_ratio : float
+        The share of the cached keys kept in the FIFO queue.
+    out_ratio : float
+        The number of evicted keys remembered, as a share of the number of
+        cached keys.
+    """
+
+    def __init__(self, in_ratio=0.25, out_ratio=0.5):
+        self.in_ratio = in_ratio
+        self.out_ratio = out_ratio
+        self._in = OrderedDict()
+        self._out = OrderedDict()
+        self._main = OrderedDict()
+
+    def add(self, key):
+        if key in self._out:
+            del self._out[key]
+            self._main[key] = None
+        else:
+            self._in[key] = None
+
+    def touch(self, key):
+        # The keys of the FIFO queue are not moved by an access: that is
+        # what makes a second access in a short while not count.
+        if key in self._main:
+            _move_to_end(self._main, key)
+
+    def remove(self, key):
+        if key in self._main:
+            del self._main[key]
+        else:
+            del self._in[key]
+
+    def evict(self):
+        cached = len(self._in) + len(self._main)
+        if self._in and (len(self._in) > self.in_ratio * cached or
+                         not self._main):
+            key = self._in.popitem(last=False)[0]
+            self._out[key] = None
+            max_out = max(1, int(self.out_ratio * cached))
+            while len(self._out) > max_out:
+                self._out.popitem(last=False)
+            return key
+        return self._main.popitem(last=False)[0]
+
+    def clear(self):
+        self._in.clear()
+        self._out.clear()
+        self._main.clear()
+
+
+class SegmentedLRUPolicy(EvictionPolicy):
+    """ The segmented LRU policy, which resists scans.
+
+    New keys go to a probationary LRU segment, and move to a protected LRU
+    segment when they are accessed again.  The keys are evicted from the
+    probationary segment first, and the least recently used protected keys
+    are moved back to it when the protected segment is full.
+
+    The sizes of the segments are relative to the number of keys cached
+    when an eviction is needed, so they follow both the `size` and the
+    `max_weight` limits of the cache.
+
+    Parameters
+    ----------
+    protected_ratio : float
+        The share of the cached keys kept in the protected segment.
+    """
+
+    def __init__(self, protected_ratio=0.8):
+        self.protected_ratio = protected_ratio
+        self._probation = OrderedDict()
+        self._protected = OrderedDict()
+
+    def add(self, key):
+        self._probation[key] = None
+
+    def touch(self, key):
+        if key in self._protected:
+            _move_to_end(self._protected, key)
+            return
+
+        del self._probation[key]
+        self._protected[key] = None
+
+    def remove(self, key):
+        if key in self._protected:
+            del self._protected[key]
+        else:
+            del self._probation[key]
+
+    def evict(self):
+        cached = len(self._probation) + len(self._protected)
+        max_protected = int(self.protected_ratio * cached)
+        while len(self._protected) > max_protected:
+            demoted = self._protected.popitem(last=False)[0]
+            self._probation[demoted] = None
+        if self._probation:
+            return self._probation.popitem(last=False)[0]
+        return self._protected.popitem(last=False)[0]
+
+    def clear(self):
+        self._probation.clear()
+        self._protected.clear()
+
+
+# The policies which can be selected by name in `LRUCache.policy`.
+POLICIES = {
+    'lru': LRUPolicy,
+    '2q': TwoQueuePolicy,
+    'slru': SegmentedLRUPolicy,
+}
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+# Copyright (c) 2015, Enthought, Inc.
+# All rights reserved.
+#
+# This software is provided without warranty under the terms of the BSD
+# license included in enthought/LICENSE.txt and may be redistributed only
+# under the conditions described in the aforementioned license.  The license
+# is also available online at http://www.enthought.com/licenses/BSD.txt
+# Thanks for using Enthought open source!
+#
+# Author: Enthought, Inc.
+# -----------------------------------------------------------------------------
+
+from contextlib import contextmanager
+
+from traits.api import Any, Bool, Callable, Event, HasStrictTraits, Int
+
+
+# Names for the fields of the links in the doubly linked list.
+PREV, NEXT, KEY, VALUE = 0, 1, 2, 3
+
+
+class FastLRUCache(HasStrictTraits):
+    """ A least-recently used cache for use as a hot memoization layer.
+
+    This has the same mapping interface as `LRUCache` but is meant for
+    code that does millions of lookups: it takes no lock and fires no
+    trait notification on individual get and set operations.  The
+    recency order is kept in a circular doubly linked list, so every
+    operation is O(1).
+
+    Since there is no lock, it is not thread-safe: a single instance must
+    not be used from several threads at once, even only to read it, since
+    every lookup relinks the recency list.  Use `ShardedLRUCache` for that.
+
+    The `updated` event is opt-in: it is only fired when the set of cached
+    keys has changed and either `flush_updated` is called or a
+    `batch_updates` block is exited.
+
+    """
+
+    size = Int
+
+    # Called with the key and value that was dropped from the cache
+    cache_drop_callback = Callable
+
+    # This event contains the set of cached cell keys.  It is only fired by
+    # `flush_updated` (and so at the end of a `batch_updates` block).
+    updated = Event()
+
+    # Maps keys to their link in the linked list.
+    _map = Any
+
+    # The sentinel of the linked list.  `_root[NEXT]` is the least recently
+    # used link and `_root[PREV]` the most recently used one.
+    _root = Any
+
+    # Whether the set of keys has changed since `updated` was last fired.
+    _dirty = Bool(False)
+
+    # The nesting level of `batch_updates` blocks.
+    _batch_depth = Int(0)
+
+    def __init__(self, size, **traits):
+        self.size = size
+        self._initialize_cache()
+        super(FastLRUCache, self).__init__(**traits)
+
+    def _initialize_cache(self):
+        root = []
+        root[:] = [root, root, None, None]
+        self._root = root
+        self._map = {}
+
+    def _link_last(self, link):
+        """ Move an existing `link` to the most recently used position. """
+        root = self._root
+        last = root[PREV]
+        if last is link:
+            return
+        link_prev, link_next = link[PREV], link[NEXT]
+        link_prev[NEXT] = link_next
+        link_next[PREV] = link_prev
+        last[NEXT] = root[PREV] = link
+        link[PREV] = last
+        link[NEXT] = root
+
+    def _iter_links(self):
+        root = self._root
+        link = root[NEXT]
+        while link is not root:
+            yield link
+            link = link[NEXT]
+
+    # -------------------------------------------------------------------------
+    # LRUCache interface
+    # -------------------------------------------------------------------------
+
+    def __contains__(self, key):
+        return key in self._map
+
+    def __len__(self):
+        return len(self._map)
+
+    def __getitem__(self, key):
+        link = self._map[key]
+        self._link_last(link)
+        return link[VALUE]
+
+    def __setitem__(self, key, result):
+        mapping = self._map
+        link = mapping.get(key)
+        if link is not None:
+            link[VALUE] = result
+            self._link_last(link)
+            return
+
+        root = self._root
+        last = root[PREV]
+        link = [last, root, key, result]
+        last[NEXT] = root[PREV] = mapping[key] = link
+        if not self._dirty:
+            self._dirty = True
+
+        if self.size < len(mapping):
+            oldest = root[NEXT]
+            oldest_next = oldest[NEXT]
+            root[NEXT] = oldest_next
+            oldest_next[PREV] = root
+            del mapping[oldest[KEY]]
+            if self.cache_drop_callback is not None:
+                self.cache_drop_callback(oldest[KEY], oldest[VALUE])
+
+    def get(self, key, default=None):
+        link = self._map.get(key)
+        if link is None:
+            return default
+        self._link_last(link)
+        return link[VALUE]
+
+    def items(self):
+        return [(link[KEY], link[VALUE]) for link in self._iter_links()]
+
+    def keys(self):
+        return [link[KEY] for link in self._iter_links()]
+
+    def values(self):
+        return [link[VALUE] for link in self._iter_links()]
+
+    def clear(self):
+        self._initialize_cache()
+        self._dirty = True
+        self.flush_updated()
+
+    # -------------------------------------------------------------------------
+    # Update notification
+    # -------------------------------------------------------------------------
+
+    def flush_updated(self):
+        """ Fire `updated` if the set of keys has changed since it was last
+        fired.  This does nothing inside a `batch_updates` block; the event
+        is fired when the outermost block exits instead.
+        """
+        if self._dirty and self._batch_depth == 0:
+            self._dirty = False
+            self.updated = self.keys()
+
+    @contextmanager
+    def batch_updates(self):
+        """ A context manager coalescing all the changes made inside it
+        into (at most) one `updated` event fired on exit.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            self.flush_updated()
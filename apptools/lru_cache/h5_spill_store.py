@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+# Copyright (c) 2015, Enthought, Inc.
+# All rights reserved.
+#
+# This software is provided without warranty under the terms of the BSD
+# license included in enthought/LICENSE.txt and may be redistributed only
+# under the conditions described in the aforementioned license.  The license
+# is also available online at http://www.enthought.com/licenses/BSD.txt
+# Thanks for using Enthought open source!
+#
+# Author: Enthought, Inc.
+# -----------------------------------------------------------------------------
+""" A spill store for NumPy arrays, kept in an HDF5 file.
+
+This module needs PyTables, so it is not imported by `apptools.lru_cache`.
+"""
+
+import itertools
+import os
+import tempfile
+
+import numpy as np
+import tables
+
+from apptools.io.h5.file import H5File
+
+from .spill_store import SpillStore
+
+
+#: The size of the arrays removed from a file below which it is not
+#: compacted.
+COMPACT_MIN_BYTES = 2 ** 20
+
+
+class H5ArraySpillStore(SpillStore):
+    """ A store writing NumPy arrays to the nodes of an HDF5 file.
+
+    Values which are not arrays (or are arrays of Python objects) are not
+    stored, and so are dropped by the cache.  The size of a value is the
+    size of its array in memory.
+
+    HDF5 does not give back the space of removed nodes.  When the file
+    holds, counting the removed arrays, more than `compact_ratio` times the
+    size of the stored arrays (and at least `COMPACT_MIN_BYTES` of removed
+    arrays), it is compacted: its nodes are copied to a new file which
+    replaces it.
+
+    Parameters
+    ----------
+    filename : str
+        The local HDF5 file holding the arrays.  By default a temporary file
+        is created, and removed by `close`.
+    group : str
+        The group of the file under which the arrays are stored.
+    max_items, max_bytes : int
+        See `SpillStore`.
+    compact_ratio : float
+        How many times the size of the stored arrays the file may hold
+        before it is compacted.
+    """
+
+    def __init__(self, filename=None, group='/spill', max_items=0,
+                 max_bytes=0, compact_ratio=2.0):
+        super(H5ArraySpillStore, self).__init__(max_items, max_bytes)
+        self._owns_file = filename is None
+        if filename is None:
+            fd, filename = tempfile.mkstemp(suffix='.h5', prefix='lru_cache_')
+            os.close(fd)
+            mode = 'w'
+        else:
+            mode = 'a'
+        self.filename = filename
+        self.group = group
+        self.compact_ratio = compact_ratio
+        self._h5 = H5File(filename, mode=mode, delete_existing=True)
+        # The nodes holding the arrays, by key.
+        self._nodes = {}
+        self._counter = itertools.count()
+        # The size of the arrays removed since the file was created or
+        # compacted.
+        self._removed_bytes = 0
+
+    def put(self, key, value):
+        if not isinstance(value, np.ndarray) or value.dtype.hasobject:
+            return False
+        if 0 < self.max_bytes < value.nbytes:
+            return False
+        node_path = H5File.join_path(
+            self.group, 'item_{0}'.format(next(self._counter))
+        )
+        try:
+            self._h5.create_array(node_path, value)
+        except (tables.HDF5ExtError, EnvironmentError):
+            try:
+                if node_path in self._h5:
+                    self._h5.remove_node(node_path)
+            except (tables.HDF5ExtError, EnvironmentError):
+                pass
+            return False
+        self.discard(key)
+        self._nodes[key] = node_path
+        self._add_size(key, value.nbytes)
+        return True
+
+    def pop(self, key):
+        node_path = self._nodes[key]
+        value = self._h5[node_path].read()
+        self.discard(key)
+        return value
+
+    def discard(self, key):
+        node_path = self._nodes.pop(key, None)
+        if node_path is not None:
+            self._removed_bytes += self._sizes[key]
+            self._remove_size(key)
+            self._h5.remove_node(node_path)
+            self._compact_if_needed()
+
+    def clear(self):
+        self._remove_all()
+        self._compact_if_needed()
+
+    def close(self):
+        self._remove_all()
+        self._h5.close()
+        if self._owns_file:
+            os.remove(self.filename)
+
+    def compact(self):
+        """ Copy the stored arrays to a new file which replaces the file of
+        the store, giving back the space of the removed arrays.
+        """
+        tmp = self.filename + '.tmp'
+        self._h5.close()
+        tables.copy_file(self.filename, tmp, overwrite=True)
+        os.remove(self.filename)
+        os.rename(tmp, self.filename)
+        self._h5 = H5File(self.filename, mode='a', delete_existing=True)
+        self._removed_bytes = 0
+
+    def _compact_if_needed(self):
+        if self._removed_bytes > max(COMPACT_MIN_BYTES,
+                                     (self.compact_ratio - 1) * self._nbytes):
+            self.compact()
+
+    def _remove_all(self):
+        for key, node_path in self._nodes.items():
+            self._removed_bytes += self._sizes[key]
+            self._h5.remove_node(node_path)
+        self._nodes.clear()
+        self._sizes.clear()
+        self._nbytes = 0
@@ -13,7 +13,9 @@
 # Author: Enthought, Inc.
 # -----------------------------------------------------------------------------
 
-from threading import RLock
+import functools
+from threading import Event as ThreadingEvent, RLock
+import time
 
 try:
     from collections import OrderedDict
@@ -21,7 +23,44 @@ except ImportError:
     from ordereddict import OrderedDict
 
 
-from traits.api import Callable, Event, HasStrictTraits, Instance, Int
+from traits.api import (
+    Any, Callable, Enum, Event, Float, HasStrictTraits, Instance, Int,
+    Property
+)
+
+from .eviction_policy import POLICIES
+from .spill_store import SpillStore
+
+
+# The default clock used to expire items.  Python 2 has no monotonic clock,
+# so it falls back to the wall clock there, which goes backwards or jumps
+# when the system time is changed.
+_monotonic = getattr(time, 'monotonic', time.time)
+
+
+class _PendingResult(object):
+    """ The result of a computation started by `LRUCache.get_or_compute`,
+    which the other threads asking for the same key wait for.
+    """
+
+    def __init__(self):
+        self._done = ThreadingEvent()
+        self._result = None
+        self._exception = None
+
+    def set_result(self, result):
+        self._result = result
+        self._done.set()
+
+    def set_exception(self, exception):
+        self._exception = exception
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        if self._exception is not None:
+            raise self._exception
+        return self._result
 
 
 class LRUCache(HasStrictTraits):
@@ -29,10 +68,78 @@ class LRUCache(HasStrictTraits):
 
     Items older than `size()` accesses are dropped from the cache.
 
+    The cache can also be bounded by the total weight of its values rather
+    than just their number: give a `weigher` computing the cost of a value
+    (e.g. ``lambda array: array.nbytes``) and a `max_weight` budget, and the
+    least recently used items are dropped until the cached values fit in the
+    budget.  `size` still bounds the number of items in that mode.
+
+    Items can be given a time to live, either for the whole cache with
+    `ttl` or per item with `set`.  Expired items are dropped lazily, when
+    they are accessed, or all at once by `expire`.  On Python 2 the times
+    are read from the wall clock by default: setting the system time back
+    keeps items alive for longer, and setting it forward expires them early.
+    Give a `clock` which never goes backwards to avoid this.
+
+    The `hits`, `misses`, `evictions` and `expirations` counters can be read
+    at any time to tune the cache.
+
+    The items to evict are chosen by the `policy`, which by default evicts
+    the least recently used ones.  The '2q' and 'slru' policies are scan
+    resistant: a single pass over many keys does not flush the frequently
+    used items.
+
+    With a `spill_store`, the evicted items are written to disk instead of
+    being dropped, and looking them up moves them back to memory.  `len`,
+    `keys`, `items` and `values` only cover the items in memory.  The items
+    spilled first are dropped when the store is full.
+
     """
 
     size = Int
 
+    # The eviction policy: least recently used ('lru'), 2Q ('2q') or
+    # segmented LRU ('slru').  See `apptools.lru_cache.eviction_policy`.
+    policy = Enum('lru', '2q', 'slru')
+
+    # Called with a value to compute its weight.  By default all the values
+    # weigh 1.
+    weigher = Callable
+
+    # The maximum total weight of the cached values.  Zero means that only
+    # `size` bounds the cache.
+    max_weight = Int
+
+    # The total weight of the values currently in the cache.
+    current_weight = Property(Int)
+
+    # The highest value `current_weight` has reached.
+    peak_weight = Property(Int)
+
+    # The default time to live of the items, in seconds.  Zero means that
+    # the items never expire.
+    ttl = Float
+
+    # The function giving the current time, in seconds, for the expiry.  By
+    # default `time.monotonic`, or `time.time` on Python 2.
+    clock = Callable
+
+    # The number of lookups which found their key.
+    hits = Property(Int)
+
+    # The number of lookups which did not find their key.
+    misses = Property(Int)
+
+    # The number of items dropped to respect `size` or `max_weight`.
+    evictions = Property(Int)
+
+    # The number of items dropped because their time to live had passed.
+    expirations = Property(Int)
+
+    # Where the items evicted from memory are kept.  If None they are
+    # dropped.
+    spill_store = Instance(SpillStore)
+
     # Called with the key and value that was dropped from the cache
     cache_drop_callback = Callable
 
@@ -43,8 +150,36 @@ class LRUCache(HasStrictTraits):
 
     _cache = Instance(OrderedDict)
 
+    # The `EvictionPolicy` instance implementing `policy`.
+    _policy = Any
+
+    # The weights of the cached values, by key.
+    _weights = Any
+
+    _current_weight = Int
+
+    _peak_weight = Int
+
+    # The expiry times of the items which have one, by key.
+    _deadlines = Any
+
+    # The expiry times of the spilled items which have one, by key.
+    _spilled_deadlines = Any
+
+    _hits = Int
+
+    _misses = Int
+
+    _evictions = Int
+
+    _expirations = Int
+
+    # The computations in progress in `get_or_compute`, by key.
+    _pending = Any
+
     def __init__(self, size, **traits):
         self.size = size
+        self._pending = {}
         self._initialize_cache()
         super(LRUCache, self).__init__(**traits)
 
@@ -52,22 +187,173 @@ class LRUCache(HasStrictTraits):
         with self._lock:
             if self._cache is None:
                 self._cache = OrderedDict()
+                self._policy = POLICIES[self.policy]()
             else:
                 self._cache.clear()
+                self._policy.clear()
+            self._weights = {}
+            self._current_weight = 0
+            self._deadlines = {}
+            self._spilled_deadlines = {}
+            if self.spill_store is not None:
+                self.spill_store.clear()
 
     def _renew(self, key):
         with self._lock:
             r = self._cache.pop(key)
             self._cache[key] = r
+            self._policy.touch(key)
         return r
 
+    def _weigh(self, value):
+        if self.weigher is None:
+            return 1
+        return int(self.weigher(value))
+
+    def _is_over_budget(self):
+        if self.size < len(self._cache):
+            return True
+        return 0 < self.max_weight < self._current_weight
+
+    def _remove(self, key):
+        """ Remove `key` from the cache and return its (key, value) pair.
+
+        The policy is not told about it.
+        """
+        value = self._cache.pop(key)
+        self._current_weight -= self._weights.pop(key)
+        self._deadlines.pop(key, None)
+        return key, value
+
+    def _add(self, key, value, weight):
+        self._cache[key] = value
+        self._weights[key] = weight
+        self._current_weight += weight
+
+    def _insert(self, key, value, deadline):
+        """ Add an item, evicting others as needed, and return the items to
+        drop.
+        """
+        dropped = []
+        weight = self._weigh(value)
+        replaced = key in self._cache
+        if replaced:
+            self._remove(key)
+        elif self.spill_store is not None:
+            self._spilled_deadlines.pop(key, None)
+            self.spill_store.discard(key)
+
+        if 0 < self.max_weight < weight:
+            # The value can never fit: don't flush the whole cache trying to
+            # make room for it.
+            if replaced:
+                self._policy.remove(key)
+            self._evictions += 1
+            dropped.extend(self._evict(key, value, deadline))
+            return dropped
+
+        self._add(key, value, weight)
+        if replaced:
+            self._policy.touch(key)
+        else:
+            self._policy.add(key)
+        if deadline is not None:
+            self._deadlines[key] = deadline
+        while self._is_over_budget():
+            self._evictions += 1
+            victim = self._policy.evict()
+            deadline = self._deadlines.get(victim)
+            dropped.extend(self._evict(*self._remove(victim),
+                                       deadline=deadline))
+        if self._current_weight > self._peak_weight:
+            self._peak_weight = self._current_weight
+        return dropped
+
+    def _evict(self, key, value, deadline=None):
+        """ Spill an item evicted from memory if possible, otherwise return
+        it to be dropped.
+        """
+        if self.spill_store is not None and self.spill_store.put(key, value):
+            if deadline is not None:
+                self._spilled_deadlines[key] = deadline
+            # Make room in the store by dropping the items spilled first.
+            dropped = []
+            for victim in self.spill_store.excess_keys():
+                self._spilled_deadlines.pop(victim, None)
+                if self.cache_drop_callback is None:
+                    self.spill_store.discard(victim)
+                else:
+                    dropped.append((victim, self.spill_store.pop(victim)))
+            return dropped
+        return [(key, value)]
+
+    def _lookup(self, key):
+        """ Look `key` up, moving it back to memory if it was spilled.
+
+        Return a (found, value, dropped, moved) tuple, where `dropped` are
+        the items to drop and `moved` tells if the key was moved to memory.
+        """
+        dropped = self._expire_item(key)
+        if key in self._cache:
+            self._hits += 1
+            return True, self._renew(key), dropped, False
+
+        if self.spill_store is not None and key in self.spill_store:
+            deadline = self._spilled_deadlines.pop(key, None)
+            value = self.spill_store.pop(key)
+            if deadline is not None and deadline <= self.clock():
+                self._expirations += 1
+                dropped.append((key, value))
+            else:
+                self._hits += 1
+                dropped.extend(self._insert(key, value, deadline))
+                return True, value, dropped, True
+
+        self._misses += 1
+        return False, None, dropped, False
+
+    def _is_spilled(self, key):
+        if self.spill_store is None or key not in self.spill_store:
+            return False
+        deadline = self._spilled_deadlines.get(key)
+        return deadline is None or self.clock() < deadline
+
+    def _expire_item(self, key):
+        """ Remove `key` if it has expired and return the dropped items.
+        """
+        deadline = self._deadlines.get(key)
+        if deadline is None or self.clock() < deadline:
+            return []
+        self._expirations += 1
+        self._policy.remove(key)
+        return [self._remove(key)]
+
+    def _discard(self, key, value):
+        """ Remove `key` if it is still cached with `value`, without telling
+        the `cache_drop_callback`.
+        """
+        with self._lock:
+            if key in self._cache and self._cache[key] is value:
+                self._policy.remove(key)
+                self._remove(key)
+
+    def _drop(self, dropped):
+        if self.cache_drop_callback is not None:
+            for item in dropped:
+                self.cache_drop_callback(*item)
+
     # -------------------------------------------------------------------------
     # LRUCache interface
     # -------------------------------------------------------------------------
 
     def __contains__(self, key):
         with self._lock:
-            return key in self._cache
+            expired = self._expire_item(key)
+            result = key in self._cache or self._is_spilled(key)
+        if expired:
+            self._drop(expired)
+            self.updated = self.keys()
+        return result
 
     def __len__(self):
         with self._lock:
@@ -75,18 +361,31 @@ class LRUCache(HasStrictTraits):
 
     def __getitem__(self, key):
         with self._lock:
-            return self._renew(key)
+            found, result, dropped, moved = self._lookup(key)
+        if dropped:
+            self._drop(dropped)
+        if dropped or moved:
+            self.updated = self.keys()
+        if not found:
+            raise KeyError(key)
+        return result
 
     def __setitem__(self, key, result):
+        self.set(key, result)
+
+    def set(self, key, result, ttl=None):
+        """ Cache `result` under `key`.
+
+        The item expires after `ttl` seconds, which defaults to the `ttl` of
+        the cache.  A `ttl` of zero means that the item never expires.
+        """
+        if ttl is None:
+            ttl = self.ttl
         try:
-            dropped = None
             with self._lock:
-                self._cache[key] = result
-                self._renew(key)
-                if self.size < len(self._cache):
-                    dropped = self._cache.popitem(last=False)
-            if dropped and self.cache_drop_callback is not None:
-                self.cache_drop_callback(*dropped)
+                deadline = self.clock() + ttl if ttl > 0 else None
+                dropped = self._insert(key, result, deadline)
+            self._drop(dropped)
         finally:
             self.updated = self.keys()
 
@@ -96,6 +395,54 @@ class LRUCache(HasStrictTraits):
         except KeyError:
             return default
 
+    def get_or_compute(self, key, factory):
+        """ Return the item for `key`, calling `factory()` to compute and
+        cache it if it is missing.
+
+        When several threads miss the same key at once, only the first one
+        calls `factory`; the others wait for its result.  If `factory`
+        raises, all of them get the exception and nothing is cached.  They
+        also all get the exception, and the result is not kept, if caching
+        it raises, e.g. in a `cache_drop_callback` or a listener of
+        `updated`.
+        """
+        with self._lock:
+            found, result, dropped, moved = self._lookup(key)
+            if not found:
+                pending = self._pending.get(key)
+                is_owner = pending is None
+                if is_owner:
+                    pending = self._pending[key] = _PendingResult()
+        if dropped:
+            self._drop(dropped)
+        if dropped or moved:
+            self.updated = self.keys()
+
+        if found:
+            return result
+        elif not is_owner:
+            return pending.wait()
+
+        try:
+            result = factory()
+            # Cache the result before forgetting the computation, so that
+            # the threads arriving in between find it.
+            try:
+                self[key] = result
+            except BaseException:
+                # Don't keep a result the waiters are told has failed.
+                self._discard(key, result)
+                raise
+        except BaseException as exc:
+            pending.set_exception(exc)
+            raise
+        else:
+            pending.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._pending[key]
+
     def items(self):
         with self._lock:
             return self._cache.items()
@@ -112,3 +459,99 @@ class LRUCache(HasStrictTraits):
         with self._lock:
             self._initialize_cache()
         self.updated = []
+
+    def expire(self):
+        """ Drop all the expired items and return how many there were.
+        """
+        with self._lock:
+            now = self.clock()
+            keys = [key for key, deadline in self._deadlines.items()
+                    if deadline <= now]
+            for key in keys:
+                self._policy.remove(key)
+            dropped = [self._remove(key) for key in keys]
+            spilled_keys = [
+                key for key, deadline in self._spilled_deadlines.items()
+                if deadline <= now
+            ]
+            for key in spilled_keys:
+                del self._spilled_deadlines[key]
+                dropped.append((key, self.spill_store.pop(key)))
+            self._expirations += len(dropped)
+        if dropped:
+            self._drop(dropped)
+            self.updated = self.keys()
+        return len(dropped)
+
+    # -------------------------------------------------------------------------
+    # Private interface
+    # -------------------------------------------------------------------------
+
+    def _get_current_weight(self):
+        return self._current_weight
+
+    def _get_peak_weight(self):
+        return self._peak_weight
+
+    def _get_hits(self):
+        return self._hits
+
+    def _get_misses(self):
+        return self._misses
+
+    def _get_evictions(self):
+        return self._evictions
+
+    def _get_expirations(self):
+        return self._expirations
+
+    def _clock_default(self):
+        return _monotonic
+
+    def _policy_changed(self):
+        with self._lock:
+            if self._cache is None:
+                return
+            self._policy = POLICIES[self.policy]()
+            for key in self._cache:
+                self._policy.add(key)
+
+
+def lru_cached(size=128, key=None):
+    """ Decorator memoizing a function in an `LRUCache` of the given `size`.
+
+    `key` is called with the arguments of the function and returns the
+    cache key for them.  By default the positional and keyword arguments
+    themselves are used, so they must be hashable.
+
+    Concurrent calls with the same key compute the value only once (see
+    `LRUCache.get_or_compute`).  The cache is available as the `cache`
+    attribute of the decorated function.
+    """
+    def decorator(func):
+        cache = LRUCache(size)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if key is None:
+                cache_key = _make_key(args, kwargs)
+            else:
+                cache_key = key(*args, **kwargs)
+            return cache.get_or_compute(
+                cache_key, lambda: func(*args, **kwargs)
+            )
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+# Separates the positional from the keyword arguments in the default keys.
+_KWARGS_MARK = object()
+
+
+def _make_key(args, kwargs):
+    if not kwargs:
+        return args
+    return args + (_KWARGS_MARK,) + tuple(sorted(kwargs.items()))
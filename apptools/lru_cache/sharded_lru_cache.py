@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+# Copyright (c) 2015, Enthought, Inc.
+# All rights reserved.
+#
+# This software is provided without warranty under the terms of the BSD
+# license included in enthought/LICENSE.txt and may be redistributed only
+# under the conditions described in the aforementioned license.  The license
+# is also available online at http://www.enthought.com/licenses/BSD.txt
+# Thanks for using Enthought open source!
+#
+# Author: Enthought, Inc.
+# -----------------------------------------------------------------------------
+
+from threading import Lock
+
+from traits.api import Callable, HasStrictTraits, Int, List, ReadOnly
+
+from .fast_lru_cache import FastLRUCache
+
+
+class ShardedLRUCache(HasStrictTraits):
+    """ A thread-safe least-recently used cache for highly concurrent use.
+
+    The keys are hashed across `shards` independent `FastLRUCache` segments,
+    each with its own lock, so that threads working on different keys do
+    not wait for each other.  Each segment holds at most ``size / shards``
+    items (rounded up), so the least recently used order is only followed
+    within a segment.
+
+    `keys`, `items` and `values` gather the segments one after the other;
+    they are not a snapshot of the whole cache if it is being modified.
+
+    """
+
+    size = Int
+
+    # The number of independent segments (16 by default).  This cannot be
+    # changed after the cache is created.
+    shards = ReadOnly
+
+    # Called with the key and value that was dropped from the cache.  It is
+    # called without holding any lock.
+    cache_drop_callback = Callable
+
+    # The segments, their locks and the items dropped by each of them but
+    # not yet given to `cache_drop_callback`.
+    _segments = List
+    _locks = List
+    _dropped = List
+
+    def __init__(self, size, shards=16, **traits):
+        super(ShardedLRUCache, self).__init__(shards=shards, **traits)
+        if self.shards < 1:
+            raise ValueError('A cache needs at least one shard.')
+        self._locks = [Lock() for i in range(self.shards)]
+        self._dropped = [[] for i in range(self.shards)]
+        self._segments = [
+            FastLRUCache(0, cache_drop_callback=self._make_drop_hook(dropped))
+            for dropped in self._dropped
+        ]
+        self.size = size
+
+    def _make_drop_hook(self, dropped):
+        def hook(key, value):
+            dropped.append((key, value))
+        return hook
+
+    def _update_segment_sizes(self):
+        segment_size = -(-self.size // self.shards)
+        for segment, lock in zip(self._segments, self._locks):
+            with lock:
+                segment.size = segment_size
+
+    def _size_changed(self):
+        if self._segments:
+            self._update_segment_sizes()
+
+    # -------------------------------------------------------------------------
+    # LRUCache interface
+    # -------------------------------------------------------------------------
+
+    def __contains__(self, key):
+        index = hash(key) % self.shards
+        with self._locks[index]:
+            return key in self._segments[index]
+
+    def __len__(self):
+        total = 0
+        for segment, lock in zip(self._segments, self._locks):
+            with lock:
+                total += len(segment)
+        return total
+
+    def __getitem__(self, key):
+        index = hash(key) % self.shards
+        with self._locks[index]:
+            return self._segments[index][key]
+
+    def __setitem__(self, key, result):
+        index = hash(key) % self.shards
+        dropped = self._dropped[index]
+        with self._locks[index]:
+            self._segments[index][key] = result
+            # Take the dropped items while the segment is locked and hand
+            # them to the callback once it is released.
+            items = dropped[:]
+            del dropped[:]
+        if items and self.cache_drop_callback is not None:
+            for item in items:
+                self.cache_drop_callback(*item)
+
+    def get(self, key, default=None):
+        index = hash(key) % self.shards
+        with self._locks[index]:
+            return self._segments[index].get(key, default)
+
+    def items(self):
+        result = []
+        for segment, lock in zip(self._segments, self._locks):
+            with lock:
+                result.extend(segment.items())
+        return result
+
+    def keys(self):
+        result = []
+        for segment, lock in zip(self._segments, self._locks):
+            with lock:
+                result.extend(segment.keys())
+        return result
+
+    def values(self):
+        result = []
+        for segment, lock in zip(self._segments, self._locks):
+            with lock:
+                result.extend(segment.values())
+        return result
+
+    def clear(self):
+        for segment, lock in zip(self._segments, self._locks):
+            with lock:
+                segment.clear()
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+# Copyright (c) 2015, Enthought, Inc.
+# All rights reserved.
+#
+# This software is provided without warranty under the terms of the BSD
+# license included in enthought/LICENSE.txt and may be redistributed only
+# under the conditions described in the aforementioned license.  The license
+# is also available online at http://www.enthought.com/licenses/BSD.txt
+# Thanks for using Enthought open source!
+#
+# Author: Enthought, Inc.
+# -----------------------------------------------------------------------------
+
+import itertools
+import os
+import pickle
+import shutil
+import tempfile
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+
+class SpillStore(object):
+    """ The base class of the on-disk stores where an `LRUCache` puts the
+    items it evicts from memory.
+
+    A store may be bounded by the number of values it holds, `max_items`,
+    and by their total size in bytes, `max_bytes`.  The cache then removes
+    the values stored first, as given by `excess_keys`, after each `put`.
+
+    Subclasses store the values, and report the sizes of those they add and
+    remove with `_add_size` and `_remove_size`.
+
+    The stores are only accessed with the lock of their cache held.
+
+    Parameters
+    ----------
+    max_items : int
+        The maximum number of values stored.  Zero means no limit.
+    max_bytes : int
+        The maximum total size of the values stored, in bytes.  Zero means
+        no limit.
+    """
+
+    def __init__(self, max_items=0, max_bytes=0):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        # The sizes of the stored values, by key, the first stored first.
+        self._sizes = OrderedDict()
+        self._nbytes = 0
+
+    def __contains__(self, key):
+        return key in self._sizes
+
+    def __len__(self):
+        return len(self._sizes)
+
+    @property
+    def nbytes(self):
+        """ The total size of the values stored, in bytes. """
+        return self._nbytes
+
+    def put(self, key, value):
+        """ Store `value` under `key`, replacing any previous value.
+
+        Return False if this store cannot hold `value`, in which case the
+        cache drops it.  This includes values larger than `max_bytes`, and
+        failures to write to the disk.
+        """
+        raise NotImplementedError
+
+    def pop(self, key):
+        """ Remove the value stored under `key` and return it.
+
+        Raise a KeyError if there is none.
+        """
+        raise NotImplementedError
+
+    def discard(self, key):
+        """ Remove the value stored under `key`, if any. """
+        raise NotImplementedError
+
+    def clear(self):
+        """ Remove all the stored values. """
+        raise NotImplementedError
+
+    def close(self):
+        """ Remove all the stored values and release the resources of the
+        store.
+        """
+        self.clear()
+
+    def excess_keys(self):
+        """ Return the keys of the values to remove, the first stored first,
+        for the store to be within `max_items` and `max_bytes`.
+        """
+        keys = []
+        count, nbytes = len(self._sizes), self._nbytes
+        for key, size in self._sizes.items():
+            if not (0 < self.max_items < count or
+                    0 < self.max_bytes < nbytes):
+                break
+            keys.append(key)
+            count -= 1
+            nbytes -= size
+        return keys
+
+    def _add_size(self, key, size):
+        self._sizes[key] = size
+        self._nbytes += size
+
+    def _remove_size(self, key):
+        self._nbytes -= self._sizes.pop(key)
+
+
+class PickleDirectoryStore(SpillStore):
+    """ A store pickling each value to a file of a local directory.
+
+    The size of a value is the size of its file.
+
+    Parameters
+    ----------
+    directory : str
+        The directory holding the files, which is created if needed.  By
+        default a private temporary directory is created, and removed by
+        `close`.  It should be on a local disk: reading the spilled items
+        back is on the critical path of the cache lookups.
+    protocol : int
+        The pickle protocol used to write the values.
+    max_items, max_bytes : int
+        See `SpillStore`.
+    """
+
+    def __init__(self, directory=None, protocol=pickle.HIGHEST_PROTOCOL,
+                 max_items=0, max_bytes=0):
+        super(PickleDirectoryStore, self).__init__(max_items, max_bytes)
+        self._owns_directory = directory is None
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix='lru_cache_')
+        elif not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.protocol = protocol
+        # The files holding the values, by key.  The file names are not
+        # derived from the keys since those need not be strings.
+        self._files = {}
+        self._counter = itertools.count()
+
+    def put(self, key, value):
+        path = os.path.join(self.directory,
+                            '{0}.pkl'.format(next(self._counter)))
+        try:
+            with open(path, 'wb') as f:
+                pickle.dump(value, f, self.protocol)
+            size = os.path.getsize(path)
+        except (pickle.PicklingError, TypeError, AttributeError,
+                EnvironmentError):
+            _remove_file(path)
+            return False
+        if 0 < self.max_bytes < size:
+            _remove_file(path)
+            return False
+        self.discard(key)
+        self._files[key] = path
+        self._add_size(key, size)
+        return True
+
+    def pop(self, key):
+        path = self._files.pop(key)
+        self._remove_size(key)
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        finally:
+            _remove_file(path)
+
+    def discard(self, key):
+        path = self._files.pop(key, None)
+        if path is not None:
+            self._remove_size(key)
+            _remove_file(path)
+
+    def clear(self):
+        for path in self._files.values():
+            _remove_file(path)
+        self._files.clear()
+        self._sizes.clear()
+        self._nbytes = 0
+
+    def close(self):
+        self.clear()
+        if self._owns_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def _remove_file(path):
+    """ Remove a file if possible: a file left behind only wastes space. """
+    try:
+        os.remove(path)
+    except EnvironmentError:
+        pass
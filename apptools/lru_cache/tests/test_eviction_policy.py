@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, print_function
+
+from nose.tools import assert_equal
+
+from ..eviction_policy import LRUPolicy, SegmentedLRUPolicy, TwoQueuePolicy
+
+
+def test_lru_policy():
+    policy = LRUPolicy()
+    for key in 'abc':
+        policy.add(key)
+    policy.touch('a')
+    policy.remove('b')
+    assert_equal('c', policy.evict())
+    assert_equal('a', policy.evict())
+
+
+def test_two_queue_policy_fifo():
+    policy = TwoQueuePolicy()
+    for key in 'abc':
+        policy.add(key)
+
+    # Accessing a key of the FIFO queue does not save it.
+    policy.touch('a')
+    assert_equal('a', policy.evict())
+    assert_equal('b', policy.evict())
+
+
+def test_two_queue_policy_promotion():
+    policy = TwoQueuePolicy(in_ratio=0.25, out_ratio=1.0)
+    for key in 'abcd':
+        policy.add(key)
+    assert_equal('a', policy.evict())
+
+    # A key added back soon after being evicted is frequently used.
+    policy.add('a')
+    for key in 'efgh':
+        policy.add(key)
+        policy.evict()
+    policy.touch('a')
+    assert_equal(['a'], list(policy._main))
+
+    policy.remove('a')
+    policy.clear()
+    policy.add('x')
+    assert_equal('x', policy.evict())
+
+
+def test_segmented_lru_policy():
+    policy = SegmentedLRUPolicy(protected_ratio=0.5)
+    for key in 'abcd':
+        policy.add(key)
+    policy.touch('a')
+    policy.touch('b')
+    policy.touch('c')
+    policy.touch('a')
+
+    # 'b' is demoted back to probation to keep half of the keys there.
+    assert_equal('d', policy.evict())
+    assert_equal('b', policy.evict())
+    assert_equal('c', policy.evict())
+    assert_equal('a', policy.evict())
+
+
+def test_segmented_lru_policy_remove():
+    policy = SegmentedLRUPolicy()
+    for key in 'ab':
+        policy.add(key)
+    policy.touch('a')
+    policy.remove('a')
+    policy.remove('b')
+    policy.add('c')
+    assert_equal('c', policy.evict())
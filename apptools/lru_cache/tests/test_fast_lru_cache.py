@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, print_function
+
+from nose.tools import assert_equal
+
+from ..fast_lru_cache import FastLRUCache
+
+
+def test_cache_callback():
+    dropped = []
+    callback = lambda *args: dropped.append(args)
+    c = FastLRUCache(2, cache_drop_callback=callback)
+    for i in range(5):
+        c[i] = str(i)
+
+    expected = [(0, '0'), (1, '1'), (2, '2')]
+    assert_equal(expected, dropped)
+
+
+def test_cache_len():
+    c = FastLRUCache(2)
+    assert_equal(0, len(c))
+    c[0] = None
+    assert_equal(1, len(c))
+    c[1] = None
+    assert_equal(2, len(c))
+    c[2] = None
+    assert_equal(2, len(c))
+    assert_equal(2, c.size)
+
+
+def test_cache_recency():
+    c = FastLRUCache(3)
+    for i in range(3):
+        c[i] = i
+
+    # Touching 0 makes 1 the least recently used entry.
+    assert_equal(0, c[0])
+    c[3] = 3
+    assert 1 not in c
+    assert_equal([2, 0, 3], c.keys())
+
+    # As does overwriting an existing entry.
+    c[2] = 'two'
+    c[4] = 4
+    assert 0 not in c
+    assert_equal([3, 2, 4], c.keys())
+    assert_equal([3, 'two', 4], c.values())
+    assert_equal([(3, 3), (2, 'two'), (4, 4)], c.items())
+
+
+def test_cache_resize():
+    c = FastLRUCache(1)
+    c[0] = 0
+    c[1] = 1
+    assert_equal([1], c.keys())
+
+    c.size = 3
+    c[2] = 2
+    c[3] = 3
+    assert_equal([1, 2, 3], c.keys())
+    c[4] = 4
+    assert_equal([2, 3, 4], c.keys())
+
+
+def test_cache_get():
+    c = FastLRUCache(2)
+    c[0] = 0
+    c[1] = 1
+    assert_equal(0, c.get(0))
+    assert_equal(None, c.get(2))
+    assert_equal('x', c.get(2, 'x'))
+    # `get` renews the entry too.
+    c[2] = 2
+    assert_equal([0, 2], c.keys())
+
+
+def test_cache_clear():
+    c = FastLRUCache(2)
+    for i in range(c.size):
+        c[i] = i
+    c.clear()
+    assert_equal(0, len(c))
+    assert_equal([], c.keys())
+    c[5] = 5
+    assert_equal([5], c.keys())
+
+
+def test_updated_event_is_opt_in():
+    c = FastLRUCache(2)
+    events = []
+    c.on_trait_change(lambda x: events.append(x), 'updated')
+
+    c[0] = 0
+    c[1] = 1
+    assert_equal([], events)
+
+    c.flush_updated()
+    assert_equal([[0, 1]], events)
+
+    # Nothing changed, so nothing is fired.
+    c[1]
+    c[1] = 'one'
+    c.flush_updated()
+    assert_equal([[0, 1]], events)
+
+
+def test_batch_updates():
+    c = FastLRUCache(2)
+    events = []
+    c.on_trait_change(lambda x: events.append(x), 'updated')
+
+    with c.batch_updates():
+        for i in range(5):
+            c[i] = i
+        with c.batch_updates():
+            c[5] = 5
+        c.flush_updated()
+        assert_equal([], events)
+    assert_equal([[4, 5]], events)
+
+    with c.batch_updates():
+        c[5]
+    assert_equal([[4, 5]], events)
+
+    c.clear()
+    assert_equal([[4, 5], []], events)
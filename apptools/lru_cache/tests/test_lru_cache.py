@@ -3,9 +3,13 @@
 
 from __future__ import division, print_function
 
-from nose.tools import assert_equal
+import threading
+import time
 
-from ..lru_cache import LRUCache
+from nose.tools import assert_equal, assert_raises
+
+from ..lru_cache import LRUCache, lru_cached
+from ..spill_store import PickleDirectoryStore
 
 
 def test_cache_callback():
@@ -156,3 +160,443 @@ def test_updated_event():
 
     c.get(3)
     assert_equal(sorted(events), [[0], [0, 1], [1, 2]])
+
+
+def test_cache_weight():
+    c = LRUCache(10, weigher=len, max_weight=6)
+    c['a'] = 'xx'
+    c['b'] = 'yyy'
+    assert_equal(5, c.current_weight)
+    assert_equal(5, c.peak_weight)
+
+    # Overwriting an entry replaces its weight.
+    c['a'] = 'x'
+    assert_equal(4, c.current_weight)
+    assert_equal(5, c.peak_weight)
+
+
+def test_cache_weight_eviction():
+    dropped = []
+    callback = lambda *args: dropped.append(args)
+    c = LRUCache(10, weigher=len, max_weight=6, cache_drop_callback=callback)
+    c['a'] = 'xx'
+    c['b'] = 'yy'
+    c['c'] = 'zz'
+    c['a']
+    c['d'] = 'wwww'
+
+    # Both 'b' and 'c' had to go to make room for 'd'.
+    assert_equal([('b', 'yy'), ('c', 'zz')], dropped)
+    assert_equal(['a', 'd'], sorted(c.keys()))
+    assert_equal(6, c.current_weight)
+    assert_equal(6, c.peak_weight)
+
+
+def test_cache_weight_too_heavy():
+    dropped = []
+    callback = lambda *args: dropped.append(args)
+    c = LRUCache(10, weigher=len, max_weight=3, cache_drop_callback=callback)
+    c['a'] = 'x'
+    c['b'] = 'yyyy'
+
+    # A value heavier than the whole budget doesn't flush the cache.
+    assert_equal([('b', 'yyyy')], dropped)
+    assert_equal(['a'], list(c.keys()))
+    assert_equal(1, c.current_weight)
+
+
+def test_cache_weight_size_bound():
+    c = LRUCache(2, weigher=len, max_weight=100)
+    for key in 'abc':
+        c[key] = 'xx'
+    assert_equal(['b', 'c'], sorted(c.keys()))
+    assert_equal(4, c.current_weight)
+
+    c.clear()
+    assert_equal(0, c.current_weight)
+    assert_equal(4, c.peak_weight)
+
+
+def test_cache_default_weight():
+    c = LRUCache(2)
+    for i in range(3):
+        c[i] = i
+    assert_equal(2, c.current_weight)
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_ttl():
+    dropped = []
+    callback = lambda *args: dropped.append(args)
+    clock = FakeClock()
+    c = LRUCache(10, ttl=5, clock=clock, cache_drop_callback=callback)
+    c[0] = 0
+    c.set(1, 1, ttl=20)
+    c.set(2, 2, ttl=0)
+
+    clock.now = 4.0
+    assert_equal(0, c[0])
+
+    # Expired items are dropped lazily on access.
+    clock.now = 5.0
+    assert 0 not in c
+    assert_equal(None, c.get(0))
+    assert_equal([(0, 0)], dropped)
+    assert_equal(1, c.expirations)
+
+    clock.now = 100.0
+    assert_equal(None, c.get(1))
+    assert_equal(2, c[2])
+    assert_equal([2], list(c.keys()))
+
+
+def test_cache_expire():
+    dropped = []
+    callback = lambda *args: dropped.append(args)
+    clock = FakeClock()
+    c = LRUCache(10, clock=clock, cache_drop_callback=callback)
+    for i in range(4):
+        c.set(i, i, ttl=i)
+
+    clock.now = 2.0
+    assert_equal(2, c.expire())
+    assert_equal([(1, 1), (2, 2)], sorted(dropped))
+    assert_equal([0, 3], sorted(c.keys()))
+    assert_equal(2, c.expirations)
+    assert_equal(0, c.expire())
+
+    # Setting an item again renews its deadline.
+    c.set(3, 3, ttl=10)
+    clock.now = 5.0
+    assert_equal(0, c.expire())
+    assert_equal([0, 3], sorted(c.keys()))
+
+
+def test_cache_expire_updated_event():
+    clock = FakeClock()
+    c = LRUCache(10, ttl=1, clock=clock)
+    c[0] = 0
+    c[1] = 1
+    events = []
+    c.on_trait_change(lambda x: events.append(x), 'updated')
+
+    clock.now = 1.0
+    c.expire()
+    assert_equal([[]], events)
+
+
+def test_cache_stats():
+    c = LRUCache(2)
+    c[0] = 0
+    c[1] = 1
+    c[0]
+    c.get(0)
+    c.get(5)
+    c[2] = 2
+    c[3] = 3
+    try:
+        c[1]
+    except KeyError:
+        pass
+
+    assert_equal(2, c.hits)
+    assert_equal(2, c.misses)
+    assert_equal(2, c.evictions)
+    assert_equal(0, c.expirations)
+
+
+def test_get_or_compute():
+    c = LRUCache(2)
+    assert_equal('0', c.get_or_compute(0, lambda: '0'))
+    assert_equal('0', c.get_or_compute(0, lambda: 'other'))
+    assert_equal(['0'], list(c.values()))
+    assert_equal(1, c.hits)
+    assert_equal(1, c.misses)
+
+
+def test_get_or_compute_single_flight():
+    c = LRUCache(2)
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def factory():
+        calls.append(None)
+        started.set()
+        release.wait()
+        return 'value'
+
+    results = []
+
+    def worker():
+        results.append(c.get_or_compute(0, factory))
+
+    threads = [threading.Thread(target=worker) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    started.wait()
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert_equal(1, len(calls))
+    assert_equal(['value'] * 8, results)
+
+
+def test_get_or_compute_exception():
+    c = LRUCache(2)
+
+    def factory():
+        raise ValueError('failed')
+
+    assert_raises(ValueError, c.get_or_compute, 0, factory)
+    assert 0 not in c
+
+    # A failed computation is not remembered.
+    assert_equal(1, c.get_or_compute(0, lambda: 1))
+
+
+def test_get_or_compute_callback_exception():
+    def callback(key, value):
+        raise RuntimeError('callback failed')
+
+    c = LRUCache(1, cache_drop_callback=callback)
+    c[1] = 'x'
+    started = threading.Event()
+    calls = []
+
+    def factory():
+        started.set()
+        # Wait for the other thread to miss the key too: it then waits for
+        # this computation.
+        deadline = time.time() + 5
+        while c.misses < 2 and time.time() < deadline:
+            time.sleep(0.001)
+        return 'value'
+
+    def other():
+        calls.append(None)
+        return 'other'
+
+    errors = []
+
+    def worker(factory):
+        try:
+            c.get_or_compute(0, factory)
+        except RuntimeError as exc:
+            errors.append(exc)
+
+    owner = threading.Thread(target=worker, args=(factory,))
+    owner.start()
+    started.wait()
+    thread = threading.Thread(target=worker, args=(other,))
+    # Not to hang the tests if the thread is never woken up.
+    thread.daemon = True
+    thread.start()
+    owner.join()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert_equal(2, c.misses)
+    assert_equal([], calls)
+    assert_equal(2, len(errors))
+    assert errors[0] is errors[1]
+    assert 0 not in c
+
+    # The failed computation is not remembered.
+    assert_equal('new', c.get_or_compute(0, lambda: 'new'))
+
+
+def test_lru_cached():
+    calls = []
+
+    @lru_cached(size=2)
+    def square(x, offset=0):
+        calls.append(x)
+        return x * x + offset
+
+    assert_equal(4, square(2))
+    assert_equal(4, square(2))
+    assert_equal(5, square(2, offset=1))
+    assert_equal([2, 2], calls)
+    assert_equal(2, len(square.cache))
+    assert_equal('square', square.__name__)
+
+
+def test_lru_cached_key():
+    calls = []
+
+    @lru_cached(size=2, key=lambda items: tuple(items))
+    def total(items):
+        calls.append(items)
+        return sum(items)
+
+    assert_equal(3, total([1, 2]))
+    assert_equal(3, total([1, 2]))
+    assert_equal([[1, 2]], calls)
+
+
+def test_cache_spill():
+    dropped = []
+    callback = lambda *args: dropped.append(args)
+    store = PickleDirectoryStore()
+    c = LRUCache(2, spill_store=store, cache_drop_callback=callback)
+    try:
+        for i in range(4):
+            c[i] = str(i)
+
+        assert_equal([], dropped)
+        assert_equal([2, 3], sorted(c.keys()))
+        assert_equal(2, len(store))
+        assert 0 in c
+
+        # Looking a spilled item up moves it back to memory, spilling the
+        # least recently used one.
+        assert_equal('0', c[0])
+        assert_equal([0, 3], sorted(c.keys()))
+        assert_equal(['1', '2'], sorted(store.pop(key) for key in (1, 2)))
+        assert_equal(3, c.evictions)
+        assert_equal(1, c.hits)
+
+        c.clear()
+        assert_equal(0, len(store))
+    finally:
+        store.close()
+
+
+def test_cache_spill_bounded():
+    dropped = []
+    callback = lambda *args: dropped.append(args)
+    store = PickleDirectoryStore(max_items=2)
+    c = LRUCache(1, spill_store=store, cache_drop_callback=callback)
+    try:
+        for i in range(5):
+            c[i] = i
+
+        # The items spilled first are dropped.
+        assert_equal([(0, 0), (1, 1)], dropped)
+        assert_equal(2, len(store))
+        assert 0 not in c
+        assert 2 in c
+    finally:
+        store.close()
+
+
+def test_cache_spill_unstorable():
+    dropped = []
+    callback = lambda *args: dropped.append(args)
+    store = PickleDirectoryStore()
+    c = LRUCache(1, spill_store=store, cache_drop_callback=callback)
+    try:
+        func = lambda: None
+        c[0] = func
+        c[1] = 1
+        assert_equal([(0, func)], dropped)
+        assert 0 not in c
+    finally:
+        store.close()
+
+
+def test_cache_spill_expiry():
+    dropped = []
+    callback = lambda *args: dropped.append(args)
+    clock = FakeClock()
+    store = PickleDirectoryStore()
+    c = LRUCache(1, spill_store=store, cache_drop_callback=callback,
+                 clock=clock)
+    try:
+        c.set(0, 0, ttl=1)
+        c.set(1, 1, ttl=1)
+        c.set(2, 2, ttl=5)
+        assert_equal(2, len(store))
+
+        clock.now = 1.0
+        assert 0 not in c
+        assert_equal(None, c.get(0))
+        assert_equal([(0, 0)], dropped)
+
+        assert_equal(1, c.expire())
+        assert_equal([(0, 0), (1, 1)], dropped)
+        assert_equal(0, len(store))
+        assert_equal(2, c[2])
+    finally:
+        store.close()
+
+
+def test_get_or_compute_spilled():
+    store = PickleDirectoryStore()
+    c = LRUCache(1, spill_store=store)
+    try:
+        c[0] = 0
+        c[1] = 1
+        assert_equal(0, c.get_or_compute(0, lambda: 'computed'))
+    finally:
+        store.close()
+
+
+def check_scan_resistance(policy):
+    c = LRUCache(10, policy=policy)
+    hot = list(range(5))
+
+    # The frequently used keys come back after other keys were used.
+    for i in range(3):
+        for key in hot + [i * 10 + 100 + j for j in range(4)]:
+            c.get_or_compute(key, lambda: None)
+
+    # A single scan over many keys...
+    for key in range(1000, 1100):
+        c[key] = None
+
+    # ... does not flush the frequently used items.
+    for key in hot:
+        assert key in c, (policy, key)
+
+
+def test_two_queue_policy_scan_resistance():
+    check_scan_resistance('2q')
+
+
+def test_segmented_lru_policy_scan_resistance():
+    check_scan_resistance('slru')
+
+
+def test_lru_policy_is_not_scan_resistant():
+    c = LRUCache(10)
+    for key in range(5):
+        c[key] = None
+        c[key]
+    for key in range(1000, 1010):
+        c[key] = None
+    assert_equal(list(range(1000, 1010)), sorted(c.keys()))
+
+
+def test_cache_policy_callback():
+    dropped = []
+    callback = lambda *args: dropped.append(args)
+    c = LRUCache(2, policy='slru', cache_drop_callback=callback)
+    c[0] = 0
+    c[1] = 1
+    c[0]
+    c[2] = 2
+    assert_equal([(1, 1)], dropped)
+    assert_equal([0, 2], sorted(c.keys()))
+
+
+def test_cache_policy_change():
+    c = LRUCache(3)
+    for i in range(3):
+        c[i] = i
+    c.policy = '2q'
+    c[3] = 3
+    assert_equal(3, len(c))
+    c.clear()
+    c[4] = 4
+    assert_equal([4], list(c.keys()))
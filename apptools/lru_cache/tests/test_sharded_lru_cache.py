@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, print_function
+
+import threading
+
+from nose.tools import assert_equal, assert_raises
+
+from traits.api import TraitError
+
+from ..sharded_lru_cache import ShardedLRUCache
+
+
+def test_cache_mapping():
+    c = ShardedLRUCache(100, shards=4)
+    for i in range(10):
+        c[i] = str(i)
+
+    assert_equal(10, len(c))
+    assert 3 in c
+    assert 10 not in c
+    assert_equal('3', c[3])
+    assert_equal('3', c.get(3))
+    assert_equal(None, c.get(10))
+    assert_raises(KeyError, lambda: c[10])
+    assert_equal(list(range(10)), sorted(c.keys()))
+    assert_equal([str(i) for i in range(10)], sorted(c.values()))
+    assert_equal([(i, str(i)) for i in range(10)], sorted(c.items()))
+
+    c.clear()
+    assert_equal(0, len(c))
+
+
+def test_cache_eviction_per_shard():
+    dropped = []
+    callback = lambda *args: dropped.append(args)
+    c = ShardedLRUCache(4, shards=2, cache_drop_callback=callback)
+
+    # Small integers hash to themselves, so the even keys share a shard.
+    for i in range(0, 8, 2):
+        c[i] = i
+    assert_equal([(0, 0), (2, 2)], dropped)
+    assert_equal([4, 6], sorted(c.keys()))
+
+    c[1] = 1
+    assert_equal(3, len(c))
+
+
+def test_cache_resize():
+    c = ShardedLRUCache(2, shards=2)
+    c.size = 4
+    for i in range(0, 8, 2):
+        c[i] = i
+    assert_equal([4, 6], sorted(c.keys()))
+
+
+def test_cache_needs_a_shard():
+    assert_raises(ValueError, ShardedLRUCache, 10, shards=0)
+
+
+def test_cache_shards_read_only():
+    c = ShardedLRUCache(10)
+    assert_equal(16, c.shards)
+    with assert_raises(TraitError):
+        c.shards = 4
+
+    c = ShardedLRUCache(10, shards=4)
+    with assert_raises(TraitError):
+        c.shards = 8
+    c[0] = 0
+    assert_equal(0, c[0])
+
+
+def test_cache_threads():
+    c = ShardedLRUCache(64, shards=8)
+    errors = []
+
+    def worker(offset):
+        try:
+            for i in range(2000):
+                key = (offset + i) % 200
+                c[key] = key
+                value = c.get(key)
+                assert value is None or value == key
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=worker, args=(i * 13,))
+               for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert_equal([], errors)
+    assert len(c) <= 64
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, print_function
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from nose.plugins.skip import SkipTest
+from nose.tools import assert_equal, assert_raises
+
+from ..spill_store import PickleDirectoryStore
+
+
+def check_store(store):
+    assert_equal(0, len(store))
+    assert store.put('a', np.arange(3))
+    assert store.put(('b', 1), np.ones(2))
+    assert 'a' in store
+    assert_equal(2, len(store))
+
+    # Storing again replaces the value.
+    assert store.put('a', np.arange(4))
+    assert_equal(2, len(store))
+    np.testing.assert_array_equal(np.arange(4), store.pop('a'))
+    assert 'a' not in store
+    assert_raises(KeyError, store.pop, 'a')
+
+    store.discard(('b', 1))
+    store.discard('missing')
+    assert_equal(0, len(store))
+
+    store.put('c', np.zeros(2))
+    store.clear()
+    assert 'c' not in store
+
+
+def test_pickle_directory_store():
+    store = PickleDirectoryStore()
+    directory = store.directory
+    check_store(store)
+
+    assert store.put('function', len)
+    assert not store.put('lambda', lambda: None)
+    assert 'function' in store
+    assert 'lambda' not in store
+    store.close()
+    assert not os.path.exists(directory)
+
+
+def test_pickle_directory_store_given_directory():
+    directory = tempfile.mkdtemp()
+    try:
+        store = PickleDirectoryStore(os.path.join(directory, 'spill'))
+        store.put('a', 1)
+        assert_equal(1, len(os.listdir(store.directory)))
+        store.close()
+        # A directory we were given is emptied but kept.
+        assert_equal([], os.listdir(store.directory))
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_pickle_directory_store_bounds():
+    store = PickleDirectoryStore(max_items=2)
+    try:
+        for key in 'abc':
+            store.put(key, key)
+        assert_equal(['a'], store.excess_keys())
+        store.discard('a')
+        assert_equal([], store.excess_keys())
+
+        store.max_items = 0
+        store.max_bytes = store.nbytes
+        store.put('d', 'd')
+        assert_equal(['b'], store.excess_keys())
+
+        # A value larger than the store can hold is not stored.
+        assert not store.put('e', 'e' * store.max_bytes)
+        assert 'e' not in store
+    finally:
+        store.close()
+
+
+def test_pickle_directory_store_write_error():
+    store = PickleDirectoryStore()
+    shutil.rmtree(store.directory)
+    try:
+        assert not store.put('a', 1)
+        assert 'a' not in store
+    finally:
+        store.close()
+
+
+def test_h5_array_spill_store():
+    try:
+        from ..h5_spill_store import H5ArraySpillStore
+    except ImportError:
+        raise SkipTest('PyTables is not available')
+
+    store = H5ArraySpillStore()
+    filename = store.filename
+    check_store(store)
+
+    assert not store.put('list', [1, 2])
+    assert not store.put('objects', np.array([None, 1]))
+    store.close()
+    assert not os.path.exists(filename)
+
+
+def test_h5_array_spill_store_compact():
+    try:
+        from ..h5_spill_store import COMPACT_MIN_BYTES, H5ArraySpillStore
+    except ImportError:
+        raise SkipTest('PyTables is not available')
+
+    store = H5ArraySpillStore(max_bytes=COMPACT_MIN_BYTES)
+    try:
+        array = np.ones(COMPACT_MIN_BYTES // 32)
+        for i in range(16):
+            store.put(i, array)
+            for key in store.excess_keys():
+                store.discard(key)
+        assert_equal(4, len(store))
+        np.testing.assert_array_equal(array, store.pop(15))
+
+        # The file does not keep the space of all the arrays written.
+        assert os.path.getsize(store.filename) < 4 * COMPACT_MIN_BYTES
+    finally:
+        store.close()
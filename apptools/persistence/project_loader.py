@@ -2,64 +2,158 @@
 # Standard library imports
 import sys
 import pickle
+import shutil
 import logging
 
 # Enthought library imports
 from apptools.persistence.versioned_unpickler import VersionedUnpickler
+from apptools.persistence.updater import ChainedUpdater
 
 
 logger = logging.getLogger(__name__)
 
 
 def load_project(pickle_filename, updater_path, application_version, protocol,
-                                                                  max_pass=-1):
+                                            max_pass=-1, save_upgrade=False):
     """ Reads a project from a pickle file and if necessary will update it to
     the latest version of the application.
-    """
 
-    latest_file = pickle_filename
+    The file is read once: all the updaters from the project's version to
+    the application's are applied while unpickling the project.  If
+    'save_upgrade' is True the original file is backed up and the updated
+    project is written next to it, as 'upgrade_project' does.
+    """
 
     # Read the pickled project's metadata.
-    f = open(latest_file, 'rb')
-    metadata = VersionedUnpickler(f).load(max_pass)
-    f.close()
-    project_version = metadata.get('version', False)
-
-    if not project_version:
-        raise ValueError, "Could not read version number from the project file"
-
-    logger.debug('Project version: %d, Application version: %d' %
-                (project_version, application_version))
-
-    # here you can temporarily force an upgrade each time for testing ....
-    # project_version = 0
-    latest_file = upgrade_project(pickle_filename, updater_path,
-                                project_version, application_version, protocol,
-                                max_pass)
-
-    # Finally we can import the project ...
-    logger.info('loading %s' % latest_file)
-    i_f = open(latest_file, 'rb')
-    version = VersionedUnpickler(i_f).load(max_pass)
-    project = VersionedUnpickler(i_f).load(max_pass)
-    i_f.close()
+    f = open(pickle_filename, 'rb')
+    try:
+        metadata = VersionedUnpickler(f).load(max_pass)
+        project_version = metadata.get('version', False)
+
+        if not project_version:
+            raise ValueError, "Could not read version number from the project file"
+
+        logger.debug('Project version: %d, Application version: %d' %
+                    (project_version, application_version))
+
+        if project_version < application_version:
+            logger.info('upgrading %s from version %d to %d' %
+                        (pickle_filename, project_version, application_version))
+            project = _upgrade(f, updater_path, project_version,
+                               application_version, max_pass)
+        else:
+            logger.info('loading %s' % pickle_filename)
+            project = VersionedUnpickler(f).load(max_pass)
+    finally:
+        f.close()
+
+    if save_upgrade and project_version < application_version:
+        _save_upgrade(pickle_filename, project, application_version, protocol)
 
     return project
 
 
-def upgrade_project(pickle_filename, updater_path, project_version, application_version, protocol, max_pass=-1):
-    """ Repeatedly read and write the project to disk updating it one version
-    at a time.
+def upgrade_project(pickle_filename, updater_path, project_version, application_version, protocol, max_pass=-1, intermediate_files=False):
+    """ Updates the project to the version of the application and writes it
+    to disk.
 
     Example the p5.project is at version 0
     The application is at version 3
 
+    p5.project    --- Update1, Update2, Update3 ---> p5.project.v3
+    p5.project.v3 ---> loaded into app
+
+    If 'intermediate_files' is True the project is instead read and written
+    once per version, keeping the intermediate versions:
+
     p5.project    --- Update1 ---> p5.project.v1
     p5.project.v1 --- Update2 ---> p5.project.v2
     p5.project.v2 --- Update3 ---> p5.project.v3
-    p5.project.v3 ---> loaded into app
 
-    The user then has the option to save the updated project as p5.project
+    The original file is backed up as p5.project.bak.  The user then has the
+    option to save the updated project as p5.project
+    """
+    if project_version >= application_version:
+        return pickle_filename
+
+    if intermediate_files:
+        return _upgrade_stepwise(pickle_filename, updater_path,
+                                 project_version, application_version,
+                                 protocol, max_pass)
+
+    logger.info('converting %s' % pickle_filename)
+    i_f = open(pickle_filename, 'rb')
+    try:
+        # skip the metadata, the version is given
+        VersionedUnpickler(i_f).load(max_pass)
+        project = _upgrade(i_f, updater_path, project_version,
+                           application_version, max_pass)
+    finally:
+        i_f.close()
+
+    return _save_upgrade(pickle_filename, project, application_version,
+                         protocol)
+
+
+def get_updater(updater_path, project_version, application_version):
+    """ Returns an updater applying all the updaters from 'updater_path'
+    needed to bring a project at 'project_version' to 'application_version'.
+    """
+    return ChainedUpdater([
+        _import_updater(updater_path, version)
+        for version in range(project_version + 1, application_version + 1)
+    ])
+
+
+def _import_updater(updater_path, version):
+    """ Returns the updater from 'version' - 1 to 'version'.
+    """
+    updater_name = '%s.update%d' % (updater_path, version)
+    __import__(updater_name)
+    mod = sys.modules[updater_name]
+    klass = getattr(mod, 'Update%d' % version)
+
+    return klass()
+
+
+def _upgrade(f, updater_path, project_version, application_version, max_pass):
+    """ Unpickles the project following its metadata in 'f', updating it to
+    'application_version' on the way.
+    """
+    updater = get_updater(updater_path, project_version, application_version)
+    unpickler = VersionedUnpickler(f, updater, finish=True)
+    try:
+        project = unpickler.load(max_pass)
+    finally:
+        unpickler.restore_setstates()
+
+    # set the project version to be the same as the last updater we just
+    # ran on the unpickled files ...
+    project.metadata['version'] = application_version
+
+    return project
+
+
+def _save_upgrade(pickle_filename, project, version, protocol):
+    """ Backs up the original project file and writes the updated project
+    next to it.  Returns the name of the new file.
+    """
+    shutil.copyfile(pickle_filename, '%s.bak' % pickle_filename)
+
+    name = '%s.v%d' % (pickle_filename, version)
+    o_f = open(name, 'wb')
+    try:
+        pickle.dump(project.metadata, o_f, protocol=protocol)
+        pickle.dump(project, o_f, protocol=protocol)
+    finally:
+        o_f.close()
+
+    return name
+
+
+def _upgrade_stepwise(pickle_filename, updater_path, project_version, application_version, protocol, max_pass):
+    """ Repeatedly read and write the project to disk updating it one version
+    at a time.
     """
     first_time = True
     latest_file = pickle_filename
@@ -82,15 +176,15 @@ def upgrade_project(pickle_filename, updater_path, project_version, application_
         logger.info('converting %s' % latest_file)
 
         # find this version's updater ...
-        updater_name = '%s.update%d' % (updater_path, next_version)
-        __import__(updater_name)
-        mod = sys.modules[updater_name]
-        klass = getattr(mod, 'Update%d' % next_version)
-        updater = klass()
+        updater = _import_updater(updater_path, next_version)
 
         # load and update this version of the project
         version = VersionedUnpickler(i_f).load(max_pass)
-        project = VersionedUnpickler(i_f, updater).load(max_pass)
+        unpickler = VersionedUnpickler(i_f, updater)
+        try:
+            project = unpickler.load(max_pass)
+        finally:
+            unpickler.restore_setstates()
         i_f.close()
 
         # set the project version to be the same as the updater we just
@@ -113,4 +207,3 @@ def upgrade_project(pickle_filename, updater_path, project_version, application_
 
 
 ### EOF #################################################################
-
@@ -22,9 +22,11 @@ if sys.version_info[0] > 2:
 import warnings
 import pickle
 import struct
+import copy_reg
 from pickle import Pickler, Unpickler, dumps, BUILD, NEWOBJ, REDUCE, \
      MARK, OBJ, INST, BUILD, PicklingError, GLOBAL, \
-     EXT1, EXT2, EXT4, _extension_registry, _keep_alive
+     EXT1, EXT2, EXT4, APPEND, APPENDS, SETITEM, SETITEMS, \
+     _extension_registry, _keep_alive
 
 from io import BytesIO
 
@@ -157,6 +159,17 @@ class StatePickler(Pickler):
             save(cls)
             save(args)
             write(NEWOBJ)
+        elif md['type'] == 'newobj':
+            # `func` is the class, create the instance without calling
+            # its `__init__`, as the original pickle did.
+            if self.proto >= 2:
+                save(func)
+                save(args)
+                write(NEWOBJ)
+            else:
+                save(copy_reg.__newobj__)
+                save((func,) + args)
+                write(REDUCE)
         else:
             save(func)
             save(args)
@@ -165,6 +178,14 @@ class StatePickler(Pickler):
         if obj is not None:
             self.memoize(obj)
 
+        listitems = md.get('listitems')
+        if listitems is not None:
+            self._batch_appends(iter(listitems))
+
+        dictitems = md.get('dictitems')
+        if dictitems is not None:
+            self._batch_setitems(iter(dictitems))
+
         if state is not None:
             if '__setstate_data__' in state:
                 data = state.pop('__setstate_data__')
@@ -227,7 +248,6 @@ class StateUnpickler(Unpickler):
         if slotstate:
             for k, v in slotstate.items():
                 setattr(inst, k, v)
-    Unpickler.dispatch[BUILD] = load_build
 
     def load_newobj(self):
         args = self.stack.pop()
@@ -237,7 +257,6 @@ class StateUnpickler(Unpickler):
         obj = State(__METADATA__ = metadata)
         #obj = cls.__new__(cls, *args)
         self.stack[-1] = obj
-    Unpickler.dispatch[NEWOBJ] = load_newobj
 
     def load_reduce(self):
         stack = self.stack
@@ -247,21 +266,56 @@ class StateUnpickler(Unpickler):
         metadata = {'initargs': args, 'class': func, 'type': 'reduce'}
         value = State(__METADATA__ = metadata)
         stack[-1] = value
-    Unpickler.dispatch[REDUCE] = load_reduce
-
-    def load(self):
-        # We overload the load_build method so update the dispatch dict.
-        dispatch = self.dispatch
-        dispatch[BUILD] = StateUnpickler.load_build
-        dispatch[NEWOBJ] = StateUnpickler.load_newobj
-        dispatch[REDUCE] = StateUnpickler.load_reduce
-        # call the super class' method.
-        ret = Unpickler.load(self)
-        # Reset the Unpickler's dispatch
-        dispatch[BUILD] = Unpickler.load_build
-        dispatch[NEWOBJ] = Unpickler.load_newobj
-        dispatch[REDUCE] = Unpickler.load_reduce
-        return ret
+
+    # The items appended to, or set on, instances of list and dict
+    # subclasses are kept in the metadata of their state, in order.
+    def load_append(self):
+        stack = self.stack
+        value = stack.pop()
+        self._append(stack[-1], [value])
+
+    def load_appends(self):
+        stack = self.stack
+        mark = self.marker()
+        self._append(stack[mark - 1], stack[mark + 1:])
+        del stack[mark:]
+
+    def load_setitem(self):
+        stack = self.stack
+        value = stack.pop()
+        key = stack.pop()
+        self._setitems(stack[-1], [(key, value)])
+
+    def load_setitems(self):
+        stack = self.stack
+        mark = self.marker()
+        items = stack[mark + 1:]
+        self._setitems(stack[mark - 1], zip(items[::2], items[1::2]))
+        del stack[mark:]
+
+    def _append(self, obj, values):
+        if isinstance(obj, State):
+            obj.__METADATA__.setdefault('listitems', []).extend(values)
+        else:
+            obj.extend(values)
+
+    def _setitems(self, obj, items):
+        if isinstance(obj, State):
+            obj.__METADATA__.setdefault('dictitems', []).extend(items)
+        else:
+            for key, value in items:
+                obj[key] = value
+
+    # Our own dispatch table, the one of `Unpickler` is shared by all
+    # the unpicklers.
+    dispatch = Unpickler.dispatch.copy()
+    dispatch[BUILD] = load_build
+    dispatch[NEWOBJ] = load_newobj
+    dispatch[REDUCE] = load_reduce
+    dispatch[APPEND] = load_append
+    dispatch[APPENDS] = load_appends
+    dispatch[SETITEM] = load_setitem
+    dispatch[SETITEMS] = load_setitems
 
     def find_class(self, module, name):
         metadata = {'module': module, 'name': name, 'type': 'class'}
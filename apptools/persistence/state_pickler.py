@@ -69,7 +69,10 @@ Features
 
  - The output is a plain old dictionary so is easy to parse, edit etc.
  - Handles references to avoid duplication.
- - Gzips Numeric arrays when dumping them.
+ - Gzips Numeric arrays when dumping them, or writes their raw buffers
+   after the pickle so that they can be memory mapped when loading.
+ - Saves the same object repeatedly to a log file, writing only what
+   changed (see `StateLog`).
  - Support for versioning.
 
 
@@ -99,13 +102,17 @@ Notes
 
 # Standard library imports.
 import base64
+import hashlib
+import os
 import sys
 import types
 import pickle
 import gzip
+import zlib
 from io import BytesIO, StringIO
 
 import numpy
+from numpy.lib.format import dtype_to_descr
 
 # Local imports.
 from . import version_registry
@@ -114,6 +121,18 @@ from .file_path import FilePath
 PY_VER = sys.version_info[0]
 NumpyArrayType = type(numpy.array([]))
 
+# Marks the entries of the `StatePickler` stack which turn the data of a
+# tuple state into a tuple once all its elements are done.
+_FINISH_TUPLE = object()
+
+# The buffers of the arrays stored with the 'raw' numeric format are
+# aligned on this many bytes, counted from the start of the pickle.
+_ALIGNMENT = 64
+
+
+def _align(offset):
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
 
 def gzip_string(data):
     """Given a string (`data`) this gzips the string and returns it.
@@ -205,6 +224,435 @@ class StateTuple(tuple):
         return obj
 
 
+######################################################################
+# Lazy states.
+######################################################################
+class _Raw(object):
+    """A pickled state not converted by `StateUnpickler` yet."""
+    __slots__ = ('record', 'loader')
+
+    def __init__(self, record, loader):
+        self.record = record
+        self.loader = loader
+
+    def load(self):
+        return self.loader._convert(self.record)
+
+
+def _materialize(obj):
+    """Converts the elements of a lazy state loaded by `StateUnpickler`
+    and turns it into a plain `State`, `StateDict` or `StateList`.
+    Other objects are left alone.
+    """
+    cls = type(obj)
+    if cls is _LazyState:
+        for key, value in list(dict.items(obj)):
+            if type(value) is _Raw:
+                dict.__setitem__(obj, key, value.load())
+        obj.__class__ = State
+    elif cls is _LazyStateDict or cls is _LazyStateList:
+        # Compute `has_instance` while the loader is known.
+        obj.has_instance
+        d = object.__getattribute__(obj, '__dict__')
+        del d['_loader'], d['_id']
+        if cls is _LazyStateDict:
+            for key, value in list(dict.items(obj)):
+                if type(value) is _Raw:
+                    dict.__setitem__(obj, key, value.load())
+            obj.__class__ = StateDict
+        else:
+            for i, value in enumerate(list.__iter__(obj)):
+                if type(value) is _Raw:
+                    list.__setitem__(obj, i, value.load())
+            obj.__class__ = StateList
+
+
+class _LazyMixin(object):
+    """The methods converting the lazy states when they are accessed.
+
+    The special methods are looked up on the class: without them the C
+    implementations of the containers would see the raw elements.
+    """
+
+    # The attributes which do not need the conversion.
+    _lazy_attributes = ('__class__',)
+
+    def __getattribute__(self, name):
+        if name not in type(self)._lazy_attributes:
+            _materialize(self)
+        return object.__getattribute__(self, name)
+
+    def __getitem__(self, key):
+        _materialize(self)
+        return self[key]
+
+    def __iter__(self):
+        _materialize(self)
+        return iter(self)
+
+    def __eq__(self, other):
+        _materialize(self)
+        return self == other
+
+    def __ne__(self, other):
+        _materialize(self)
+        return self != other
+
+    def __repr__(self):
+        _materialize(self)
+        return repr(self)
+
+    __hash__ = None
+
+
+class _LazyState(_LazyMixin, State):
+    """A `State` whose values are converted on first access.  Its
+    `__metadata__` is available without conversion.
+
+    Python 2 copies the values of a dict subclass as they are stored in
+    `dict(state)` or `{}.update(state)`, once it found their `keys`
+    attribute: looking up `keys` converts the values first.
+    """
+    _lazy_attributes = ('__class__', '__metadata__')
+
+
+class _LazyContainerMixin(_LazyMixin):
+    """Finds `has_instance` from the pickled state, without converting
+    the elements.
+    """
+    _lazy_attributes = ('__class__', 'has_instance')
+
+    def __getattribute__(self, name):
+        if name == 'has_instance':
+            d = object.__getattribute__(self, '__dict__')
+            if 'has_instance' not in d:
+                d['has_instance'] = d['_loader']._has_instance(d['_id'])
+        return _LazyMixin.__getattribute__(self, name)
+
+
+class _LazyStateDict(_LazyContainerMixin, StateDict):
+    pass
+
+
+class _LazyStateList(_LazyContainerMixin, StateList):
+
+    def __contains__(self, value):
+        _materialize(self)
+        return value in self
+
+    def __add__(self, other):
+        _materialize(self)
+        return self + other
+
+    def __reversed__(self):
+        _materialize(self)
+        return reversed(self)
+
+    def __getslice__(self, i, j):
+        _materialize(self)
+        return self[i:j]
+
+
+# The types of the lazy states.
+_LAZY_TYPES = frozenset([_LazyState, _LazyStateDict, _LazyStateList])
+
+
+######################################################################
+# Pickling without recursion.
+######################################################################
+class _Pickler(pickle.Pickler):
+    """A pickler saving the dicts, lists and tuples without recursing
+    into their items, so that states deeper than the recursion limit can
+    be pickled.  It writes the same opcodes as `pickle.Pickler`.
+    """
+    def save(self, obj):
+        items = self._start(obj)
+        if items is None:
+            return
+        # The generators of the items of the containers being saved.  They
+        # write the opcodes following an item once it is saved.
+        stack = [items]
+        while stack:
+            for value in stack[-1]:
+                items = self._start(value)
+                if items is not None:
+                    stack.append(items)
+                    break
+            else:
+                stack.pop()
+
+    def _start(self, obj):
+        """Saves `obj`, but for the items of a dict, list or tuple: the
+        generator of the items still to save is returned for those.
+        """
+        t = type(obj)
+        if t is not dict and t is not list and t is not tuple:
+            # The objects held by the others are saved by `save` again.
+            pickle.Pickler.save(self, obj)
+            return None
+
+        pid = self.persistent_id(obj)
+        if pid is not None:
+            self.save_pers(pid)
+            return None
+        x = self.memo.get(id(obj))
+        if x:
+            self.write(self.get(x[0]))
+            return None
+
+        if t is dict:
+            self.write(pickle.EMPTY_DICT if self.bin else
+                       pickle.MARK + pickle.DICT)
+            self.memoize(obj)
+            return self._dict_items(obj)
+        elif t is list:
+            self.write(pickle.EMPTY_LIST if self.bin else
+                       pickle.MARK + pickle.LIST)
+            self.memoize(obj)
+            return self._list_items(obj)
+        elif len(obj) == 0:
+            self.write(pickle.EMPTY_TUPLE if self.proto else
+                       pickle.MARK + pickle.TUPLE)
+            return None
+        return self._tuple_items(obj)
+
+    def _list_items(self, obj):
+        write = self.write
+        if not self.bin:
+            for x in obj:
+                yield x
+                write(pickle.APPEND)
+            return
+        size = self._BATCHSIZE
+        for i in range(0, len(obj), size):
+            batch = obj[i:i + size]
+            if len(batch) > 1:
+                write(pickle.MARK)
+                for x in batch:
+                    yield x
+                write(pickle.APPENDS)
+            else:
+                yield batch[0]
+                write(pickle.APPEND)
+
+    def _dict_items(self, obj):
+        write = self.write
+        if not self.bin:
+            for k, v in obj.iteritems():
+                yield k
+                yield v
+                write(pickle.SETITEM)
+            return
+        items = obj.items()
+        size = self._BATCHSIZE
+        for i in range(0, len(items), size):
+            batch = items[i:i + size]
+            if len(batch) > 1:
+                write(pickle.MARK)
+                for k, v in batch:
+                    yield k
+                    yield v
+                write(pickle.SETITEMS)
+            else:
+                yield batch[0][0]
+                yield batch[0][1]
+                write(pickle.SETITEM)
+
+    def _tuple_items(self, obj):
+        write = self.write
+        n = len(obj)
+        small = n <= 3 and self.proto >= 2
+        if not small:
+            write(pickle.MARK)
+        for x in obj:
+            yield x
+
+        x = self.memo.get(id(obj))
+        if x:
+            # The tuple is recursive: it was saved by its items.
+            get = self.get(x[0])
+            if small:
+                write(pickle.POP * n + get)
+            elif self.proto:
+                write(pickle.POP_MARK + get)
+            else:
+                write(pickle.POP * (n + 1) + get)
+            return
+        write(pickle._tuplesize2code[n] if small else pickle.TUPLE)
+        self.memoize(obj)
+
+
+######################################################################
+# Out-of-band array buffers.
+######################################################################
+def _array_buffer(array, compress=False):
+    """Returns the dtype description, the order, the buffer and the
+    compression codec used to store `array` out of the pickle.
+    """
+    if array.flags.c_contiguous:
+        order, data = 'C', array
+    elif array.flags.f_contiguous:
+        order, data = 'F', array.T
+    else:
+        order, data = 'C', numpy.ascontiguousarray(array)
+    # A flat view of the bytes, which is written without a copy.
+    data = data.reshape(-1).view(numpy.uint8)
+    if compress:
+        return dtype_to_descr(array.dtype), order, zlib.compress(data, 1), \
+            'zlib'
+    return dtype_to_descr(array.dtype), order, data, None
+
+
+class _ArrayPickler(_Pickler):
+    """A pickler leaving the buffers of the NumPy arrays out of the
+    pickle.  They are collected in `buffers` as (offset, data) pairs, the
+    offsets being counted from the aligned end of the pickle.
+    """
+    def __init__(self, file, compress=False):
+        _Pickler.__init__(self, file, 2)
+        self.compress = compress
+        self.buffers = []
+        self._size = 0
+
+    def persistent_id(self, obj):
+        if type(obj) is not NumpyArrayType or obj.dtype.hasobject:
+            return None
+        descr, order, data, codec = _array_buffer(obj, self.compress)
+        offset = _align(self._size)
+        self._size = offset + len(data)
+        self.buffers.append((offset, data))
+        return ('ndarray', descr, obj.shape, order, offset, len(data), codec)
+
+
+class _ArrayBuffer(object):
+    """Stands for an array whose buffer follows the pickle, until
+    `StateUnpickler` reads it.
+    """
+    def __init__(self, descr, shape, order, offset, nbytes, codec):
+        self.dtype = numpy.dtype(descr)
+        self.shape = tuple(shape)
+        self.order = order
+        self.offset = offset
+        self.nbytes = nbytes
+        self.codec = codec
+
+
+class _ArrayUnpickler(pickle.Unpickler):
+    """An unpickler accepting the arrays left out by `_ArrayPickler`. """
+    has_buffers = False
+
+    def persistent_load(self, pid):
+        if pid[0] != 'ndarray':
+            raise pickle.UnpicklingError(
+                'Unsupported persistent id: %r'%(pid,)
+            )
+        self.has_buffers = True
+        return _ArrayBuffer(*pid[1:])
+
+
+def _write_state(state, file, compress=False):
+    """Pickles the `state` into `file`, followed by the buffers of its
+    arrays.
+    """
+    s = BytesIO()
+    pickler = _ArrayPickler(s, compress)
+    pickler.dump(state)
+    written = s.tell()
+    file.write(s.getvalue())
+    start = _align(written)
+    for offset, data in pickler.buffers:
+        padding = start + offset - written
+        file.write(b'\0' * padding)
+        file.write(data)
+        written += padding + len(data)
+    return written
+
+
+######################################################################
+# State streams.
+######################################################################
+# The first pickle of a state stream.  States are never tuples, so this
+# tells streams from plain pickled states.
+_STREAM_HEADER = ('apptools.persistence.state_stream', 1)
+
+# The number of records pickled together in a state stream.
+_STREAM_BATCH = 1000
+
+
+class _StreamWriter(object):
+    """Writes a state as a stream of flat records, in the order they are
+    done by `StatePickler`.
+
+    The stream is a sequence of pickles: `_STREAM_HEADER` and then lists
+    of records.  Basic values are records of their own.  The other
+    records are tuples:
+
+     - ('reference', id)
+     - ('instance', id, module, class_name, version), followed by the
+       records of the initargs and of the data
+     - ('tuple', id, length) and ('list', id, length), followed by the
+       records of their elements
+     - ('dict', id, keys), followed by the records of the values
+     - ('numeric', id, data), with data as in the 'numeric' states
+     - ('array', id, descr, shape, order, nbytes, codec), which ends a
+       list of records.  The buffer of the array follows the pickle,
+       aligned from the start of the stream.
+    """
+    def __init__(self, file, compress=False):
+        self.file = file
+        self.compress = compress
+        self._records = []
+        self._written = 0
+        self._write_pickle(_STREAM_HEADER)
+
+    def add(self, record):
+        self._records.append(record)
+        if len(self._records) >= _STREAM_BATCH:
+            self.flush()
+
+    def add_array(self, idx, array):
+        descr, order, data, codec = _array_buffer(array, self.compress)
+        self._records.append(
+            ('array', idx, descr, array.shape, order, len(data), codec)
+        )
+        self.flush()
+        padding = _align(self._written) - self._written
+        self.file.write(b'\0' * padding)
+        self.file.write(data)
+        self._written += padding + len(data)
+
+    def flush(self):
+        if self._records:
+            self._write_pickle(self._records)
+            self._records = []
+
+    def _write_pickle(self, obj):
+        data = pickle.dumps(obj, 2)
+        self.file.write(data)
+        self._written += len(data)
+
+
+######################################################################
+# `_ClassInfo` class
+######################################################################
+class _ClassInfo(object):
+    """What `StatePickler` needs to know about the class of the
+    instances it pickles, looked up once per class.
+    """
+    __slots__ = ('has_initargs', 'get_state', 'is_file_path')
+
+    def __init__(self, cls):
+        self.has_initargs = bool(getattr(cls, '__getinitargs__', None))
+        # The name of the method returning the state, if any.
+        if hasattr(cls, '__get_pure_state__'):
+            self.get_state = '__get_pure_state__'
+        elif hasattr(cls, '__getstate__'):
+            self.get_state = '__getstate__'
+        else:
+            self.get_state = None
+        self.is_file_path = issubclass(cls, FilePath)
+
+
 ######################################################################
 # `StatePickler` class
 ######################################################################
@@ -252,8 +700,27 @@ class StatePickler:
     When pickling data, references are taken care of.  Numeric arrays
     can be pickled and are stored as a gzipped base64 encoded string.
 
+    With the 'raw' `numeric_format`, the buffers of the arrays are
+    instead written as they are after the pickle, which avoids copying
+    and encoding them and lets `StateUnpickler` memory map them.  The
+    buffers may be compressed (with zlib's fastest level) by passing
+    `compress=True`.  This format can not be read by versions of this
+    module older than the 'raw' format.
+
+    The object graph is walked with an explicit stack rather than by
+    recursion, so arbitrarily deep graphs can be dumped.  References are
+    found by identity: distinct objects are stored separately even if they
+    compare equal.
+
     """
-    def __init__(self):
+    def __init__(self, numeric_format='gzip', compress=False, stream=False):
+        if numeric_format not in ('gzip', 'raw'):
+            raise StatePicklerError(
+                'Unknown numeric format: %s'%numeric_format
+            )
+        self.numeric_format = numeric_format
+        self.compress = compress
+        self.stream = stream
         self._clear()
         type_map = {bool: self._do_basic_type,
                     complex: self._do_basic_type,
@@ -272,6 +739,12 @@ class StatePickler:
             type_map[long] = self._do_basic_type
             type_map[unicode] = self._do_basic_type
         self.type_map = type_map
+        # The types whose values are stored as they are.  They are never
+        # references.
+        self._basic_types = frozenset(
+            key for key, value in type_map.items()
+            if value == self._do_basic_type
+        )
 
     def dump(self, value, file):
         """Pickles the state of the object (`value`) into the passed
@@ -283,13 +756,20 @@ class StatePickler:
             self.file_name = file.name
         except AttributeError:
             pass
-        pickle.dump(self._do(value), file)
+        if self.stream:
+            self._dump_stream(value, file)
+        elif self.numeric_format == 'raw':
+            _write_state(self._do(value), file, self.compress)
+        else:
+            _Pickler(file).dump(self._do(value))
 
     def dumps(self, value):
         """Pickles the state of the object (`value`) and returns a
         string.
         """
-        return pickle.dumps(self._do(value))
+        s = BytesIO()
+        self.dump(value, s)
+        return s.getvalue()
 
     def dump_state(self, value):
         """Returns a dictionary or a basic type representing the
@@ -313,8 +793,16 @@ class StatePickler:
         # example, object.__getstate__()/__getinitargs__() usually
         # returns a copy of a dict/tuple that could possibly be reused
         # on another object's __getstate__.  Caching these prevents
-        # some wierd problems with the `id` of the object.
+        # some wierd problems with the `id` of the object.  All the
+        # registered objects are kept here too, for the same reason.
         self._misc_cache = []
+        # The `_ClassInfo` of the classes of the instances, by class.
+        # Classes are not expected to change during a dump, the infos are
+        # found again for each dump.
+        self._class_info = {}
+        # The objects still to be done by `_do`, as (object, container,
+        # slot) tuples: the state of the object goes to container[slot].
+        self._stack = None
 
     def _flush_traits(self, obj):
         """Checks if the object has traits and ensures that the traits
@@ -324,10 +812,40 @@ class StatePickler:
         return
 
     def _do(self, obj):
+        """Returns the state of `obj`.
+
+        The handlers of the containers return the state with empty slots
+        for the elements and push the elements on `self._stack`: they are
+        done in the same (depth-first) order as a recursive walk would.
+        """
+        outer_stack = self._stack
+        if outer_stack is None:
+            # Classes may have changed since the previous dump.
+            self._class_info = {}
+        self._stack = stack = []
+        result = [None]
+        stack.append((obj, result, 0))
+        try:
+            while stack:
+                value, container, slot = stack.pop()
+                if value is _FINISH_TUPLE:
+                    container[slot] = tuple(container[slot])
+                else:
+                    container[slot] = self._do_one(value)
+        finally:
+            self._stack = outer_stack
+        return result[0]
+
+    def _do_one(self, obj):
         obj_type = type(obj)
-        key = self._get_id(obj)
-        if key in self.obj_cache:
+        if obj_type in self._basic_types:
+            return obj
+        elif id(obj) in self.obj_cache:
             return self._do_reference(obj)
+        elif obj_type in _LAZY_TYPES:
+            # Saves the states loaded lazily as the others.
+            _materialize(obj)
+            return self._do_one(obj)
         elif obj_type in self.type_map:
             return self.type_map[obj_type](obj)
         elif isinstance(obj, tuple):
@@ -342,18 +860,64 @@ class StatePickler:
         elif hasattr(obj, '__dict__'):
             return self._do_instance(obj)
 
-    def _get_id(self, value):
+    def _dump_stream(self, obj, file):
+        """Writes the state of `obj` to `file` as a stream of records
+        (see `_StreamWriter`).  The states of the containers are written
+        as soon as they are done, with the slots for their elements left
+        empty: those are written next, in order.
+        """
+        # Classes may have changed since the previous dump.
+        self._class_info = {}
+        writer = _StreamWriter(file, self.compress)
+        self._stack = stack = [(obj, None, None)]
         try:
-            key = hash(value)
-        except TypeError:
-            key = id(value)
-        return key
+            while stack:
+                value = stack.pop()[0]
+                if value is _FINISH_TUPLE:
+                    continue
+                state = self._do_one(value)
+                if type(state) is not dict:
+                    writer.add(state)
+                    continue
+                kind, idx, data = state['type'], state['id'], state['data']
+                if kind == 'instance':
+                    writer.add((kind, idx, state['module'],
+                                state['class_name'], state['version']))
+                elif kind in ('tuple', 'list'):
+                    writer.add((kind, idx, len(data)))
+                elif kind == 'dict':
+                    # The values were pushed in the order of the keys in
+                    # their slots, which the state dict itself need not
+                    # keep.
+                    keys = [entry[2] for entry in stack[len(stack)-len(data):]]
+                    keys.reverse()
+                    writer.add((kind, idx, keys))
+                elif kind == 'array':
+                    writer.add_array(idx, data)
+                elif kind == 'numeric':
+                    writer.add((kind, idx, data))
+                else:
+                    writer.add((kind, idx))
+            writer.flush()
+        finally:
+            self._stack = None
+
+    def _push(self, values, container, slots):
+        """Schedules the `values` to be done, in order, and their states
+        to be put in the given `slots` of `container`.
+        """
+        items = list(zip(values, [container] * len(slots), slots))
+        items.reverse()
+        self._stack.extend(items)
+
+    def _get_id(self, value):
+        return id(value)
 
     def _register(self, value):
-        key = self._get_id(value)
         cache = self.obj_cache
         idx = len(cache)
-        cache[key] = idx
+        cache[id(value)] = idx
+        self._misc_cache.append(value)
         return idx
 
     def _do_basic_type(self, value):
@@ -368,20 +932,23 @@ class StatePickler:
         # Flush out the traits.
         self._flush_traits(value)
 
+        cls = value.__class__
+        info = self._class_info.get(cls)
+        if info is None:
+            info = self._class_info[cls] = _ClassInfo(cls)
+
         # Setup the relative paths of FilePaths before dumping.
-        if self.file_name and isinstance(value, FilePath):
+        if self.file_name and info.is_file_path:
             value.set_relative(self.file_name)
 
         # Get the initargs.
         args = ()
-        if hasattr(value, '__getinitargs__') and value.__getinitargs__:
+        if info.has_initargs:
             args = value.__getinitargs__()
 
         # Get the object state.
-        if hasattr(value, '__get_pure_state__'):
-            state = value.__get_pure_state__()
-        elif hasattr(value, '__getstate__'):
-            state = value.__getstate__()
+        if info.get_state is not None:
+            state = getattr(value, info.get_state)()
         else:
             state = value.__dict__
 
@@ -391,21 +958,18 @@ class StatePickler:
         self._misc_cache.extend([args, state])
         # Register and process.
         idx = self._register(value)
-        args_data = self._do(args)
-        data = self._do(state)
-
-        # Get the version of the object.
-        version = version_registry.get_version(value)
-        module = value.__class__.__module__
-        class_name = value.__class__.__name__
-
-        return dict(type='instance',
-                    module=module,
-                    class_name=class_name,
-                    version=version,
-                    id=idx,
-                    initargs=args_data,
-                    data=data)
+
+        # The names are not kept in `info`: pickle would write the same
+        # string objects as references, not as the original pickler did.
+        result = dict(type='instance',
+                      module=cls.__module__,
+                      class_name=cls.__name__,
+                      version=version_registry.get_version(value),
+                      id=idx,
+                      initargs=None,
+                      data=None)
+        self._push([args, state], result, ['initargs', 'data'])
+        return result
 
     def _do_state(self, value):
         metadata = value.__metadata__
@@ -416,35 +980,45 @@ class StatePickler:
         self._misc_cache.extend([args, state])
 
         idx = self._register(value)
-        args_data = self._do(args)
-        data = self._do(state)
 
-        return dict(type='instance',
-                    module=metadata['module'],
-                    class_name=metadata['class_name'],
-                    version=metadata['version'],
-                    id=idx,
-                    initargs=args_data,
-                    data=data)
+        result = dict(type='instance',
+                      module=metadata['module'],
+                      class_name=metadata['class_name'],
+                      version=metadata['version'],
+                      id=idx,
+                      initargs=None,
+                      data=None)
+        self._push([args, state], result, ['initargs', 'data'])
+        return result
 
     def _do_tuple(self, value):
         idx = self._register(value)
-        data = tuple([self._do(x) for x in value])
-        return dict(type='tuple', id=idx, data=data)
+        result = dict(type='tuple', id=idx, data=[None] * len(value))
+        # Turn the data into a tuple once all the elements are done.
+        self._stack.append((_FINISH_TUPLE, result, 'data'))
+        self._push(value, result['data'], range(len(value)))
+        return result
 
     def _do_list(self, value):
         idx = self._register(value)
-        data = [self._do(x) for x in value]
+        data = [None] * len(value)
+        self._push(value, data, range(len(value)))
         return dict(type='list', id=idx, data=data)
 
     def _do_dict(self, value):
         idx = self._register(value)
-        vals = [self._do(x) for x in value.values()]
-        data = dict(zip(value.keys(), vals))
+        items = list(value.items())
+        keys = [key for key, x in items]
+        data = dict(zip(keys, [None] * len(keys)))
+        self._push([x for key, x in items], data, keys)
         return dict(type='dict', id=idx, data=data)
 
     def _do_numeric(self, value):
         idx = self._register(value)
+        if self.numeric_format == 'raw' and not value.dtype.hasobject:
+            # The array is kept as it is here, its buffer is written by
+            # `_write_state`.
+            return dict(type='array', id=idx, data=value)
         if PY_VER > 2:
             data = base64.encodebytes(gzip_string(numpy.ndarray.dumps(value)))
         else:
@@ -492,9 +1066,28 @@ class StateUnpickler:
     instance are stored in the `__metadata__` attribute.  This is
     highly convenient since it is possible for someone to view and
     modify the state very easily.
+
+    The arrays saved with the 'raw' numeric format of `StatePickler` are
+    memory mapped when loading from a file if `mmap_mode` is given (see
+    `numpy.memmap` for its values), unless they were compressed.
+
+    If `lazy` is True the states are converted on first access: the
+    returned state and its children only convert (and read the arrays
+    of) their own values when these are used, while their
+    `__metadata__`, keys (with `dict.keys(state)`) and `has_instance`
+    are available at once.
+    This makes looking at a part of a large state cheap, but the pickle
+    itself is still read as a whole.  The arrays of a file are read
+    again from the file name if the file was closed.  State streams are
+    always loaded as a whole.
+
+    The files written by `StateLog` are loaded as they were at their
+    last complete save.
     """
 
-    def __init__(self):
+    def __init__(self, mmap_mode=None, lazy=False):
+        self.mmap_mode = mmap_mode
+        self.lazy = lazy
         self._clear()
         self.type_map = {'reference': self._do_reference,
                          'instance': self._do_instance,
@@ -502,7 +1095,15 @@ class StateUnpickler:
                          'list': self._do_list,
                          'dict': self._do_dict,
                          'numeric': self._do_numeric,
+                         'array': self._do_array,
                          }
+        self._convert_map = {'instance': self._convert_instance,
+                             'tuple': self._convert_tuple,
+                             'list': self._convert_list,
+                             'dict': self._convert_dict,
+                             'numeric': self._convert_numeric,
+                             'array': self._convert_array,
+                             }
 
     def load_state(self, file):
         """Returns the state of an object loaded from the pickled data
@@ -512,17 +1113,13 @@ class StateUnpickler:
             self.file_name = file.name
         except AttributeError:
             pass
-        data = pickle.load(file)
-        result = self._process(data)
-        return result
+        return self._load(file)
 
     def loads_state(self, string):
         """Returns the state of an object loaded from the pickled data
         in the given string.
         """
-        data = pickle.loads(string)
-        result = self._process(data)
-        return result
+        return self._load(BytesIO(string))
 
     ######################################################################
     # Non-public methods
@@ -538,6 +1135,288 @@ class StateUnpickler:
         self._refs = {}
         # Numeric arrays.
         self._numeric = {}
+        # The file the buffers of the 'raw' arrays are read from, and
+        # the position of the first one.
+        self._file = None
+        self._buffer_start = 0
+        # The pickled state converted by the lazy mode, the pickled
+        # states by id and whether they have instances.
+        self._raw_root = None
+        self._records = None
+        self._record_has_instance = {}
+
+    def _load(self, file):
+        try:
+            start = file.tell()
+        except (AttributeError, IOError, ValueError):
+            start = None
+        unpickler = _ArrayUnpickler(file)
+        data = unpickler.load()
+        if type(data) is tuple and data == _STREAM_HEADER:
+            return self._load_stream(file, start)
+        if type(data) is tuple and data == _LOG_HEADER:
+            return self._load_log(file, start)
+        if unpickler.has_buffers:
+            self._check_seekable(start)
+            self._file = file
+            self._buffer_start = start + _align(file.tell() - start)
+        if self.lazy:
+            self._raw_root = data
+            return self._convert(data)
+        return self._process(data)
+
+    def _check_seekable(self, start):
+        if start is None:
+            raise StateUnpicklerError(
+                'Arrays can only be loaded from a seekable file.'
+            )
+
+    def _load_stream(self, file, start):
+        """Returns the state read from a stream of records (see
+        `_StreamWriter`).  The state is built as the records are read,
+        without going through the state dict.
+        """
+        cache = self._obj_cache
+        # The containers being filled, innermost last, as [kind,
+        # container, slots, index of the next slot, has_instance, id].
+        frames = []
+        # The slots of lists, dicts and instances referring to tuples which
+        # were not done yet, as (container, slot, reference).
+        pending = []
+        for record in self._iter_records(file):
+            unresolved = has_instance = False
+            if type(record) is not tuple:
+                value = record
+            elif record[0] == 'reference':
+                value = cache.get(record[1])
+                if value is None:
+                    value = State(__metadata__=dict(type='reference',
+                                                    id=record[1],
+                                                    data=None))
+                    unresolved = True
+                has_instance = isinstance(value, State)
+            elif record[0] == 'instance':
+                kind, idx, module, class_name, version = record
+                value = State()
+                value.__metadata__ = dict(type='instance',
+                                          module=module,
+                                          class_name=class_name,
+                                          version=version,
+                                          id=idx,
+                                          initargs=None,
+                                          has_instance=True)
+                cache[idx] = value
+                frames.append([kind, value, ('initargs', 'data'), 0, True,
+                               idx])
+                continue
+            elif record[0] in ('tuple', 'list', 'dict'):
+                kind, idx = record[:2]
+                if kind == 'dict':
+                    slots = record[2]
+                    container = StateDict()
+                else:
+                    slots = range(record[2])
+                    if kind == 'list':
+                        container = StateList([None] * record[2])
+                    else:
+                        container = [None] * record[2]
+                if kind != 'tuple':
+                    cache[idx] = container
+                frame = [kind, container, slots, 0, False, idx]
+                if slots:
+                    frames.append(frame)
+                    continue
+                value, has_instance = self._close_frame(frame)
+            elif record[0] == 'numeric':
+                value = cache[record[1]] = self._decode_numeric(record[2])
+            else:
+                value = cache[record[1]] = self._read_stream_array(
+                    record, file, start
+                )
+
+            # Put the value in its slot, and close the containers which
+            # are full.
+            while frames:
+                frame = frames[-1]
+                kind, container, slots, index = frame[:4]
+                slot = slots[index]
+                if kind != 'instance':
+                    container[slot] = value
+                    if unresolved and kind != 'tuple':
+                        pending.append((container, slot, value))
+                elif slot == 'initargs':
+                    container.__metadata__['initargs'] = value
+                else:
+                    self._handle_file_path(container.__metadata__, value)
+                    container.update(value)
+                    for key, item in value.items():
+                        if isinstance(item, State) and \
+                           item.__metadata__['type'] == 'reference':
+                            pending.append((container, key, item))
+                if has_instance:
+                    frame[4] = True
+                frame[3] = index = index + 1
+                if index < len(slots):
+                    break
+                value, has_instance = self._close_frame(frames.pop())
+                unresolved = False
+            else:
+                for container, slot, ref in pending:
+                    container[slot] = cache[ref.__metadata__['id']]
+                return value
+        raise StateUnpicklerError('The state stream is truncated.')
+
+    def _load_log(self, file, start):
+        """Loads the last complete save of a `StateLog` file."""
+        self._check_seekable(start)
+        records = {}
+        root = None
+        complete = False
+        end = file.tell()
+        file.seek(0, 2)
+        size = file.tell()
+        while True:
+            pos = start + _align(end - start)
+            if pos >= size:
+                break
+            # A save cut short ends the log: its pickles are truncated,
+            # or its buffers or commit are missing.
+            file.seek(pos)
+            entries = self._load_log_pickle(_ArrayUnpickler(file), file,
+                                            size)
+            if entries is None:
+                break
+            end = file.tell()
+            buffer_start = pos + _align(end - pos)
+            for record in entries:
+                buf = record['data']
+                if isinstance(buf, _ArrayBuffer):
+                    buf.offset += buffer_start
+                    end = max(end, buf.offset + buf.nbytes)
+            if end >= size:
+                break
+            file.seek(end)
+            commit = self._load_log_pickle(pickle.Unpickler(file), file,
+                                           size)
+            if commit is None:
+                break
+            end = file.tell()
+            if type(commit) is not tuple or commit[0] != 'commit':
+                raise StateUnpicklerError(
+                    'Unexpected %r in the state log.'%(commit,)
+                )
+            for record in entries:
+                records[record['id']] = record
+            root = commit[1]
+            complete = True
+        if not complete:
+            raise StateUnpicklerError('No complete save in the state log.')
+
+        # Put the records back in place of their links.  The states
+        # which are not referenced have no id in the log.
+        next_id = -1
+        stack = [(root, None, None)]
+        while stack:
+            record, container, slot = stack.pop()
+            if type(record) is not dict:
+                continue
+            if record['type'] == 'link':
+                record = records[record['id']]
+                if container is None:
+                    root = record
+                else:
+                    container[slot] = record
+            if record['id'] is None:
+                record['id'] = next_id
+                next_id -= 1
+            stack.extend(_get_slots(record))
+
+        self._file = file
+        self._buffer_start = 0
+        if self.lazy:
+            self._raw_root = root
+            return self._convert(root)
+        return self._process(root)
+
+    def _load_log_pickle(self, unpickler, file, size):
+        """Returns the next pickle of a `StateLog` file, or None if the
+        file ends within it.
+        """
+        try:
+            return unpickler.load()
+        except Exception:
+            # The pickle fails in various ways on truncated data: only
+            # the errors which did not reach the end of the file are
+            # corrupt data.
+            if file.tell() < size:
+                raise
+            return None
+
+    def _iter_records(self, file):
+        while True:
+            # A new unpickler for each pickle, since an unpickler may have
+            # read ahead of the buffers of the arrays.
+            try:
+                records = _ArrayUnpickler(file).load()
+            except EOFError:
+                return
+            for record in records:
+                yield record
+
+    def _close_frame(self, frame):
+        """Returns the value of a full container of `_load_stream` and
+        whether it contains an instance.
+        """
+        kind, container, slots, index, has_instance, idx = frame
+        if kind == 'instance':
+            return container, True
+        if kind == 'tuple':
+            container = StateTuple(container)
+            self._obj_cache[idx] = container
+        container.has_instance = has_instance
+        return container, has_instance
+
+    def _read_stream_array(self, record, file, start):
+        # The buffer of the array follows the pickle of its record.
+        self._check_seekable(start)
+        descr, shape, order, nbytes, codec = record[2:]
+        offset = start + _align(file.tell() - start)
+        buf = _ArrayBuffer(descr, shape, order, offset, nbytes, codec)
+        self._file = file
+        self._buffer_start = 0
+        result = self._read_array(buf)
+        file.seek(buf.offset + buf.nbytes)
+        return result
+
+    def _read_array(self, buf):
+        if 0 in buf.shape:
+            return numpy.empty(buf.shape, buf.dtype, order=buf.order)
+        pos = self._buffer_start + buf.offset
+        if buf.codec is None and self.mmap_mode and self.file_name:
+            return numpy.memmap(self.file_name, dtype=buf.dtype,
+                                mode=self.mmap_mode, offset=pos,
+                                shape=buf.shape, order=buf.order)
+        if not getattr(self._file, 'closed', False):
+            data = self._read_buffer(self._file, pos, buf)
+        elif self.file_name:
+            # The lazy states may outlive the file they were loaded from.
+            with open(self.file_name, 'rb') as f:
+                data = self._read_buffer(f, pos, buf)
+        else:
+            raise StateUnpicklerError(
+                'Cannot read an array from a closed file.'
+            )
+        return numpy.frombuffer(data, buf.dtype).reshape(buf.shape,
+                                                         order=buf.order)
+
+    def _read_buffer(self, file, pos, buf):
+        file.seek(pos)
+        if buf.codec == 'zlib':
+            return bytearray(zlib.decompress(file.read(buf.nbytes)))
+        data = bytearray(buf.nbytes)
+        if file.readinto(data) != buf.nbytes:
+            raise StateUnpicklerError('Truncated array data.')
+        return data
 
     def _set_has_instance(self, obj, value):
         if isinstance(obj, State):
@@ -601,11 +1480,10 @@ class StateUnpickler:
             self._refs[id] = [path]
         return State(__metadata__=value)
 
-    def _handle_file_path(self, value):
-        if (value['class_name'] == 'FilePath') and \
-           ('file_path' in value['module']) and \
+    def _handle_file_path(self, metadata, data):
+        if (metadata['class_name'] == 'FilePath') and \
+           ('file_path' in metadata['module']) and \
            self.file_name:
-            data = value['data']['data']
             fp = FilePath(data['rel_pth'])
             fp.set_absolute(self.file_name)
             data['abs_pth'] = fp.abs_pth
@@ -615,7 +1493,7 @@ class StateUnpickler:
         initargs = self._do(value['initargs'],
                             path + '.__metadata__["initargs"]')
         # Handle FilePaths.
-        self._handle_file_path(value)
+        self._handle_file_path(value, value['data']['data'])
 
         d = self._do(value['data'], path)
         md = dict(type='instance',
@@ -652,20 +1530,145 @@ class StateUnpickler:
         self._obj_cache[value['id']] = result
         return result
 
-    def _do_numeric(self, value, path):
+    def _decode_numeric(self, data):
         if PY_VER > 2:
-            data = value['data']
             if isinstance(data, str):
-                data = value['data'].encode('utf-8')
+                data = data.encode('utf-8')
             junk = gunzip_string(base64.decodebytes(data))
-            result = numpy.loads(junk, encoding='bytes')
+            return pickle.loads(junk, encoding='bytes')
         else:
-            junk = gunzip_string(value['data'].decode('base64'))
-            result = numpy.loads(junk)
+            junk = gunzip_string(data.decode('base64'))
+            return pickle.loads(junk)
+
+    def _do_numeric(self, value, path):
+        result = self._decode_numeric(value['data'])
+        self._numeric[value['id']] = (path, result)
+        self._obj_cache[value['id']] = result
+        return result
+
+    def _do_array(self, value, path):
+        result = value['data']
+        if isinstance(result, _ArrayBuffer):
+            result = self._read_array(result)
         self._numeric[value['id']] = (path, result)
         self._obj_cache[value['id']] = result
         return result
 
+    ######################################################################
+    # The lazy mode.
+    ######################################################################
+    def _convert(self, record):
+        """Returns the state of a pickled value, whose children are only
+        converted when they are accessed.
+        """
+        if type(record) is not dict:
+            return record
+        idx = record['id']
+        if idx in self._obj_cache:
+            return self._obj_cache[idx]
+        if record['type'] == 'reference':
+            return self._convert(self._get_record(idx))
+        return self._convert_map[record['type']](record)
+
+    def _defer(self, record):
+        if type(record) is dict:
+            return _Raw(record, self)
+        return record
+
+    def _get_record(self, idx):
+        if self._records is None:
+            self._records = records = {}
+            stack = [self._raw_root]
+            while stack:
+                record = stack.pop()
+                if type(record) is dict and record['type'] != 'reference':
+                    records[record['id']] = record
+                    stack.extend(_get_children(record))
+        return self._records[idx]
+
+    def _has_instance(self, idx):
+        """Returns the `has_instance` value of the state with the given
+        id, as `_process` sets it.
+        """
+        memo = self._record_has_instance
+        stack = [(self._get_record(idx), False)]
+        while stack:
+            record, done = stack.pop()
+            rid = record['id']
+            if rid in memo:
+                continue
+            children = [x for x in _get_children(record)
+                        if type(x) is dict]
+            if record['type'] == 'instance':
+                memo[rid] = True
+            elif done:
+                memo[rid] = any(self._child_has_instance(x)
+                                for x in children)
+            else:
+                stack.append((record, True))
+                stack.extend((x, False) for x in children
+                             if x['type'] != 'reference')
+        return memo[idx]
+
+    def _child_has_instance(self, record):
+        if record['type'] == 'reference':
+            # Only the references to instances count.
+            return self._get_record(record['id'])['type'] == 'instance'
+        return self._record_has_instance[record['id']]
+
+    def _convert_instance(self, record):
+        result = _LazyState()
+        # Cache it first: the instances may be part of cycles.
+        self._obj_cache[record['id']] = result
+        data = record['data']['data']
+        self._handle_file_path(record, data)
+        for key, value in data.items():
+            dict.__setitem__(result, key, self._defer(value))
+        md = dict(type='instance',
+                  module=record['module'],
+                  class_name=record['class_name'],
+                  version=record['version'],
+                  id=record['id'],
+                  initargs=self._convert(record['initargs']),
+                  has_instance=True)
+        dict.__setitem__(result, '__metadata__', md)
+        return result
+
+    def _convert_tuple(self, record):
+        result = StateTuple([self._convert(x) for x in record['data']])
+        result.has_instance = self._has_instance(record['id'])
+        self._obj_cache[record['id']] = result
+        return result
+
+    def _convert_list(self, record):
+        result = _LazyStateList.__new__(_LazyStateList)
+        list.extend(result, [self._defer(x) for x in record['data']])
+        result._loader = self
+        result._id = record['id']
+        self._obj_cache[record['id']] = result
+        return result
+
+    def _convert_dict(self, record):
+        result = _LazyStateDict.__new__(_LazyStateDict)
+        for key, value in record['data'].items():
+            dict.__setitem__(result, key, self._defer(value))
+        result._loader = self
+        result._id = record['id']
+        self._obj_cache[record['id']] = result
+        return result
+
+    def _convert_numeric(self, record):
+        result = self._decode_numeric(record['data'])
+        self._obj_cache[record['id']] = result
+        return result
+
+    def _convert_array(self, record):
+        result = record['data']
+        if isinstance(result, _ArrayBuffer):
+            result = self._read_array(result)
+        self._obj_cache[record['id']] = result
+        return result
+
 
 ######################################################################
 # `StateSetter` class
@@ -678,7 +1681,7 @@ class StateSetter:
     """
     def __init__(self):
         # Stores the ids of instances already done.
-        self._instance_ids = []
+        self._instance_ids = set()
         self.type_map = {State: self._do_instance,
                          StateTuple: self._do_tuple,
                          StateList: self._do_list,
@@ -726,6 +1729,7 @@ class StateSetter:
           order), after all other attributes are set.
 
         """
+        _materialize(state)
         if (not isinstance(state, State)) and \
                state.__metadata__['type'] != 'instance':
             raise StateSetterError(
@@ -779,9 +1783,7 @@ class StateSetter:
     # Non-public methods.
     ######################################################################
     def _register(self, obj):
-        idx = id(obj)
-        if idx not in self._instance_ids:
-            self._instance_ids.append(idx)
+        self._instance_ids.add(id(obj))
 
     def _is_registered(self, obj):
         return (id(obj) in self._instance_ids)
@@ -859,6 +1861,7 @@ class StateSetter:
             setattr(obj, key, value)
 
     def _do_object(self, obj, state):
+        _materialize(state)
         self.type_map[state.__class__](obj, state)
 
     def _do_instance(self, obj, state):
@@ -894,7 +1897,7 @@ class StateSetter:
                 if not self._has_instance(state[i]):
                     obj[i] = self._get_pure(state[i])
                 elif isinstance(state[i], tuple):
-                    obj[i] = self._do_tuple(state[i])
+                    obj[i] = self._do_tuple(obj[i], state[i])
                 else:
                     self._do_object(obj[i], state[i])
         else:
@@ -907,14 +1910,222 @@ class StateSetter:
             if not self._has_instance(value):
                 obj[key] = self._get_pure(value)
             elif isinstance(value, tuple):
-                obj[key] = self._do_tuple(value)
+                obj[key] = self._do_tuple(obj[key], value)
             else:
                 self._do_object(obj[key], value)
 
 
+######################################################################
+# `StateLog` class
+######################################################################
+# The first pickle of a `StateLog` file.
+_LOG_HEADER = ('apptools.persistence.state_log', 1)
+
+
+class StateLog(object):
+    """Saves the state of an object to a file again and again, only
+    writing what changed since the previous save.
+
+    The file is a log: each save appends the states of the instances and
+    the arrays which changed, along with the state of the object whose
+    instances and arrays are replaced by links to their latest saved
+    state.  `load_state` reads the file back as it was at the last save
+    which completed.  When the log holds more than `compact_ratio` times
+    the size of the last state, it is rewritten with that state only.
+
+    The instances and arrays are told apart from one save to the next
+    by their `id`, so the same log should be used for the saves of an
+    object during a session.  The first save of a `StateLog` rewrites
+    the file.
+
+    The whole object is still walked, and its arrays hashed, on each
+    save: it is the file writes which only depend on the changes.  The
+    arrays are stored as with the 'raw' `numeric_format` of
+    `StatePickler`, and compressed if `compress` is True.
+
+    For example::
+
+        >>> log = StateLog('project.log')
+        >>> log.dump(project)
+        >>> project.name = 'new name'
+        >>> log.dump(project)    # Only writes the state of `project`.
+        >>> state = load_state('project.log')
+    """
+
+    def __init__(self, file_name, compress=False, compact_ratio=2.0):
+        self.file_name = file_name
+        self.compress = compress
+        self.compact_ratio = compact_ratio
+        # What the records of the last save are compared with, and their
+        # sizes, by id: the states of the instances are kept, the arrays
+        # are hashed.
+        self._saved = {}
+        # The size of the file, None until the first save.
+        self._size = None
+
+    def dump(self, value):
+        """Saves the state of the object (`value`)."""
+        pickler = StatePickler(numeric_format='raw')
+        pickler.file_name = self.file_name
+        root, records = self._flatten(pickler.dump_state(value),
+                                      pickler.obj_cache)
+        saved = {}
+        changed = []
+        live_size = changed_size = 0
+        for record in records:
+            if record['type'] == 'array':
+                value, size = _digest_array(record['data'])
+            else:
+                value, size = record, None
+            previous = self._saved.get(record['id'])
+            if previous is not None and previous[0] == value:
+                size = previous[1]
+            else:
+                if size is None:
+                    size = len(pickle.dumps(record, 2))
+                changed.append(record)
+                changed_size += size
+            saved[record['id']] = (value, size)
+            live_size += size
+
+        if self._size is None or \
+               self._size + changed_size > self.compact_ratio * live_size:
+            self._compact(root, records)
+        else:
+            try:
+                with open(self.file_name, 'ab') as f:
+                    size = self._write_commit(f, self._size, root, changed)
+            except BaseException:
+                self._discard_commit()
+                raise
+            self._size = size
+        self._saved = saved
+
+    ######################################################################
+    # Non-public methods
+    ######################################################################
+    def _flatten(self, state, obj_cache):
+        """Takes the instances and arrays out of the `state` (from
+        `StatePickler.dump_state`), into records of their own.  Returns
+        the state left, and the records.
+
+        The ids of the states are made independent of the order of the
+        walk: the ids of the objects are used for the instances, the
+        arrays and the referenced states, and the others have no id.
+        """
+        object_ids = dict((idx, key) for key, idx in obj_cache.items())
+        nodes = []
+        referenced = set()
+        stack = [(state, None, None)]
+        while stack:
+            node = stack.pop()
+            record = node[0]
+            if type(record) is not dict:
+                continue
+            nodes.append(node)
+            if record['type'] == 'reference':
+                referenced.add(record['id'])
+            else:
+                stack.extend(_get_slots(record))
+
+        records = []
+        for record, container, slot in nodes:
+            kind, idx = record['type'], record['id']
+            if kind in ('instance', 'array', 'reference') or \
+                   idx in referenced:
+                record['id'] = object_ids[idx]
+            else:
+                record['id'] = None
+            if kind in ('instance', 'array'):
+                link = dict(type='link', id=record['id'])
+                if container is None:
+                    state = link
+                else:
+                    container[slot] = link
+                records.append(record)
+        return state, records
+
+    def _compact(self, root, records):
+        tmp = self.file_name + '.tmp'
+        with open(tmp, 'wb') as f:
+            header = pickle.dumps(_LOG_HEADER, 2)
+            f.write(header)
+            size = self._write_commit(f, len(header), root, records)
+        _replace_file(tmp, self.file_name)
+        self._size = size
+
+    def _discard_commit(self):
+        """Cuts off what a failed save appended to the file.  If that
+        fails too, the next save rewrites the file.
+        """
+        try:
+            with open(self.file_name, 'r+b') as f:
+                f.truncate(self._size)
+        except (IOError, OSError):
+            self._size = None
+
+    def _write_commit(self, file, written, root, records):
+        """Writes the records of a save, followed by its root state, and
+        returns the size of the file.
+        """
+        padding = _align(written) - written
+        file.write(b'\0' * padding)
+        written += padding
+        written += _write_state(records, file, self.compress)
+        data = pickle.dumps(('commit', root), 2)
+        file.write(data)
+        return written + len(data)
+
+
 ######################################################################
 # Internal Utility functions.
 ######################################################################
+def _get_children(record):
+    """Returns the pickled values in a pickled state."""
+    kind = record['type']
+    if kind == 'instance':
+        return [record['initargs'], record['data']]
+    elif kind in ('tuple', 'list'):
+        return record['data']
+    elif kind == 'dict':
+        return list(record['data'].values())
+    return []
+
+
+def _get_slots(record):
+    """Returns the (container, slot) pairs of the pickled values in a
+    pickled state.  The data of the tuples is turned into a list.
+    """
+    kind = record['type']
+    if kind == 'instance':
+        return [(record['initargs'], record, 'initargs'),
+                (record['data'], record, 'data')]
+    elif kind in ('tuple', 'list'):
+        data = record['data'] = list(record['data'])
+        return [(x, data, i) for i, x in enumerate(data)]
+    elif kind == 'dict':
+        data = record['data']
+        return [(x, data, key) for key, x in data.items()]
+    return []
+
+
+def _digest_array(array):
+    """Returns a digest of an array and the size of its buffer."""
+    descr, order, data, codec = _array_buffer(array)
+    digest = hashlib.sha1(repr((descr, array.shape, order)).encode())
+    digest.update(data)
+    return digest.digest(), len(data)
+
+
+def _replace_file(src, dst):
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+    else:
+        if os.name == 'nt' and os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
 def _get_file_read(f):
     if hasattr(f, 'read'):
         return f
@@ -931,43 +2142,47 @@ def _get_file_write(f):
 ######################################################################
 # Utility functions.
 ######################################################################
-def dump(value, file):
+def dump(value, file, numeric_format='gzip', compress=False, stream=False):
     """Pickles the state of the object (`value`) into the passed file
-    (or file name).
+    (or file name).  See `StatePickler` for the `numeric_format`,
+    `compress` and `stream` arguments.
     """
     f = _get_file_write(file)
     try:
-        StatePickler().dump(value, f)
+        StatePickler(numeric_format, compress, stream).dump(value, f)
     finally:
         f.flush()
         if f is not file:
             f.close()
 
 
-def dumps(value):
+def dumps(value, numeric_format='gzip', compress=False, stream=False):
     """Pickles the state of the object (`value`) and returns a string.
+    See `StatePickler` for the `numeric_format`, `compress` and `stream`
+    arguments.
     """
-    return StatePickler().dumps(value)
+    return StatePickler(numeric_format, compress, stream).dumps(value)
 
 
-def load_state(file):
+def load_state(file, mmap_mode=None, lazy=False):
     """Returns the state of an object loaded from the pickled data in
-    the given file (or file name).
+    the given file (or file name).  See `StateUnpickler` for the
+    `mmap_mode` and `lazy` arguments.
     """
     f = _get_file_read(file)
     try:
-        state = StateUnpickler().load_state(f)
+        state = StateUnpickler(mmap_mode, lazy).load_state(f)
     finally:
         if f is not file:
             f.close()
     return state
 
 
-def loads_state(string):
+def loads_state(string, lazy=False):
     """Returns the state of an object loaded from the pickled data
-    in the given string.
+    in the given string.  See `StateUnpickler` for the `lazy` argument.
     """
-    return StateUnpickler().loads_state(string)
+    return StateUnpickler(lazy=lazy).loads_state(string)
 
 
 def get_state(obj):
@@ -975,7 +2190,7 @@ def get_state(obj):
     returned state may be used directy to set the state of the object
     via `set_state`.
     """
-    s = dumps(obj)
+    s = dumps(obj, numeric_format='raw')
     return loads_state(s)
 
 
@@ -0,0 +1,193 @@
+"""Tests for the upgrade of projects by the project loader.
+
+"""
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+
+try:
+    from apptools.persistence import project_loader
+except ImportError:
+    import nose
+    raise nose.SkipTest('project_loader is not supported with Python3')
+
+from apptools.persistence.updater import Updater
+from traits.api import Any, Dict, HasTraits, Int, List, Str
+
+
+MODULE = __name__
+
+
+# The classes of a project at version 1.
+class OldProject(HasTraits):
+    metadata = Dict
+    title = Str
+    parts = List
+
+
+class Part(object):
+
+    def __init__(self, size):
+        self.size = size
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.restored = True
+
+
+class SubPart(Part):
+    pass
+
+
+# The class of a project at version 2, only needed by the stepwise upgrade.
+class MiddleProject(HasTraits):
+    metadata = Dict
+    title = Str
+    count = Int
+    parts = List
+
+
+# The class of a project at version 3.
+class Project(HasTraits):
+    metadata = Dict
+    name = Str
+    count = Int
+    parts = List
+    cached = Any(transient=True)
+
+    def _name_changed(self):
+        self.cached = self.name.upper()
+
+
+def add_count(self, state):
+    state['count'] = 1
+    return state
+
+
+def add_kind(self, state):
+    state['kind'] = 'sub'
+    return state
+
+
+def rename_title(self, state):
+    state['name'] = state.pop('title')
+    return state
+
+
+def rename_size(self, state):
+    state['length'] = state.pop('size')
+    return state
+
+
+class Update2(Updater):
+    def __init__(self):
+        self.refactorings = {(MODULE, 'OldProject'): (MODULE, 'MiddleProject')}
+        self.setstates = {(MODULE, 'OldProject'): add_count,
+                          (MODULE, 'SubPart'): add_kind}
+
+
+class Update3(Updater):
+    def __init__(self):
+        self.refactorings = {(MODULE, 'MiddleProject'): (MODULE, 'Project')}
+        self.setstates = {(MODULE, 'MiddleProject'): rename_title,
+                          (MODULE, 'Part'): rename_size,
+                          (MODULE, 'SubPart'): rename_size}
+
+
+class TestProjectLoader(unittest.TestCase):
+
+    def setUp(self):
+        # The updaters are found as modules of the updater path.
+        self.modules = {
+            'project_updaters': types.ModuleType('project_updaters')
+        }
+        for klass in (Update2, Update3):
+            name = 'project_updaters.update%s' % klass.__name__[-1]
+            module = types.ModuleType(name)
+            setattr(module, klass.__name__, klass)
+            self.modules[name] = module
+        sys.modules.update(self.modules)
+
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'p.project')
+        project = OldProject(metadata={'version': 1}, title='p',
+                             parts=[Part(1), SubPart(2)])
+        with open(self.filename, 'wb') as f:
+            pickle.dump(project.metadata, f, 2)
+            pickle.dump(project, f, 2)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        for name in self.modules:
+            del sys.modules[name]
+
+    def check_project(self, project):
+        self.assertEqual(type(project), Project)
+        self.assertEqual(project.metadata['version'], 3)
+        self.assertEqual(project.name, 'p')
+        self.assertEqual(project.count, 1)
+        part, sub_part = project.parts
+        self.assertEqual(type(part), Part)
+        self.assertEqual(part.length, 1)
+        self.assertFalse(hasattr(part, 'size'))
+        self.assertEqual(type(sub_part), SubPart)
+        self.assertEqual(sub_part.length, 2)
+        self.assertEqual(sub_part.kind, 'sub')
+
+    def check_classes(self):
+        """Checks that the classes are as they were before the upgrade."""
+        for klass in (OldProject, Project, Part, SubPart):
+            self.assertFalse('__setstate_original__' in klass.__dict__)
+            self.assertFalse('__updater__' in klass.__dict__)
+        for klass in (OldProject, Project, SubPart):
+            self.assertFalse('__setstate__' in klass.__dict__)
+        self.assertEqual(Part.__dict__['__setstate__'].__name__,
+                         '__setstate__')
+        part = pickle.loads(pickle.dumps(Part(3)))
+        self.assertEqual(part.size, 3)
+
+    def test_load_project(self):
+        project = project_loader.load_project(self.filename,
+                                              'project_updaters', 3, 2)
+        self.check_project(project)
+        # The own __setstate__ of the classes set the updated states.
+        self.assertTrue(project.traits_inited())
+        self.assertEqual(project.cached, 'P')
+        self.assertTrue(all(part.restored for part in project.parts))
+        self.check_classes()
+        self.assertEqual(os.listdir(self.directory), ['p.project'])
+
+    def test_load_project_save_upgrade(self):
+        project = project_loader.load_project(self.filename,
+                                              'project_updaters', 3, 2,
+                                              save_upgrade=True)
+        self.check_project(project)
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['p.project', 'p.project.bak', 'p.project.v3'])
+        project = project_loader.load_project(self.filename + '.v3',
+                                              'project_updaters', 3, 2)
+        self.check_project(project)
+        self.assertTrue(project.traits_inited())
+        self.check_classes()
+
+    def test_upgrade_project(self):
+        for intermediate_files in (False, True):
+            name = project_loader.upgrade_project(
+                self.filename, 'project_updaters', 1, 3, 2,
+                intermediate_files=intermediate_files
+            )
+            self.assertEqual(name, self.filename + '.v3')
+            self.check_classes()
+            project = project_loader.load_project(name, 'project_updaters',
+                                                  3, 2)
+            self.check_project(project)
+            self.assertTrue(project.traits_inited())
+        self.assertTrue(os.path.exists(self.filename + '.v2'))
+
+
+if __name__ == "__main__":
+    unittest.main()
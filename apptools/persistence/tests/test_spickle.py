@@ -8,7 +8,7 @@
 
 import unittest
 import numpy
-from pickle import dumps
+from pickle import dumps, Unpickler
 
 try:
     from apptools.persistence import spickle
@@ -16,7 +16,7 @@ except ImportError:
     import nose
     raise nose.SkipTest('spickle is not supported with Python3')
 
-from traits.api import HasTraits, Float, Int
+from traits.api import HasTraits, Float, Int, List, Dict
 
 class A:
     def __init__(self):
@@ -27,6 +27,10 @@ class B(HasTraits):
     i = Int(10)
     f = Float(1.0)
 
+class C(HasTraits):
+    l = List
+    d = Dict
+
 class Foo(object):
     def __init__(self, a=1):
         self.a = A()
@@ -62,6 +66,24 @@ class TestStatePickler(unittest.TestCase):
         g = spickle.state2object(st)
         self._test_object(g)
 
+    def test_list_and_dict_subclasses(self):
+        "Test if the items of list and dict subclasses are kept."
+        c = C(l=[1, 2], d={'a': 1})
+        for protocol in (0, 2):
+            st = spickle.loads_state(dumps(c, protocol))
+            c1 = spickle.state2object(st)
+            self.assertEqual(c1.l, [1, 2])
+            self.assertEqual(c1.d, {'a': 1})
+
+    def test_unpickler_dispatch_unchanged(self):
+        "Test if the dispatch table of pickle.Unpickler is left alone."
+        dispatch = dict(Unpickler.dispatch)
+        spickle.loads_state(dumps(Foo(), 2))
+        self.assertEqual(Unpickler.dispatch, dispatch)
+        self.assertRaises(Exception, spickle.loads_state,
+                          dumps(Foo(), 2)[:-10])
+        self.assertEqual(Unpickler.dispatch, dispatch)
+
 
 if __name__ == "__main__":
     unittest.main()
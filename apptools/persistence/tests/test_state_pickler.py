@@ -9,7 +9,11 @@ import base64
 import unittest
 import math
 import os
+import pickle
+import sys
 import tempfile
+import zlib
+from io import BytesIO
 
 import numpy
 
@@ -87,6 +91,64 @@ class TestTraits(HasTraits):
         self.ref = self.numeric
 
 
+# Classes to test graphs of instances.
+class Leaf(object):
+
+    def __init__(self):
+        self.value = 0
+
+
+class Branch(object):
+
+    def __init__(self):
+        self.leaf = Leaf()
+        self.value = 0
+
+
+class Tree(object):
+
+    def __init__(self):
+        self.branches = [Branch() for i in range(8)]
+        self.named = {'a': Branch(), 'b': Branch()}
+        self.first = 0
+        self.last = 0
+        self.trunk = Branch()
+
+
+class Knot(HasTraits):
+    value = Int
+    name = Str
+    peer = Any
+
+
+# `state_pickler.dumps` of the graph built by `test_dumps_unchanged`, as
+# written by the original, recursive `StatePickler`, zlib compressed.
+DUMPS_FIXTURE = base64.b64decode(
+    b'eNqNkcFugzAMhu9+EbhsIomBcu0NadqlD1BFkGZolEYkrbS3nx0Cqqp22inmt/Pn'
+    b'/3DeuwIOWa+DzsAJyEcnIe+dIvFmZj9cJtKR9RLy/JDtZz11X6RVNBGMD0cfdDBH'
+    b'N3Tfo5mpUUNwO2jfBJ0NaH/IulF7f5z02fAbBdgKSB2mIejZetYEvykkWCoC9cKP'
+    b'i7McI1zdGD8w3uq5LKGV4L2NA8NEEaYuzpCz5a7g2fOlvy5Xa7A1d+IzO0hFQ5dH'
+    b'o080IQtWpAAbWaWMsB+pqfh6cBITliyJyzIJtaiIdrJi388UajYnM5sllaxTqjWz'
+    b'3XIin/fp5JpOcrqbHq/soApoiw24H7rAokgmJXW8vZ+xW4/yec0LlQlNKUKjDUQi'
+    b'tRKpjajagNQdkP2DoXpkUHViUASz/FnVPPNCeJm7TrmxiF5t9EPxwiU4lJBiYZJ3'
+    b'sBioBI7I4OsusUzkWD3ZJdb/Q28e0XFdHxLwczLBkk6rHAfPqyyL1KTz/RcDNOqa'
+)
+
+# The same for the graph of `Knot` instances of `test_dumps_unchanged`.
+TRAITS_DUMPS_FIXTURE = base64.b64decode(
+    b'eNptkz1v4zAMhnf9kXi5wvqgbM9dWhyQJd0D1dbpjLqOYCkF7t8fKdNpA2eyxJcv'
+    b'KT5MqiHW4nQYXHYHEaWopqhENUSNwS+/pPEyY9xQHERVnQ7PLy69LW7MCeMWs3K5'
+    b'PPV5CzYix1a8/pL47YQj00+PrL9Nf10633ySDFKxU+rV+nu+ZBINuXzK55Rd9uc4'
+    b'9h+TX0gByrabrREunQ795FI6z+7TU0YrAvoxPM5jdkso3ToaU9UoiSqjlv9FSlaS'
+    b'Gl3jVC6quAY6avGKtxRKwjjjM+a+5GDlQKqk3M/LcF2tgJUBJVn6WMGHBt3Rl5er'
+    b'VhzRwq9UHSq0BF1ToS83XSmsZanMfYexJxpacU+NiqN1aRHKkrTZb0nDozVpi7h0'
+    b'w9x0S7iDJB7l3rFg6lUwZRy8y01QSDpsbMPK02ia88ivXfwfv/gVk9kwbRDDDVz5'
+    b'3uEywLgMckNMdGq+KwfzgzkeiNw79WgxTMBuPW6ggEGZjkFBvQcF8hEoUDgtaB4b'
+    b'zD0ogE2w96BgQwvtA1DQPRpnz8bu2Nia2VhZ2BwZAP0dFc9f7+ZvaH5eyzQm+hFZ'
+    b'zRpmP/0H7wgSOw=='
+)
+
+
 class TestDictPickler(unittest.TestCase):
 
     def set_object(self, obj):
@@ -347,6 +409,23 @@ class TestDictPickler(unittest.TestCase):
         # Check everything.
         self.verify_unpickled(t1, res)
 
+    def test_state_setter_tuple_items(self):
+        """Test if tuples with instances in lists and dicts are set."""
+        obj = A()
+        obj.list = [(1, A())]
+        obj.dict = {'t': (2, A())}
+        obj.list[0][1].a = 'list'
+        obj.dict['t'][1].a = 'dict'
+        res = state_pickler.get_state(obj)
+        obj1 = A()
+        obj1.list = [(0, A())]
+        obj1.dict = {'t': (0, A())}
+        state_pickler.set_state(obj1, res)
+        self.assertEqual(obj1.list[0][0], 1)
+        self.assertEqual(obj1.list[0][1].a, 'list')
+        self.assertEqual(obj1.dict['t'][0], 2)
+        self.assertEqual(obj1.dict['t'][1].a, 'dict')
+
     def test_pickle_traits(self):
         """Test if traited classes can be pickled."""
         t = TestTraits()
@@ -452,6 +531,444 @@ class TestDictPickler(unittest.TestCase):
         s = state_pickler.get_state(b)
         self.assertEqual(s.a, 'dict')
 
+    def test_deep_graph(self):
+        """Test if graphs deeper than the recursion limit can be dumped."""
+        head = node = A()
+        for i in range(50000):
+            node.child = A()
+            node = node.child
+        state = state_pickler.StatePickler().dump_state(head)
+        depth = 0
+        while 'child' in state['data']['data']:
+            state = state['data']['data']['child']
+            depth += 1
+        self.assertEqual(depth, 50000)
+
+    def test_dumps_deep_graph(self):
+        """Test if graphs deeper than the recursion limit can be pickled."""
+        head = node = A()
+        for i in range(20000):
+            node.child = A()
+            node = node.child
+        fd, filepath = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            for numeric_format in ('gzip', 'raw'):
+                pickler = state_pickler.StatePickler(
+                    numeric_format=numeric_format
+                )
+                data = pickler.dumps(head)
+                pickler = state_pickler.StatePickler(
+                    numeric_format=numeric_format
+                )
+                with open(filepath, 'wb') as f:
+                    pickler.dump(head, f)
+                with open(filepath, 'rb') as f:
+                    self.assertEqual(f.read(), data)
+                # The unpickler of pickle does not recurse.
+                if numeric_format == 'gzip':
+                    state = pickle.loads(data)
+                else:
+                    state = state_pickler._ArrayUnpickler(
+                        BytesIO(data)
+                    ).load()
+                depth = 0
+                while 'child' in state['data']['data']:
+                    state = state['data']['data']['child']
+                    depth += 1
+                self.assertEqual(depth, 20000)
+        finally:
+            os.remove(filepath)
+
+    def test_pickler_writes_as_pickle(self):
+        """Test if the states are pickled as pickle does."""
+        t = (1, 2)
+        d = {'a': [1, 2.5, u'b', None], 'b': t, 'c': t}
+        state = [d, d, (), (t,), (1, 2, 3, 4), [[]] * 1500,
+                 dict.fromkeys(range(1500))]
+        recursive = [1]
+        recursive.append((recursive,))
+        state.append(recursive)
+        for protocol in (0, 1, 2):
+            s = BytesIO()
+            state_pickler._Pickler(s, protocol).dump(state)
+            self.assertEqual(s.getvalue(), pickle.dumps(state, protocol))
+
+    def test_references_by_identity(self):
+        """Test if equal but distinct objects are not made references."""
+        a, b = tuple([1, 'a']), tuple([1, 'a'])
+        state = state_pickler.StatePickler().dump_state([a, b, a])
+        data = state['data']
+        self.assertEqual(data[0]['type'], 'tuple')
+        self.assertEqual(data[1]['type'], 'tuple')
+        self.assertNotEqual(data[0]['id'], data[1]['id'])
+        self.assertEqual(data[2], dict(type='reference', id=data[0]['id'],
+                                       data=None))
+
+    def test_basic_types_are_not_references(self):
+        value = 123456789
+        state = state_pickler.StatePickler().dump_state([value, value])
+        self.assertEqual(state['data'], [value, value])
+
+    @unittest.skipIf(sys.version_info[0] > 2,
+                     'the fixture is a Python 2 pickle')
+    def test_dumps_unchanged(self):
+        """Test if instance graphs are dumped to the same bytes as before."""
+        b1, b2 = Branch(), Branch()
+        b2.leaf = b1.leaf
+        graph = [b1, b2, (1, b1.leaf), Leaf()]
+        self.assertEqual(state_pickler.dumps(graph),
+                         zlib.decompress(DUMPS_FIXTURE))
+
+        k1, k2 = Knot(value=1, name='a'), Knot(value=2, name='b')
+        k2.peer = k1
+        graph = [k1, k2, Knot()]
+        self.assertEqual(state_pickler.dumps(graph),
+                         zlib.decompress(TRAITS_DUMPS_FIXTURE))
+
+    def _get_arrays(self):
+        x = numpy.arange(24.).reshape(2, 3, 4)
+        return [x,
+                numpy.asfortranarray(x),
+                x[:, ::2, 1:],
+                numpy.array(3, 'i2'),
+                numpy.zeros((0, 3)),
+                numpy.ones(5, dtype=[('a', 'i4'), ('b', 'f8')]),
+                numpy.array([1, 'a', None], dtype=object)]
+
+    def _check_arrays(self, arrays, state):
+        for array, result in zip(arrays, state):
+            self.assertEqual(array.dtype, result.dtype)
+            self.assertEqual(array.shape, result.shape)
+            numpy.testing.assert_array_equal(array, result)
+
+    def test_raw_numeric_format(self):
+        arrays = self._get_arrays()
+        for compress in (False, True):
+            s = state_pickler.dumps(arrays + [arrays[0]],
+                                    numeric_format='raw', compress=compress)
+            state = state_pickler.loads_state(s)
+            self._check_arrays(arrays, state)
+            self.assertTrue(state[0] is state[-1])
+            self.assertTrue(state[1].flags.f_contiguous)
+            # The loaded arrays can be modified.
+            state[0][0, 0, 0] = -1
+
+    def test_raw_numeric_format_smaller(self):
+        x = numpy.random.random(1000)
+        raw = state_pickler.dumps(x, numeric_format='raw')
+        self.assertTrue(len(raw) < len(state_pickler.dumps(x)))
+
+    def test_load_raw_numeric_format_mmap(self):
+        arrays = self._get_arrays()
+        t = TestClassic()
+        t.arrays = arrays
+        fd, filepath = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            state_pickler.dump(t, filepath, numeric_format='raw')
+            state = state_pickler.load_state(filepath, mmap_mode='r')
+            self.assertTrue(isinstance(state.numeric, numpy.memmap))
+            self.assertTrue(state.ref is state.numeric)
+            numpy.testing.assert_array_equal(state.numeric, t.numeric)
+            self._check_arrays(arrays, state.arrays)
+            # Release the maps before removing the file.
+            del state
+        finally:
+            os.remove(filepath)
+
+    def test_unpickle_stream(self):
+        """Test if states dumped as streams are loaded like the others."""
+        for numeric_format in ('gzip', 'raw'):
+            t = TestClassic()
+            self.set_object(t)
+            s = state_pickler.dumps(t, numeric_format=numeric_format,
+                                    stream=True)
+            res = state_pickler.loads_state(s)
+            self.verify_unpickled(t, res)
+            self.assertTrue(res.ref is res.numeric)
+            self.assertTrue(res.list.has_instance)
+            self.assertFalse(res.pure_list.has_instance)
+            t1 = state_pickler.create_instance(res)
+            state_pickler.set_state(t1, res)
+            self.verify_unpickled(t1, res)
+
+    def test_stream_references(self):
+        a = [1]
+        a.append(a)
+        t = ([], 2)
+        t[0].append(t)
+        res = state_pickler.loads_state(
+            state_pickler.dumps([a, t, {'a': a}], stream=True)
+        )
+        self.assertTrue(res[0][1] is res[0])
+        self.assertTrue(res[2]['a'] is res[0])
+        self.assertTrue(res[1][0][0] is res[1])
+
+        a = A()
+        t = (a, 1)
+        a.t = t
+        res = state_pickler.loads_state(
+            state_pickler.dumps([t], stream=True)
+        )
+        self.assertTrue(res[0][0].t is res[0])
+
+    def test_stream_deep_graph(self):
+        head = node = A()
+        for i in range(50000):
+            node.child = A()
+            node = node.child
+        state = state_pickler.loads_state(
+            state_pickler.dumps(head, stream=True)
+        )
+        depth = 0
+        while 'child' in state:
+            state = state.child
+            depth += 1
+        self.assertEqual(depth, 50000)
+
+    def test_load_stream_mmap(self):
+        arrays = self._get_arrays()
+        fd, filepath = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            state_pickler.dump(arrays, filepath, numeric_format='raw',
+                               stream=True)
+            state = state_pickler.load_state(filepath, mmap_mode='r')
+            self.assertTrue(isinstance(state[0], numpy.memmap))
+            self._check_arrays(arrays, state)
+            del state
+        finally:
+            os.remove(filepath)
+
+    def test_unpickle_lazy(self):
+        """Test if lazy states are loaded like the others."""
+        for numeric_format in ('gzip', 'raw'):
+            t = TestClassic()
+            self.set_object(t)
+            s = state_pickler.dumps(t, numeric_format=numeric_format)
+            res = state_pickler.loads_state(s, lazy=True)
+            self.verify_unpickled(t, res)
+            self.assertTrue(res.ref is res.numeric)
+            self.assertTrue(res.list.has_instance)
+            self.assertFalse(res.pure_list.has_instance)
+            res = state_pickler.loads_state(s, lazy=True)
+            t1 = state_pickler.create_instance(res)
+            state_pickler.set_state(t1, res)
+            self.verify_unpickled(t1, res)
+
+    def test_lazy_metadata(self):
+        """Test if the metadata of a lazy state is read without
+        converting its values.
+        """
+        t = Tree()
+        res = state_pickler.loads_state(state_pickler.dumps(t), lazy=True)
+        self.assertEqual(res.__metadata__['class_name'], 'Tree')
+        self.assertEqual(sorted(dict.keys(res)),
+                         sorted(['__metadata__'] + list(t.__dict__.keys())))
+        self.assertFalse(isinstance(res, state_pickler.StateDict))
+        self.assertNotEqual(type(res), state_pickler.State)
+        branches = res.branches
+        self.assertEqual(type(res), state_pickler.State)
+        self.assertNotEqual(type(branches), state_pickler.StateList)
+        self.assertTrue(branches.has_instance)
+        self.assertEqual(len(branches), len(t.branches))
+        self.assertEqual(branches[0].leaf.value, 0)
+        self.assertEqual(type(branches), state_pickler.StateList)
+
+    def test_lazy_dump_and_copy(self):
+        """Test if a lazy state is saved and copied as the others."""
+        t = Tree()
+        t.named['a'].value = 5
+        s = state_pickler.dumps(t)
+        res = state_pickler.loads_state(
+            state_pickler.dumps(state_pickler.loads_state(s, lazy=True))
+        )
+        self.assertEqual(type(res), state_pickler.State)
+        self.assertEqual(type(res.named), state_pickler.StateDict)
+        t1 = Tree()
+        state_pickler.set_state(t1, res)
+        self.assertEqual(t1.named['a'].value, 5)
+
+        def update(state):
+            result = {}
+            result.update(state)
+            return result
+
+        for copy in (dict, update):
+            res = copy(state_pickler.loads_state(s, lazy=True))
+            for value in res.values():
+                self.assertNotEqual(type(value), state_pickler._Raw)
+            self.assertTrue(isinstance(res['branches'],
+                                       state_pickler.StateList))
+            self.assertEqual(res['named']['a'].value, 5)
+
+    def test_lazy_references(self):
+        a = [1]
+        a.append(a)
+        res = state_pickler.loads_state(
+            state_pickler.dumps([a, {'a': a}]), lazy=True
+        )
+        self.assertTrue(res[1]['a'] is res[0])
+        self.assertTrue(res[0][1] is res[0])
+
+    def test_load_lazy_closed_file(self):
+        """Test if the arrays of a lazy state are read after the file
+        is closed.
+        """
+        arrays = self._get_arrays()
+        fd, filepath = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            state_pickler.dump(arrays, filepath, numeric_format='raw')
+            state = state_pickler.load_state(filepath, lazy=True)
+            self._check_arrays(arrays, state)
+        finally:
+            os.remove(filepath)
+
+    def test_state_log(self):
+        """Test if a state log only appends the changes and loads the
+        last save.
+        """
+        t = TestClassic()
+        t.arrays = [numpy.arange(10000.), numpy.zeros(5)]
+        fd, filepath = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            log = state_pickler.StateLog(filepath)
+            log.dump(t)
+            size = os.path.getsize(filepath)
+            t.inst.a = 'c'
+            log.dump(t)
+            self.assertTrue(os.path.getsize(filepath) - size < 1000)
+            t.arrays[1][0] = 1
+            log.dump(t)
+            for lazy in (False, True):
+                res = state_pickler.load_state(filepath, lazy=lazy)
+                self.assertEqual(res.inst.a, 'c')
+                self.assertTrue(res.inst is res.list[-1])
+                self.assertTrue(res.ref is res.numeric)
+                self.assertTrue(res.list.has_instance)
+                self.assertFalse(res.pure_list.has_instance)
+                self._check_arrays(t.arrays, res.arrays)
+            t1 = TestClassic()
+            t1.arrays = None
+            state_pickler.set_state(t1, state_pickler.load_state(filepath))
+            self.assertEqual(t1.inst.a, 'c')
+            self.assertEqual(t1.tuple[-1].a, 'a')
+        finally:
+            os.remove(filepath)
+
+    def test_state_log_compaction(self):
+        t = TestClassic()
+        t.array = numpy.arange(10000.)
+        fd, filepath = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            log = state_pickler.StateLog(filepath, compact_ratio=2.0)
+            log.dump(t)
+            size = os.path.getsize(filepath)
+            for i in range(10):
+                t.array[0] = i
+                log.dump(t)
+            self.assertTrue(os.path.getsize(filepath) <= 2 * size)
+            res = state_pickler.load_state(filepath)
+            self.assertEqual(res.array[0], 9)
+        finally:
+            os.remove(filepath)
+
+    def test_state_log_interrupted_save(self):
+        """Test if the last complete save is loaded from a state log
+        whose last save was cut short.
+        """
+        t = TestClassic()
+        t.array = numpy.arange(10000.)
+        fd, filepath = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            log = state_pickler.StateLog(filepath)
+            log.dump(t)
+            t.array[0] = -1
+            t.i = 0
+            log.dump(t)
+            with open(filepath, 'rb') as f:
+                data = f.read()
+            with open(filepath, 'wb') as f:
+                f.write(data[:-100])
+            res = state_pickler.load_state(filepath)
+            self.assertEqual(res.i, 7)
+            self.assertEqual(res.array[0], 0)
+        finally:
+            os.remove(filepath)
+
+    def test_state_log_failed_save(self):
+        """Test if a save that fails partway leaves the state log as it
+        was, for the next save to append to.
+        """
+        def write_state(state, file, compress=False):
+            file.write(b'partial')
+            raise IOError('No space left on device')
+
+        t = TestClassic()
+        t.array = numpy.arange(10000.)
+        fd, filepath = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            log = state_pickler.StateLog(filepath)
+            log.dump(t)
+            size = os.path.getsize(filepath)
+            t.i = 0
+            write_state_orig = state_pickler._write_state
+            state_pickler._write_state = write_state
+            try:
+                self.assertRaises(IOError, log.dump, t)
+            finally:
+                state_pickler._write_state = write_state_orig
+            self.assertEqual(os.path.getsize(filepath), size)
+            t.array[0] = -1
+            log.dump(t)
+            res = state_pickler.load_state(filepath)
+            self.assertEqual(res.i, 0)
+            self.assertEqual(res.array[0], -1)
+        finally:
+            os.remove(filepath)
+
+    def test_state_log_corrupt(self):
+        """Test if a corrupt save of a state log is an error rather than
+        the end of the log.
+        """
+        fd, filepath = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            log = state_pickler.StateLog(filepath)
+            log.dump(TestClassic())
+            size = os.path.getsize(filepath)
+            with open(filepath, 'ab') as f:
+                f.write(b'\0' * (state_pickler._align(size) - size))
+                f.write(pickle.dumps([], 2))
+                f.write(pickle.dumps(('not a commit', None), 2))
+            self.assertRaises(state_pickler.StateUnpicklerError,
+                              state_pickler.load_state, filepath)
+
+            # A corrupt byte within the log, followed by a complete save.
+            t = TestClassic()
+            t.i = 1
+            log = state_pickler.StateLog(filepath, compact_ratio=100.0)
+            log.dump(t)
+            size = os.path.getsize(filepath)
+            t.i = 2
+            log.dump(t)
+            t.i = 3
+            log.dump(t)
+            with open(filepath, 'r+b') as f:
+                f.seek(state_pickler._align(size))
+                f.write(b'\xff')
+            # Python 2's pickle raises a KeyError on an unknown opcode.
+            self.assertRaises((pickle.UnpicklingError, KeyError),
+                              state_pickler.load_state, filepath)
+        finally:
+            os.remove(filepath)
+
     def test_dump_to_file_str(self):
         """Test if dump can take a str as file"""
         obj = A()
@@ -6,9 +6,11 @@
 # License: BSD Style.
 
 # Standard library imports.
+import gc
 import sys
 from imp import reload
 import unittest
+import weakref
 
 # Enthought library imports.
 from traits.api import HasTraits
@@ -70,6 +72,55 @@ class TestVersionRegistry(unittest.TestCase):
         state = state_pickler.get_state(t)
         self.assertEqual(state.__metadata__['version'], res)
 
+    def test_get_version_changed(self):
+        """Test if changes to the versions of the classes are seen once
+        the cache is cleared."""
+        class A(New):
+            __version__ = 2
+        v = version_registry.get_version(A())
+        self.assertEqual(v[-1], (('A', __name__), 2))
+        A.__version__ = 3
+        version_registry.clear_version_cache()
+        v = version_registry.get_version(A())
+        self.assertEqual(v[-1], (('A', __name__), 3))
+        pickler = state_pickler.StatePickler()
+        for version in (3, 4):
+            A.__version__ = version
+            version_registry.clear_version_cache()
+            state = pickler.dump_state(A())
+            self.assertEqual(state['version'][-1],
+                             (('A', __name__), version))
+        pickler = state_pickler.StatePickler(stream=True)
+        for version in (4, 5):
+            A.__version__ = version
+            version_registry.clear_version_cache()
+            state = state_pickler.loads_state(pickler.dumps(A()))
+            self.assertEqual(state.__metadata__['version'][-1],
+                             (('A', __name__), version))
+
+    def test_get_version_cache(self):
+        """Test if the cached versions are found again when needed."""
+        class A(New):
+            __version__ = 2
+        v = version_registry.get_version(A())
+        # The callers get their own list.
+        v.append(None)
+        v = version_registry.get_version(A())
+        self.assertEqual(v[-1], (('A', __name__), 2))
+        self.assertEqual(version_registry.get_class_version(A), tuple(v))
+
+        # The cache does not keep the classes alive.
+        ref = weakref.ref(A)
+        del A
+        gc.collect()
+        self.assertTrue(ref() is None)
+
+        # Redefined classes are new classes.
+        class A(New):
+            __version__ = 4
+        v = version_registry.get_version(A())
+        self.assertEqual(v[-1], (('A', __name__), 4))
+
     def test_reload(self):
         """Test if the registry is reload safe."""
         # A dummy handler.
@@ -7,6 +7,20 @@ def __replacement_setstate__(self, state):
     return
 
 
+def __finish_setstate__(self, state):
+    """ Updates the state and sets it with the original __setstate__ of the
+    class, if it has one.
+    """
+    state = self.__updater__(state)
+    setstate = getattr(self, '__setstate_original__', None)
+    if setstate is None:
+        self.__dict__.update(state)
+    else:
+        setstate(state)
+
+    return
+
+
 
 
 class Updater:
@@ -38,4 +52,71 @@ class Updater:
 
         return string
 
+
+    def get_setstate(self, module, name):
+        """ Returns the function updating the state of the instances of the
+        class with the given original module and name, or False.
+        """
+        return getattr(self, 'setstates', {}).get((module, name), False)
+
+
+
+class ChainedUpdater(Updater):
+
+    """ Applies a sequence of updaters at once, so that a project several
+    versions behind can be upgraded in a single unpickling pass.
+
+    The class names are mapped by each updater in turn, and the functions
+    updating the states of a class are called in the same order.
+    """
+
+    def __init__(self, updaters):
+        self.updaters = updaters
+
+        # The chained state functions by original module and name.
+        self._setstates = {}
+
+        return
+
+
+    def get_latest(self, module, name):
+        for updater in self.updaters:
+            module, name = updater.get_latest(module, name)
+
+        return module, name
+
+
+    def get_setstate(self, module, name):
+        key = (module, name)
+        if key not in self._setstates:
+            functions = []
+            for updater in self.updaters:
+                fn = updater.get_setstate(module, name)
+                if fn:
+                    functions.append(fn)
+                # the next updater knows the class by its new name
+                module, name = updater.get_latest(module, name)
+
+            if len(functions) > 1:
+                self._setstates[key] = _chain_setstates(functions)
+            elif functions:
+                self._setstates[key] = functions[0]
+            else:
+                self._setstates[key] = False
+
+        return self._setstates[key]
+
+
+
+def _chain_setstates(functions):
+    """ Returns a state function calling the given ones in turn.
+    """
+    def setstate(self, state):
+        for fn in functions:
+            state = fn(self, state)
+
+        return state
+
+    return setstate
+
 #### EOF #######################################################################
@@ -9,10 +9,17 @@ versions.
 import sys
 import inspect
 import logging
+import weakref
 
 
 logger = logging.getLogger(__name__)
 
+# The classes of the MRO of each class, but the builtins, with their
+# versions, by class.  The class itself is given as None so that it is
+# not kept alive: a redefined or reloaded class is a new key, and the
+# entries of the old ones go away with them.
+_class_versions = weakref.WeakKeyDictionary()
+
 
 ######################################################################
 # Utility functions.
@@ -22,19 +29,59 @@ def get_version(obj):
     various classes and returns a list of tuples of the form
     ((class_name, module), version) in reverse order of the MRO.
     """
+    return _get_versions(obj.__class__)
+
+
+def get_class_version(klass):
+    """Returns the versions of the class `klass`, as `get_version` does
+    for its instances but as a tuple.
+    """
+    return tuple(_get_versions(klass))
+
+
+def clear_version_cache():
+    """Forgets the versions of the classes found by `get_version`.
+
+    The versions are looked up once per class, so this must be called
+    after changing the `__version__` of a class whose versions were
+    already asked for.
+    """
+    _class_versions.clear()
+
+
+def _get_versions(klass):
+    try:
+        classes = _class_versions.get(klass)
+    except TypeError:
+        # Not weakly referenceable.
+        classes = _find_versions(klass)
+    else:
+        if classes is None:
+            classes = _class_versions[klass] = _find_versions(klass)
+
+    # The names are looked up for each call, as they were before the
+    # versions were cached, so that the pickles are unchanged.
+    res = []
+    for cls, version in classes:
+        if cls is None:
+            cls = klass
+        res.append(((cls.__name__, cls.__module__), version))
+    return res
+
+
+def _find_versions(klass):
     res = []
-    for cls in inspect.getmro(obj.__class__):
-        class_name, module = cls.__name__, cls.__module__
-        if module in ['__builtin__']:
+    for cls in inspect.getmro(klass):
+        if cls.__module__ in ['__builtin__']:
             # No point in versioning builtins.
             continue
         try:
             version = cls.__version__
         except AttributeError:
             version = -1
-        res.append( ( (class_name, module), version) )
+        res.append((None if cls is klass else cls, version))
     res.reverse()
-    return res
+    return tuple(res)
 
 
 ######################################################################
@@ -2,14 +2,19 @@
 from pickle import *
 import sys, new
 import logging
+from inspect import getmro
 from types import GeneratorType
 
 # Enthought library imports
-from apptools.persistence.updater import __replacement_setstate__
+from apptools.persistence.updater import __replacement_setstate__, \
+    __finish_setstate__
 
 
 logger = logging.getLogger(__name__)
 
+# The attributes of the classes replaced while their instances are updated.
+_PATCHED_ATTRIBUTES = ('__setstate__', '__setstate_original__', '__updater__')
+
 ##############################################################################
 # class 'NewUnpickler'
 ##############################################################################
@@ -101,12 +106,24 @@ class VersionedUnpickler(NewUnpickler):
 
     This ensures that the VersionedUnpickler can remain ignorant about the
     actual version numbers - all it needs to do is upgrade one release.
+
+    If 'finish' is True the updater brings the objects to the version of
+    their classes in the application, and the state it returns is set with
+    the class's own __setstate__ (if any) rather than copied to __dict__.
     """
 
 
-    def __init__(self, file, updater=None):
+    def __init__(self, file, updater=None, finish=False):
         Unpickler.__init__(self, file)
         self.updater = updater
+        self.finish = finish
+
+        # The classes whose __setstate__ was replaced by the updater.
+        self.updated_classes = []
+
+        # The attributes of the updated classes which the unpickler
+        # replaces, as they were in their __dict__ (None if missing).
+        self._class_attributes = {}
         return
 
 
@@ -156,18 +173,26 @@ class VersionedUnpickler(NewUnpickler):
         class as the __setstate__ method.
         """
 
-        fn = self.updater.setstates.get((module, name), False)
+        fn = self.updater.get_setstate(module, name)
 
         if fn:
-            # move the existing __setstate__ out of the way
-            self.backup_setstate(module, klass)
+            if klass not in self.updated_classes:
+                self.updated_classes.append(klass)
+
+                # move the existing __setstate__ out of the way
+                self.backup_setstate(module, klass)
 
             # add the updater into the class
             m = new.instancemethod(fn, None, klass)
             setattr(klass, '__updater__', m)
 
-            # hook up our __setstate__ which updates self.__dict__
-            m = new.instancemethod(__replacement_setstate__, None, klass)
+            # hook up our __setstate__ which updates self.__dict__, or
+            # calls the original __setstate__
+            if self.finish:
+                setstate = __finish_setstate__
+            else:
+                setstate = __replacement_setstate__
+            m = new.instancemethod(setstate, None, klass)
             setattr(klass, '__setstate__', m)
 
         else:
@@ -180,20 +205,27 @@ class VersionedUnpickler(NewUnpickler):
     def backup_setstate(self, module, klass):
         """ If the class has a user defined __setstate__ we back it up.
         """
-        if getattr(klass, '__setstate__', False):
-
-            if getattr(klass, '__setstate_original__', False):
-                # don't overwrite the original __setstate__
-                name = '__setstate__%s' % self.updater.__class__
-            else:
-                # backup the original __setstate__ which we will restore
-                # and run later when we have finished updating the class
-                name = '__setstate_original__'
-
-            #logger.debug('renaming __setstate__ to %s' % name)
-            method = getattr(klass, '__setstate__')
+        # keep the attributes we replace, to put them back as they were
+        self._class_attributes[klass] = dict(
+            (name, klass.__dict__.get(name)) for name in _PATCHED_ATTRIBUTES
+        )
+
+        # the __setstate__ the class had before this unpickling, which a
+        # base class updated earlier may hide
+        method = None
+        for base in getmro(klass):
+            attributes = self._class_attributes.get(base)
+            if attributes is None:
+                attributes = base.__dict__
+            method = attributes.get('__setstate__')
+            if method is not None:
+                break
+
+        if method is not None:
+            # backup the original __setstate__ which we will restore
+            # and run later when we have finished updating the class
             m = new.instancemethod(method, None, klass)
-            setattr(klass, name, m)
+            setattr(klass, '__setstate_original__', m)
 
         else:
             # the class has no __setstate__ method so do nothing
@@ -202,6 +234,23 @@ class VersionedUnpickler(NewUnpickler):
         return
 
 
+    def restore_setstates(self):
+        """ Puts back the __setstate__ methods of the classes updated while
+        unpickling, so that their instances are not updated again by later
+        unpicklings.
+        """
+        for klass in self.updated_classes:
+            attributes = self._class_attributes.pop(klass)
+            for name, value in attributes.items():
+                if value is not None:
+                    setattr(klass, name, value)
+                elif name in klass.__dict__:
+                    delattr(klass, name)
+
+        self.updated_classes = []
+        return
+
+
     def import_name(self, module, name):
         """
         If the class is needed for the latest version of the application then
@@ -108,29 +108,32 @@
 # Expose our custom pickler as the standard Unpickler
 from versioned_unpickler import VersionedUnpickler as Unpickler
 
-# Use our custom unpickler to load from files
+# Use the C unpickler to load from files, or our custom unpickler when any
+# class in the pickle needs it
 def load(file, max_pass=-1):
-    return Unpickler(file).load(max_pass)
+    from versioned_unpickler import load as l
+    return l(file, max_pass)
 
-# Use our custom unpickler to load from strings
+# Use the C unpickler, or our custom unpickler, to load from strings
 def loads(str, max_pass=-1):
     from io import BytesIO
     file = BytesIO(str)
 
-    return Unpickler(file).load(max_pass)
+    return load(file, max_pass)
 
 # We don't customize the Python pickler, though we do use the cPickle module
 # for improved performance.
-from cPickle import Pickler
+from cPickle import Pickler, HIGHEST_PROTOCOL
 
 # Implement the dump and dumps methods so that all traits in a HasTraits object
-# get included in the pickle.
-def dump(obj, file, protocol=2):
+# get included in the pickle.  The highest protocol this Python supports is
+# used by default, pass a protocol of 2 for pickles that Python 2 can read.
+def dump(obj, file, protocol=HIGHEST_PROTOCOL):
     _flush_traits(obj)
     from cPickle import dump as d
     return d(obj, file, protocol)
 
-def dumps(obj, protocol=2):
+def dumps(obj, protocol=HIGHEST_PROTOCOL):
     _flush_traits(obj)
     from cPickle import dumps as ds
     return ds(obj, protocol)
@@ -0,0 +1,216 @@
+""" Tests which unpickler the apptools.sweet_pickle framework uses.
+"""
+
+# Standard library imports.
+import pickle
+import unittest
+from io import BytesIO
+
+# Enthought library imports
+import apptools.sweet_pickle as sweet_pickle
+from apptools.sweet_pickle.global_registry import _clear_global_registry
+from apptools.sweet_pickle.versioned_unpickler import VersionedUnpickler
+
+
+##############################################################################
+# Classes to use within the tests
+##############################################################################
+
+# Need complete package name so that mapping matches correctly.
+from apptools.sweet_pickle.tests.class_mapping_classes import Foo, Bar, Baz
+from apptools.sweet_pickle.tests.state_function_classes import Foo as SFoo, \
+    Bar as SBar, Baz as SBaz
+
+
+class Counted(object):
+    """ Counts the calls of its __setstate__ method.
+    """
+    setstate_calls = 0
+
+    def __setstate__(self, state):
+        Counted.setstate_calls += 1
+        self.__dict__.update(state)
+
+
+class Stream(object):
+    """ A file that can't seek.
+    """
+
+    def __init__(self, data):
+        self._file = BytesIO(data)
+        self.read = self._file.read
+        self.readline = self._file.readline
+
+
+def sbar_state_function(state):
+    for old, new in [('b1', 'b2'), ('f1', 'f2'), ('i1', 'i2'), ('s1', 's2')]:
+        state[new] = state.pop(old)
+    state['_enthought_pickle_version'] = 2
+    return state
+
+
+##############################################################################
+# class 'FastPathTestCase'
+##############################################################################
+
+class FastPathTestCase(unittest.TestCase):
+    """ Tests that the C unpickler is used unless a class needs the
+        VersionedUnpickler.
+    """
+
+    ##########################################################################
+    # 'TestCase' interface
+    ##########################################################################
+
+    ### public interface #####################################################
+
+    def setUp(self):
+        """ Creates the test fixture.
+
+            Overridden here to ensure each test starts with an empty global
+            registry, and to count the loads of the VersionedUnpickler.
+        """
+        _clear_global_registry()
+        self.registry = sweet_pickle.get_global_registry()
+
+        self.versioned_loads = 0
+        self._load = VersionedUnpickler.load
+        def load(unpickler, max_pass=-1):
+            self.versioned_loads += 1
+            return self._load(unpickler, max_pass)
+        VersionedUnpickler.load = load
+
+
+    def tearDown(self):
+        """ Restores the VersionedUnpickler.
+        """
+        VersionedUnpickler.load = self._load
+
+
+    ##########################################################################
+    # 'FastPathTestCase' interface
+    ##########################################################################
+
+    ### public interface #####################################################
+
+    def test_class_mapping(self):
+        """ Validates that class mappings are applied by the C unpickler.
+        """
+        self.registry.add_mapping_to_class(Foo.__module__, Foo.__name__, Bar)
+        self.registry.add_mapping_to_class(Bar.__module__, Bar.__name__, Baz)
+
+        end = sweet_pickle.loads(sweet_pickle.dumps([Foo(), Bar(), 1]))
+        self.assertEqual(True, isinstance(end[0], Baz))
+        self.assertEqual(True, isinstance(end[1], Baz))
+        self.assertEqual(0, self.versioned_loads)
+
+
+    def test_state_function(self):
+        """ Validates that the VersionedUnpickler reads pickles holding a
+            class with state functions, following other pickles in a file.
+        """
+        self.registry.add_mapping_to_class(SFoo.__module__, SFoo.__name__,
+            SBar)
+        self.registry.add_mapping_to_class(SBar.__module__, SBar.__name__,
+            SBaz)
+        self.registry.add_state_function_for_class(SBar, 2,
+            sbar_state_function)
+
+        file = BytesIO()
+        sweet_pickle.dump(Foo(), file)
+        sweet_pickle.dump([Foo(), SFoo(i1=5)], file)
+        sweet_pickle.dump(Foo(), file)
+        file.seek(0)
+
+        self.assertEqual(True, isinstance(sweet_pickle.load(file), Foo))
+        self.assertEqual(0, self.versioned_loads)
+        end = sweet_pickle.load(file)
+        self.assertEqual(True, isinstance(end[1], SBaz))
+        self.assertEqual(5, end[1].i3)
+        self.assertEqual(1, self.versioned_loads)
+        self.assertEqual(True, isinstance(sweet_pickle.load(file), Foo))
+        self.assertEqual(1, self.versioned_loads)
+
+
+    def test_objects_built_once(self):
+        """ Validates that no object is built before the VersionedUnpickler
+            is found to be needed.
+        """
+        self.registry.add_mapping_to_class(SFoo.__module__, SFoo.__name__,
+            SBar)
+        self.registry.add_mapping_to_class(SBar.__module__, SBar.__name__,
+            SBaz)
+        self.registry.add_state_function_for_class(SBar, 2,
+            sbar_state_function)
+
+        counted = Counted()
+        counted.value = 1
+        Counted.setstate_calls = 0
+        end = sweet_pickle.loads(sweet_pickle.dumps([counted, SFoo(i1=5)]))
+        self.assertEqual(1, end[0].value)
+        self.assertEqual(5, end[1].i3)
+        self.assertEqual(1, Counted.setstate_calls)
+        self.assertEqual(1, self.versioned_loads)
+
+
+    def test_file_without_seek(self):
+        """ Validates that the C unpickler reads files that can't seek.
+        """
+        self.registry.add_mapping_to_class(SFoo.__module__, SFoo.__name__,
+            SBar)
+        self.registry.add_mapping_to_class(SBar.__module__, SBar.__name__,
+            SBaz)
+        self.registry.add_state_function_for_class(SBar, 2,
+            sbar_state_function)
+
+        file = Stream(sweet_pickle.dumps(Foo()) +
+            sweet_pickle.dumps(SFoo(i1=5)) + sweet_pickle.dumps(Foo()))
+        self.assertEqual(True, isinstance(sweet_pickle.load(file), Foo))
+        self.assertEqual(0, self.versioned_loads)
+        self.assertEqual(5, sweet_pickle.load(file).i3)
+        self.assertEqual(1, self.versioned_loads)
+        self.assertEqual(True, isinstance(sweet_pickle.load(file), Foo))
+        self.assertEqual(1, self.versioned_loads)
+
+
+    def test_text_protocols(self):
+        """ Validates that the classes of the pickles with text opcodes are
+            found, whether or not the file can seek.
+        """
+        self.registry.add_mapping_to_class(SFoo.__module__, SFoo.__name__,
+            SBar)
+        self.registry.add_mapping_to_class(SBar.__module__, SBar.__name__,
+            SBaz)
+        self.registry.add_state_function_for_class(SBar, 2,
+            sbar_state_function)
+
+        loads = 0
+        for protocol in (0, 1):
+            for make_file in (BytesIO, Stream):
+                values = [1L, 1.5, 'c\nmodule\nname\n', u'\n', Foo()]
+                end = sweet_pickle.load(make_file(
+                    sweet_pickle.dumps(values, protocol)))
+                self.assertEqual(values[:4], end[:4])
+                self.assertEqual(loads, self.versioned_loads)
+
+                end = sweet_pickle.load(make_file(
+                    sweet_pickle.dumps(values + [SFoo(i1=5)], protocol)))
+                self.assertEqual(5, end[-1].i3)
+                loads += 1
+                self.assertEqual(loads, self.versioned_loads)
+
+
+    def test_protocol(self):
+        """ Validates that the highest protocol is used by default.
+        """
+        s = sweet_pickle.dumps(Foo())
+        self.assertEqual(pickle.HIGHEST_PROTOCOL, ord(s[1:2]))
+        s = sweet_pickle.dumps(Foo(), 2)
+        self.assertEqual(2, ord(s[1:2]))
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+### EOF ######################################################################
@@ -54,4 +54,16 @@ class Baz(HasTraits):
             state['_enthought_pickle_version'] = 3
         self.__dict__.update(state)
 
+class Apple(HasTraits):
+    _enthought_pickle_version = Int(1)
+    apples = Int(1)
+
+class Pear(HasTraits):
+    _enthought_pickle_version = Int(1)
+    pears = Int(1)
+
+class Fruit(HasTraits):
+    _enthought_pickle_version = Int(2)
+    count = Int(0)
+
 ### EOF ######################################################################
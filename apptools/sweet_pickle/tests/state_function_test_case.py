@@ -31,7 +31,8 @@ logger = logging.getLogger(__name__)
 # Need complete package name so that mapping matches correctly.
 # The problem here is the Python loader that will load the same module with
 # multiple names in sys.modules due to relative naming. Nice.
-from apptools.sweet_pickle.tests.state_function_classes import Foo, Bar, Baz
+from apptools.sweet_pickle.tests.state_function_classes import Foo, Bar, Baz, \
+    Apple, Pear, Fruit
 
 ##############################################################################
 # State functions to use within the tests
@@ -44,6 +45,20 @@ def bar_state_function(state):
     state['_enthought_pickle_version'] = 2
     return state
 
+def upper_state_function(state):
+    state['s2'] = state['s2'].upper()
+    return state
+
+def apple_state_function(state):
+    state['count'] = state.pop('apples')
+    state['_enthought_pickle_version'] = 2
+    return state
+
+def pear_state_function(state):
+    state['count'] = 10 * state.pop('pears')
+    state['_enthought_pickle_version'] = 2
+    return state
+
 
 ##############################################################################
 # class 'StateFunctionTestCase'
@@ -138,6 +153,65 @@ class StateFunctionTestCase(unittest.TestCase):
         self._assertAttributes(end, 3, (True, 2, 2, 'bar'))
 
 
+    def test_unpickled_chain_functionality_many_instances(self):
+        """ Validates that the registered state functions are used for every
+            instance of a class within a pickle.
+        """
+        # Add the state function to the registry
+        self.registry.add_state_function_for_class(Bar, 2,
+            bar_state_function)
+
+        start = [Foo(i1=i) for i in range(3)]
+        end = sweet_pickle.loads(sweet_pickle.dumps(start))
+        for i, obj in enumerate(end):
+            self.assertEqual(True, isinstance(obj, Baz))
+            self._assertAttributes(obj, 1, None)
+            self._assertAttributes(obj, 3, (False, 1, i, 'foo'))
+
+        # Validate that the classes are left untouched.
+        self.assertEqual(False, '__setstate__' in Bar.__dict__)
+
+
+    def test_state_functions_changed_after_unpickling(self):
+        """ Validates that state functions changed after an unpickling are
+            used by the next ones, even when a list of them is changed in
+            place.
+        """
+        self.registry.add_state_function_for_class(Bar, 2,
+            bar_state_function)
+        start = Foo()
+        end = sweet_pickle.loads(sweet_pickle.dumps(start))
+        self._assertAttributes(end, 3, (False, 1, 1, 'foo'))
+
+        key = (Bar.__module__, Bar.__name__, 2)
+        self.registry.state_functions[key].append(upper_state_function)
+        end = sweet_pickle.loads(sweet_pickle.dumps(start))
+        self._assertAttributes(end, 3, (False, 1, 1, 'FOO'))
+
+        self.registry.state_functions[key].remove(upper_state_function)
+        end = sweet_pickle.loads(sweet_pickle.dumps(start))
+        self._assertAttributes(end, 3, (False, 1, 1, 'foo'))
+
+
+    def test_several_classes_mapped_to_one(self):
+        """ Validates that the state functions of the class an instance was
+            pickled as are used, when several classes map to the same class.
+        """
+        for klass, state_function in [(Apple, apple_state_function),
+            (Pear, pear_state_function)]:
+            self.registry.add_mapping_to_class(klass.__module__,
+                klass.__name__, Fruit)
+            self.registry.add_state_function_for_class(klass, 2,
+                state_function)
+
+        start = [Apple(apples=1), Pear(pears=2), Apple(apples=3), Pear()]
+        for protocol in [0, 2]:
+            end = sweet_pickle.loads(sweet_pickle.dumps(start, protocol))
+            for obj in end:
+                self.assertEqual(True, isinstance(obj, Fruit))
+            self.assertEqual([1, 20, 3, 10], [obj.count for obj in end])
+
+
     ### protected interface ##################################################
 
     def _assertAttributes(self, obj, suffix, values):
@@ -15,7 +15,8 @@
 import logging
 
 # Enthought library imports
-from traits.api import Dict, HasPrivateTraits, Int, List, Tuple, Str
+from traits.api import Dict, HasPrivateTraits, Instance, Int, List, Tuple, \
+    Str
 
 
 logger = logging.getLogger(__name__)
@@ -48,7 +49,10 @@ class Updater(HasPrivateTraits):
     # The keys are a tuple of the class's module name, class name, and version
     # in that order.  The values are a list of functions to be called during
     # unpickling to do the state conversion.   Note that the version in the
-    # key represents the version that the function converts *TO*.
+    # key represents the version that the function converts *TO*.  A list
+    # changed in place is used by later unpicklings, but the functions of a
+    # key registered with an empty list must be added with
+    # 'add_state_function' to be found.
     state_functions = Dict(Tuple(Str, Str, Int), List)
 
     # Our record of the attribute that records the version number for a
@@ -72,6 +76,19 @@ class Updater(HasPrivateTraits):
     # order.  The values are reference counts.
     _state_function_classes = Dict(Tuple(Str, Str), Int)
 
+    # The classes found by the unpicklers using this updater.
+    #
+    # The keys are a tuple of the module and class names of a pickled class
+    # in that order.  The values are a tuple of the class it is unpickled
+    # as and whether state functions could apply to it.  This is cleared
+    # whenever our mappings or state functions change.
+    _class_cache = Instance(dict, ())
+
+    # The state function chains built by 'get_state_chain', by the module
+    # and class names of the class they start from.  This is cleared
+    # whenever our mappings or state functions change.
+    _state_chain_cache = Instance(dict, ())
+
 
     ##########################################################################
     # 'Updater' interface
@@ -86,6 +103,7 @@ class Updater(HasPrivateTraits):
         """
         self.class_map[(source_module, source_name)] = (target_module,
             target_name)
+        self._clear_caches()
 
 
     def add_mapping_to_class(self, source_module, source_name, target_class):
@@ -119,6 +137,7 @@ class Updater(HasPrivateTraits):
                        # changes by list instance - not its contents.
         list.append(function)
         self.state_functions[key] = list
+        self._clear_caches()
 
 
     def add_state_function_for_class(self, klass, target_version, function):
@@ -135,6 +154,7 @@ class Updater(HasPrivateTraits):
             class within the specified module with the specified name.
         """
         self.version_attribute_map[(module, name)] = attribute_name
+        self._clear_caches()
 
 
     def declare_version_attribute_for_class(self, klass, attribute_name):
@@ -160,6 +180,57 @@ class Updater(HasPrivateTraits):
         return (module, name) in self.class_map
 
 
+    def get_cached_class(self, module, name):
+        """ Returns the tuple of the class that the class identified by the
+            specified module and class name was unpickled as and whether
+            state functions could apply to it, as recorded by
+            'set_cached_class', or None.
+        """
+        return self._class_cache.get((module, name))
+
+
+    def set_cached_class(self, module, name, klass, has_state_function):
+        """ Records the class that the class identified by the specified
+            module and class name is unpickled as, until our mappings or
+            state functions change.
+        """
+        self._class_cache[(module, name)] = (klass, has_state_function)
+
+
+    def get_state_chain(self, module, name):
+        """ Returns the steps of the conversion of the state of an instance
+            of the class identified by the specified module and class name.
+
+            There is one step for that class and one for each class it is
+            mapped to in turn.  Each step is a tuple of the module name,
+            class name, and version attribute of the class, and of a
+            dictionary of the lists of state functions converting *TO* each
+            version of the class.  These are the lists of 'state_functions',
+            so that changing one of them in place, which traits does not
+            notify us of, still applies.
+        """
+        key = (module, name)
+        chain = self._state_chain_cache.get(key)
+        if chain is None:
+            chain = []
+            visited = set()
+            while (module, name) not in visited:
+                visited.add((module, name))
+                functions = {}
+                for (m, n, version), value in self.state_functions.items():
+                    if m == module and n == name:
+                        functions[version] = value
+                chain.append((module, name,
+                    self.get_version_attribute(module, name), functions))
+                if not self.has_class_mapping(module, name):
+                    break
+                module, name = self.class_map[(module, name)]
+
+            chain = self._state_chain_cache[key] = tuple(chain)
+
+        return chain
+
+
     def has_state_function(self, module, name):
         """ Returns True if this updater contains any state functions for
             the class identified by the specified module and class name.
@@ -186,15 +257,28 @@ class Updater(HasPrivateTraits):
                 funcs.extend(value)
                 self.state_functions[key] = funcs
 
+        self._clear_caches()
+
+
+    ### protected interface ##################################################
+
+    def _clear_caches(self):
+        """ Forgets what was derived from our mappings and state functions.
+        """
+        self._class_cache.clear()
+        self._state_chain_cache.clear()
+
 
     ### trait handlers #######################################################
 
     def _class_map_changed(self, old, new):
+        self._clear_caches()
         logger.debug('Detected class_map change from [%s] to [%s] in [%s]',
             old, new, self)
 
 
     def _class_map_items_changed(self, event):
+        self._clear_caches()
         for o in event.removed:
             logger.debug('Detected [%s] removed from class_map in [%s]', o,
                 self)
@@ -207,6 +291,7 @@ class Updater(HasPrivateTraits):
 
 
     def _state_functions_changed(self, old, new):
+        self._clear_caches()
         logger.debug('Detected state_functions changed from [%s] to [%s] ' + \
             'in [%s]', old, new, self)
 
@@ -222,6 +307,8 @@ class Updater(HasPrivateTraits):
 
 
     def _state_functions_items_changed(self, event):
+        self._clear_caches()
+
         # Decrement our reference counts for the classes we no longer
         # have state functions for.  If the reference count reaches zero,
         # remove the record completely.
@@ -284,11 +371,13 @@ class Updater(HasPrivateTraits):
 
 
     def _version_attribute_map_changed(self, old, new):
+        self._clear_caches()
         logger.debug('Detected version_attribute_map change from [%s] ' + \
             'to [%s] in [%s]', old, new, self)
 
 
     def _version_attribute_map_items_changed(self, event):
+        self._clear_caches()
         for o in event.removed:
             logger.debug('Detected [%s] removed from version_attribute_map ' + \
                 'in [%s]', o, self)
@@ -19,15 +19,20 @@ state of other objects in the same pickle.
 # Standard library imports.
 import sys
 import logging
+from copy_reg import _inverted_registry
+from io import BytesIO
 from os import path
-from types import GeneratorType
+from types import ClassType, GeneratorType
 
 if sys.version_info[0] >= 3:
     from pickle import _Unpickler as Unpickler
 else:
     from pickle import Unpickler
 
-from pickle import UnpicklingError, BUILD
+from cPickle import Unpickler as _CUnpickler
+
+from pickle import UnpicklingError, BUILD, INST, OBJ, NEWOBJ, REDUCE
+from pickletools import genops
 
 # Enthought library imports
 from traits.api import HasTraits, Instance
@@ -41,34 +46,11 @@ logger = logging.getLogger(__name__)
 # constants
 ##############################################################################
 
-# The name we backup the original setstate method to.
-_BACKUP_NAME = '__enthought_sweet_pickle_original_setstate__'
-
-# The name of the setstate method we hook
+# The name of the setstate method of the classes.
 _SETSTATE_NAME = '__setstate__'
 
-# The name we store our unpickling data under.
-_UNPICKLER_DATA = '__enthought_sweet_pickle_unpickler__'
-
-
-##############################################################################
-# function '__replacement_setstate__'
-##############################################################################
-
-def __replacement_setstate__(self, state):
-    """ Called to enable an unpickler to modify the state of this instance.
-    """
-    # Retrieve the unpickling information and use it to let the unpickler
-    # modify our state.
-    unpickler, module, name = getattr(self, _UNPICKLER_DATA)
-    state = unpickler.modify_state(self, state, module, name)
-
-    # If we were given a state, apply it to this instance now.
-    if state is not None:
-
-        # Save our state
-        logger.debug('Final state: %s', state)
-        self.__dict__.update(state)
+# The types of classes.
+_CLASS_TYPES = (type, ClassType)
 
 
 ##############################################################################
@@ -176,7 +158,14 @@ class NewUnpickler(Unpickler):
         # Just save the instance in the list of objects.
         if isinstance(obj, NewUnpickler):
             obj.objects.append(obj.stack[-2])
-        Unpickler.load_build(obj)
+            obj.build_instance()
+        else:
+            Unpickler.load_build(obj)
+
+    def build_instance(self):
+        """ Sets the state on top of the stack on the instance below it.
+        """
+        Unpickler.load_build(self)
 
 
 ##############################################################################
@@ -217,6 +206,17 @@ class VersionedUnpickler(NewUnpickler, HasTraits):
         super(VersionedUnpickler, self).__init__(file)
 
         self._file = file
+
+        # The module and class names that the classes whose state our updater
+        # may modify were pickled as.  Several pickled classes may map to the
+        # same class, so these are kept, by class, as a stack of the names of
+        # the references to the class pushed on the unpickler's stack (None
+        # for a class pickled without state functions).  Creating an instance
+        # consumes the top one, and records it for the instance, by id.
+        self._class_origins = {}
+        self._instance_origins = {}
+        self.memo = _OriginMemo(self._class_origins)
+
         if self.updater is None:
             from global_registry import get_global_registry
             self.updater = get_global_registry()
@@ -255,6 +255,15 @@ class VersionedUnpickler(NewUnpickler, HasTraits):
         module = module.strip()
         name = name.strip()
 
+        # Use what we found for this class before, unless the updater
+        # changed since.
+        if self.updater is not None:
+            cached = self.updater.get_cached_class(module, name)
+            if cached is not None:
+                klass, has_state_function = cached
+                self._push_origin(klass, has_state_function, module, name)
+                return klass
+
         # Attempt to find the class, this may cause a new mapping for that
         # very class to be introduced.  That's why we ignore the result.
         try:
@@ -286,13 +295,80 @@ class VersionedUnpickler(NewUnpickler, HasTraits):
 
         # Make sure we run the updater's state functions if any are declared
         # for the target class.
-        if self.updater is not None \
-            and self._has_state_function(original_module, original_name):
-            self._add_unpickler(klass, original_module, original_name)
+        if self.updater is not None:
+            has_state_function = self._has_state_function(original_module,
+                original_name)
+            self._push_origin(klass, has_state_function, original_module,
+                original_name)
+            self.updater.set_cached_class(original_module, original_name,
+                klass, has_state_function)
 
         return klass
 
 
+    ### protected interface ##################################################
+
+    def _load_instance(self, load):
+        """ Runs the specified load method of an opcode creating an
+            instance, and records the names the class of the instance was
+            pickled as if our updater may modify its state.
+        """
+        load(self)
+        obj = self.stack[-1]
+        origins = self._class_origins.get(getattr(obj, '__class__', None))
+        if origins:
+            origin = origins.pop()
+            if origin is not None:
+                self._instance_origins[id(obj)] = (obj, origin)
+
+    # Record the origin of the instances created by these opcodes.
+    dispatch = Unpickler.dispatch.copy()
+    for opcode in [INST, OBJ, NEWOBJ, REDUCE]:
+        dispatch[opcode[0]] = \
+            lambda self, load=dispatch[opcode[0]]: self._load_instance(load)
+    del opcode
+
+
+    ##########################################################################
+    # 'NewUnpickler' interface
+    ##########################################################################
+
+    ### public interface #####################################################
+
+    def load(self, max_pass=-1):
+        """ Read a pickled object representation from the open file.
+
+            Overridden here to forget the origins of the unpickled classes
+            and instances once done.
+        """
+        try:
+            return super(VersionedUnpickler, self).load(max_pass)
+        finally:
+            self._class_origins.clear()
+            self._instance_origins.clear()
+
+
+    def build_instance(self):
+        """ Sets the state on top of the stack on the instance below it.
+
+            Overridden here to let our updater modify the state first.
+        """
+        stack = self.stack
+        source = self._instance_origins.pop(id(stack[-2]), None)
+        if source is not None:
+            obj, origin = source
+            state = self.modify_state(obj, stack.pop(), *origin)
+
+            # If the instance has no setstate method, apply the state the
+            # standard way.
+            if state is None:
+                return
+            logger.debug('Final state: %s', state)
+            stack.append(state)
+
+        Unpickler.load_build(self)
+
+
     ##########################################################################
     # 'VersionedUnpickler' interface
     ##########################################################################
@@ -304,36 +380,38 @@ class VersionedUnpickler(NewUnpickler, HasTraits):
             the class of the specified name within the specified module, to
             complete the unpickling of the specified object.
         """
-        # Remove our setstate hook and associated data to ensure that
-        # instances unpickled through some other framework don't call us.
-        # IMPORTANT: Do this first to minimize the time this hook is in place!
-        self._remove_unpickler(obj.__class__)
-
         # Determine what class and version we're starting from and going to.
         # If there is no version information, then assume version 0. (0 is
         # like an unversioned version.)
-        source_key = self.updater.get_version_attribute(module, name)
-        source_version = state.get(source_key, 0)
-        target_key = self.updater.get_version_attribute(
-            obj.__class__.__module__, obj.__class__.__name__)
+        chain = self.updater.get_state_chain(module, name)
+        source_version = state.get(chain[0][2], 0)
+        klass = obj.__class__
+        target_key = chain[-1][2]
+        if chain[-1][:2] != (klass.__module__, klass.__name__):
+            target_key = self.updater.get_version_attribute(klass.__module__,
+                klass.__name__)
         target_version = getattr(obj, target_key, 0)
 
         # Iterate through all the updates to the state by going one version
         # at a time.  Note that we assume there is exactly one path from our
         # starting class and version to our ending class and version.  As a
         # result, we assume we update a given class to its latest version
-        # before looking for any class mappings.  Note that the version in the
-        # updater is the version to convert *TO*.
+        # before moving to the next class of the chain of mappings.  Note
+        # that the version in the updater is the version to convert *TO*.
+        # The chain is built by the updater once per class.
         version = source_version
-        next_version = version + 1
-        while True:
+        for i, (module, name, key, functions) in enumerate(chain):
+            if i > 0:
+                # We explicitly keep the version number the same when
+                # moving to the next class in the chain.
+                logger.debug('Modifying state from [%s.%s (v.%s)] to ' + \
+                    '[%s.%s (v.%s)]', chain[i-1][0], chain[i-1][1], version,
+                    module, name, version)
 
             # Iterate through all version updates for the current class.
-            key = self.updater.get_version_attribute(module, name)
-            while (module, name, next_version) in self.updater.state_functions:
-                functions = self.updater.state_functions[(module, name,
-                    next_version)]
-                for f in functions:
+            next_version = version + 1
+            while next_version in functions:
+                for f in functions[next_version]:
                     logger.debug('Modifying state from [%s.%s (v.%s)] to ' + \
                         '[%s.%s (v.%s)] using function %s', module, name,
                         version, module, name, next_version, f)
@@ -346,17 +424,6 @@ class VersionedUnpickler(NewUnpickler, HasTraits):
                 version = new_version
                 next_version = version + 1
 
-            # If there is one, move to the next class in the chain.  (We
-            # explicitly keep the version number the same.)
-            if self.updater.has_class_mapping(module, name):
-                original_module, original_name = module, name
-                module, name = self.updater.class_map[(module, name)]
-                logger.debug('Modifying state from [%s.%s (v.%s)] to ' + \
-                    '[%s.%s (v.%s)]', original_module, original_name, version,
-                    module, name, version)
-            else:
-                break
-
         # If one exists, call the final class's setstate method. According to
         # standard pickling protocol, this method will apply the state to the
         # instance so our state becomes None so that we don't try to apply our
@@ -384,31 +451,15 @@ class VersionedUnpickler(NewUnpickler, HasTraits):
 
     ### protected interface ##################################################
 
-    def _add_unpickler(self, klass, module, name):
-        """ Modifies the specified class so that our 'modify_state' method
-            is called when its next instance is unpickled.
-        """
-        logger.debug('Adding unpickler hook to [%s]', klass)
-
-        # Replace the existing setstate method with ours.
-        self._backup_setstate(klass)
-        m = __replacement_setstate__.__get__(None, klass)
-        setattr(klass, _SETSTATE_NAME, m)
-
-        # Add the information necessary to allow this unpickler to run
-        setattr(klass, _UNPICKLER_DATA, (self, module, name))
-
-
-    def _backup_setstate(self, klass):
-        """ Backs up the specified class's setstate method.
+    def _push_origin(self, klass, has_state_function, module, name):
+        """ Records a reference to the specified class, pickled within the
+            specified module and with the specified name, being pushed on the
+            unpickler's stack.
         """
-        # We only need to back it up if it actually exists.
-        method = getattr(klass, _SETSTATE_NAME, None)
-        if method is not None:
-            logger.debug('Backing up method [%s] to [%s] on [%s]',
-                _SETSTATE_NAME, _BACKUP_NAME, klass)
-            m = method.__get__(None, klass)
-            setattr(klass, _BACKUP_NAME, m)
+        if has_state_function:
+            self._class_origins.setdefault(klass, []).append((module, name))
+        elif klass in self._class_origins:
+            self._class_origins[klass].append(None)
 
 
     def _get_target_class(self, module, name):
@@ -476,35 +527,173 @@ class VersionedUnpickler(NewUnpickler, HasTraits):
         return result
 
 
-    def _remove_unpickler(self, klass):
-        """ Restores the specified class to its unmodified state.  Meaning
-            we won't get called when its next instance is unpickled.
-        """
-        logger.debug('Removing unpickler hook from [%s]', klass)
+##############################################################################
+# function 'load'
+##############################################################################
 
-        # Restore the backed up setstate method
-        self._restore_setstate(klass)
+def load(file, max_pass=-1):
+    """ Returns the object hierarchy unpickled from the specified file.
 
-        # Remove the unpickling data attached to the class.  This ensures we
-        # don't pollute the 'real' attributes of the class.
-        delattr(klass, _UNPICKLER_DATA)
+        The classes of the pickle are found first, from the opcodes naming
+        them, then the file is rewound.  Unless one of these classes has state
+        functions registered in the global registry, or needs the two-stage
+        unpickling, the pickle is then read by the C unpickler, applying the
+        class mappings of the registry.  Otherwise a VersionedUnpickler reads
+        it.  The pickle of a file that can't seek is kept in memory to be read
+        again.
+    """
+    try:
+        start = file.tell()
+    except Exception:
+        start = None
+    source = file if start is not None else _RecordingFile(file)
 
+    resolver = VersionedUnpickler(source)
+    classes = [resolver.find_class(module, name)
+               for module, name in _get_globals(source)]
+    versioned = bool(resolver._class_origins) or \
+        any(hasattr(klass, '__initialize__') for klass in classes)
 
-    def _restore_setstate(self, klass):
-        """ Restores the original setstate method back to its rightful place.
-        """
-        # We only need to restore if the backup actually exists.
-        method = getattr(klass, _BACKUP_NAME, None)
-        if method is not None:
-            logger.debug('Restoring method [%s] to [%s] on [%s]',
-                _BACKUP_NAME, _SETSTATE_NAME, klass)
-            delattr(klass, _BACKUP_NAME)
-            m = method.__get__(None, klass)
-            setattr(klass, _SETSTATE_NAME, m)
-
-        # Otherwise, we simply remove our setstate.
+    if start is not None:
+        file.seek(start)
+    else:
+        file = BytesIO(source.getvalue())
+
+    if versioned:
+        unpickler = VersionedUnpickler(file)
+        logger.debug('Unpickling [%s] with [%s]', file, unpickler)
+        return unpickler.load(max_pass)
+
+    return _c_unpickler(file, resolver.find_class).load()
+
+
+##############################################################################
+# private helpers
+##############################################################################
+
+class _OriginMemo(dict):
+    """ The memo of a VersionedUnpickler, which also remembers the origins
+        of the memoized classes whose state the updater may modify, so that
+        they are pushed again when the classes are.
+    """
+
+    def __init__(self, class_origins):
+        super(_OriginMemo, self).__init__()
+        self._class_origins = class_origins
+        self._origins = {}
+
+    def __getitem__(self, key):
+        value = super(_OriginMemo, self).__getitem__(key)
+        if key in self._origins and value in self._class_origins:
+            self._class_origins[value].append(self._origins[key])
+        return value
+
+    def __setitem__(self, key, value):
+        super(_OriginMemo, self).__setitem__(key, value)
+        if isinstance(value, _CLASS_TYPES):
+            origins = self._class_origins.get(value)
+            self._origins[key] = origins[-1] if origins else None
+        else:
+            self._origins.pop(key, None)
+
+
+class _GlobalScanner(object):
+    """ Reads a pickle from a file, recording the module and name of the
+        GLOBAL and INST opcodes.
+
+        These are the only opcodes of the binary pickles with arguments read
+        by lines, so the pickle is otherwise read at the speed of the file.
+        The name is the only line read right after another one: the other
+        lines follow the opcode they are the argument of.
+    """
+
+    def __init__(self, file):
+        self._file = file
+        self.read = file.read
+        self.globals = []
+        # The last line read, and the position of its end.
+        self._line = None
+        self._end = None
+
+    def readline(self):
+        file = self._file
+        start = file.tell()
+        line = file.readline()
+        if start == self._end:
+            self.globals.append((self._line, line[:-1]))
+            self._end = None
         else:
-            delattr(klass, _SETSTATE_NAME)
+            self._line = line[:-1]
+            self._end = start + len(line)
+        return line
+
+
+class _RecordingFile(object):
+    """ Reads from a file, keeping what was read.
+    """
+
+    def __init__(self, file):
+        self._file = file
+        self._data = []
+        self._pos = 0
+
+    def read(self, *args):
+        data = self._file.read(*args)
+        self._data.append(data)
+        self._pos += len(data)
+        return data
+
+    def readline(self, *args):
+        data = self._file.readline(*args)
+        self._data.append(data)
+        self._pos += len(data)
+        return data
+
+    def tell(self):
+        return self._pos
+
+    def getvalue(self):
+        return b''.join(self._data)
+
+
+def _get_globals(file):
+    """ Returns the (module, name) of the classes and functions named by the
+        pickle read from the specified file, in the order they first appear.
+
+        The C unpickler goes through the pickle without building any object,
+        while the names read by the GLOBAL and INST opcodes are recorded.
+        Pickles which may refer to classes by their copy_reg extension code
+        are scanned opcode by opcode instead, which is much slower.
+    """
+    if _inverted_registry:
+        found = []
+        for opcode, arg, pos in genops(file):
+            name = opcode.name
+            if name == 'GLOBAL' or name == 'INST':
+                found.append(tuple(arg.split(' ', 1)))
+            elif name.startswith('EXT'):
+                found.append(_inverted_registry[arg])
+    else:
+        scanner = _GlobalScanner(file)
+        _CUnpickler(scanner).noload()
+        found = scanner.globals
+
+    result = []
+    for key in found:
+        if key not in result:
+            result.append(key)
+
+    return result
+
+
+def _c_unpickler(file, find_class):
+    """ Returns a C unpickler reading from the specified file that finds
+        classes with the specified function.
+    """
+    unpickler = _CUnpickler(file)
+    unpickler.find_global = find_class
+
+    return unpickler
 
 
 ### EOF ######################################################################
@@ -0,0 +1,96 @@
+""" Compare `LRUCache` and `ShardedLRUCache` shared between many threads.
+
+Usage::
+
+    python benchmarks/lru_cache_contention.py [--ops N] [--size N]
+
+Each thread does the same number of get/set operations on one shared cache;
+the total throughput is reported for 1, 4, 16 and 64 threads.
+"""
+from __future__ import division, print_function
+
+import argparse
+import random
+import threading
+import time
+
+from apptools.lru_cache import LRUCache, ShardedLRUCache
+
+
+THREAD_COUNTS = (1, 4, 16, 64)
+
+
+def worker(cache, keys, barrier):
+    barrier.wait()
+    get = cache.get
+    for key in keys:
+        if get(key) is None:
+            cache[key] = key
+
+
+def measure(cache, thread_count, ops, size):
+    """ Return the throughput, in operations per second, of `thread_count`
+    threads doing `ops` operations each on `cache`.
+    """
+    barrier = _Barrier(thread_count + 1)
+    threads = []
+    for i in range(thread_count):
+        rng = random.Random(i)
+        keys = [rng.randrange(2 * size) for j in range(ops)]
+        thread = threading.Thread(target=worker, args=(cache, keys, barrier))
+        thread.start()
+        threads.append(thread)
+
+    start = time.time()
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+    return thread_count * ops / (time.time() - start)
+
+
+class _Barrier(object):
+    """ A minimal `threading.Barrier`, which Python 2 does not have. """
+
+    def __init__(self, parties):
+        self._parties = parties
+        self._count = 0
+        self._condition = threading.Condition()
+
+    def wait(self):
+        with self._condition:
+            self._count += 1
+            if self._count == self._parties:
+                self._condition.notify_all()
+            while self._count < self._parties:
+                self._condition.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--ops', type=int, default=20000,
+                        help='number of operations per thread')
+    parser.add_argument('--size', type=int, default=1000,
+                        help='number of entries kept by the caches')
+    parser.add_argument('--shards', type=int, default=16,
+                        help='number of segments of the sharded cache')
+    args = parser.parse_args()
+
+    factories = [
+        ('LRUCache', lambda: LRUCache(args.size)),
+        ('ShardedLRUCache',
+         lambda: ShardedLRUCache(args.size, shards=args.shards)),
+    ]
+    header = '{0:<18}'.format('threads') + ''.join(
+        '{0:>14}'.format(count) for count in THREAD_COUNTS)
+    print(header)
+    for name, factory in factories:
+        row = '{0:<18}'.format(name)
+        for count in THREAD_COUNTS:
+            ops_per_second = measure(factory(), count, args.ops, args.size)
+            row += '{0:>14,.0f}'.format(ops_per_second)
+        print(row)
+    print('(total get/set operations per second)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+""" Compare the hit rates of the `LRUCache` eviction policies on a trace.
+
+Usage::
+
+    python benchmarks/lru_cache_policies.py [--trace FILE] [--size N]
+
+The trace is a recorded access log with one key per line.  Without one, a
+synthetic trace is used: lookups of a skewed working set interrupted by
+sequential scans over keys which are never used again.
+"""
+from __future__ import division, print_function
+
+import argparse
+import random
+import time
+
+from apptools.lru_cache import LRUCache
+from apptools.lru_cache.eviction_policy import POLICIES
+
+
+def read_trace(filename):
+    with open(filename) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def synthetic_trace(length, working_set, scan_length, scan_every, seed=0):
+    rng = random.Random(seed)
+    trace = []
+    scan_start = 0
+    while len(trace) < length:
+        for i in range(scan_every):
+            # A skewed distribution: low keys are much more frequent.
+            trace.append('hot-{0}'.format(
+                int(working_set * rng.random() ** 3)))
+        trace.extend('scan-{0}'.format(scan_start + i)
+                     for i in range(scan_length))
+        scan_start += scan_length
+    return trace[:length]
+
+
+def replay(trace, size, policy):
+    """ Return the hit rate of the trace and the time it took. """
+    cache = LRUCache(size, policy=policy)
+    start = time.time()
+    for key in trace:
+        if cache.get(key) is None:
+            cache[key] = True
+    elapsed = time.time() - start
+    return cache.hits / (cache.hits + cache.misses), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--trace', help='access log, one key per line')
+    parser.add_argument('--size', type=int, default=500,
+                        help='number of entries kept by the cache')
+    parser.add_argument('--length', type=int, default=50000,
+                        help='length of the synthetic trace')
+    args = parser.parse_args()
+
+    if args.trace:
+        trace = read_trace(args.trace)
+    else:
+        trace = synthetic_trace(args.length, working_set=2 * args.size,
+                                scan_length=2 * args.size, scan_every=5000)
+
+    print('{0} accesses, {1} distinct keys, cache size {2}'.format(
+        len(trace), len(set(trace)), args.size))
+    print('{0:<8}{1:>10}{2:>10}'.format('policy', 'hit rate', 'time (s)'))
+    for policy in sorted(POLICIES):
+        hit_rate, elapsed = replay(trace, args.size, policy)
+        print('{0:<8}{1:>10.2%}{2:>10.2f}'.format(policy, hit_rate, elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+""" Compare the get/set throughput of `LRUCache` and `FastLRUCache`.
+
+Usage::
+
+    python benchmarks/lru_cache_throughput.py [--ops N] [--size N]
+
+The workload is a mix of hits and misses drawn from a key space twice as
+large as the cache, so that the cache keeps evicting entries.
+"""
+from __future__ import division, print_function
+
+import argparse
+import random
+import timeit
+
+from apptools.lru_cache import FastLRUCache, LRUCache
+
+
+def make_keys(ops, size, seed=0):
+    rng = random.Random(seed)
+    return [rng.randrange(2 * size) for i in range(ops)]
+
+
+def run_sets(cache, keys):
+    for key in keys:
+        cache[key] = key
+
+
+def run_gets(cache, keys):
+    get = cache.get
+    for key in keys:
+        get(key)
+
+
+def measure(cache_class, keys, size, repeat):
+    """ Return the best (set, get) throughput in operations per second. """
+    results = []
+    for func in (run_sets, run_gets):
+        best = None
+        for i in range(repeat):
+            cache = cache_class(size)
+            if func is run_gets:
+                run_sets(cache, keys)
+            elapsed = timeit.timeit(lambda: func(cache, keys), number=1)
+            best = elapsed if best is None else min(best, elapsed)
+        results.append(len(keys) / best)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--ops', type=int, default=100000,
+                        help='number of operations per run')
+    parser.add_argument('--size', type=int, default=1000,
+                        help='number of entries kept by the caches')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of runs, the best one is reported')
+    args = parser.parse_args()
+
+    keys = make_keys(args.ops, args.size)
+    print('{0:<14}{1:>16}{2:>16}'.format('cache', 'set ops/s', 'get ops/s'))
+    for cache_class in (LRUCache, FastLRUCache):
+        sets, gets = measure(cache_class, keys, args.size, args.repeat)
+        print('{0:<14}{1:>16,.0f}{2:>16,.0f}'.format(
+            cache_class.__name__, sets, gets))
+
+
+if __name__ == '__main__':
+    main()
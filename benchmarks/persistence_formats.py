@@ -0,0 +1,282 @@
+""" Compare the persistence formats of apptools on a HasTraits object graph.
+
+Usage::
+
+    python benchmarks/persistence_formats.py [--depth N] [--width N]
+        [--array-size N] [--formats NAME [NAME ...]] [--output FORMAT]
+
+The graph is a tree of `Node` objects, `--width` children per node and
+`--depth` levels below the root.  Each node holds an array of
+`--array-size` floats and a reference to its parent's first child, so the
+graph has shared references.  For each format the best dump and load time,
+the peak memory used while dumping and loading and the size of the dump are
+reported.  A format that fails on the graph reports its error instead.  `--output json` or
+`--output csv` gives machine-readable results to track regressions.
+
+The formats are:
+
+- `pickle`: the standard library's (c)pickle at its highest protocol.
+- `sweet_pickle`: `apptools.sweet_pickle.dumps` and `loads`.
+- `state_pickler`: `apptools.persistence.state_pickler.dumps`, then
+  `loads_state` and `set_state` on a new graph of the same shape to load,
+  as applications restore the state of their objects.  The new graph is
+  built before the load is timed.
+- `spickle`: a protocol 2 pickle loaded as a state with
+  `apptools.persistence.spickle.loads_state` (Python 2 only).
+
+The peak memory is measured in a forked child process, for each dump and
+load: it is how much the peak resident memory of the child grows while it
+runs.  Memory the allocator reuses without asking the system is not seen,
+so the numbers are lower bounds.  They are not available where processes
+can't be forked (Windows).
+"""
+from __future__ import division, print_function
+
+import argparse
+import csv
+import json
+import os
+import sys
+import timeit
+import traceback
+
+import numpy
+
+from traits.api import Array, Float, HasTraits, Instance, List, Str
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# The unit of `ru_maxrss`, in bytes.
+MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+class Node(HasTraits):
+    name = Str
+    value = Float
+    data = Array(dtype=float)
+    children = List(Instance('Node'))
+    peer = Instance('Node')
+
+
+def make_graph(depth, width, array_size):
+    """ Return the root of a tree of `Node` with shared references. """
+    root = Node(name='root', data=numpy.random.random(array_size))
+    level = [root]
+    for i in range(depth):
+        next_level = []
+        for parent in level:
+            parent.children = [
+                Node(name='node {0}.{1}'.format(i, j), value=j,
+                     data=numpy.random.random(array_size))
+                for j in range(width)
+            ]
+            for child in parent.children:
+                child.peer = parent.children[0]
+            next_level.extend(parent.children)
+        level = next_level
+    return root
+
+
+def count_nodes(node):
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children)
+    return count
+
+
+def get_formats(depth, width):
+    """ Return a dict of (dump, load, setup) functions by name, and the
+    names of the formats that can't be imported.
+
+    `load` is called with the dump and, if `setup` is not None, with what
+    `setup()` returns.
+    """
+    formats = {
+        'pickle': (lambda obj: pickle.dumps(obj, pickle.HIGHEST_PROTOCOL),
+                   pickle.loads, None),
+    }
+    missing = []
+
+    try:
+        from apptools import sweet_pickle
+    except ImportError:
+        missing.append('sweet_pickle')
+    else:
+        formats['sweet_pickle'] = (sweet_pickle.dumps, sweet_pickle.loads,
+                                   None)
+
+    try:
+        from apptools.persistence import state_pickler
+    except ImportError:
+        missing.append('state_pickler')
+    else:
+        def load(data, obj):
+            state = state_pickler.loads_state(data)
+            state_pickler.set_state(obj, state)
+            return obj
+        formats['state_pickler'] = (state_pickler.dumps, load,
+                                    lambda: make_graph(depth, width, 0))
+
+    try:
+        from apptools.persistence import spickle
+    except ImportError:
+        missing.append('spickle')
+    else:
+        formats['spickle'] = (lambda obj: pickle.dumps(obj, 2),
+                              spickle.loads_state, None)
+
+    return formats, missing
+
+
+def best_time(function, repeat, setup=None):
+    """ Return the best time of `repeat` calls of `function`, not counting
+    the calls of `setup`.
+    """
+    times = []
+    for i in range(repeat):
+        args = () if setup is None else (setup(),)
+        start = timeit.default_timer()
+        function(*args)
+        times.append(timeit.default_timer() - start)
+    return min(times)
+
+
+def peak_memory(function, setup=None):
+    """ Return by how many bytes the peak resident memory of a child
+    process grows while it calls `function`, or None where processes can't
+    be forked.
+    """
+    if resource is None or not hasattr(os, 'fork'):
+        return None
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # The child process: it must never return from here.
+        status = 1
+        try:
+            os.close(read_end)
+            args = () if setup is None else (setup(),)
+            before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            function(*args)
+            after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            os.write(write_end, str(after - before).encode('ascii'))
+            status = 0
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            os._exit(status)
+
+    os.close(write_end)
+    with os.fdopen(read_end, 'rb') as output:
+        growth = output.read()
+    os.waitpid(pid, 0)
+    if not growth:
+        raise RuntimeError('the child process measuring the memory failed')
+    return int(growth) * MAXRSS_UNIT
+
+
+def measure(graph, dump, load, setup, repeat):
+    """ Return the measurements of a format as a dict. """
+    data = dump(graph)
+    return {
+        'dump_seconds': best_time(lambda: dump(graph), repeat),
+        'load_seconds': best_time(lambda *args: load(data, *args), repeat,
+                                  setup),
+        'dump_peak_bytes': peak_memory(lambda: dump(graph)),
+        'load_peak_bytes': peak_memory(lambda *args: load(data, *args),
+                                       setup),
+        'size_bytes': len(data),
+    }
+
+
+FIELDS = ['format', 'nodes', 'dump_seconds', 'load_seconds',
+          'dump_peak_bytes', 'load_peak_bytes', 'size_bytes', 'error']
+
+
+def print_table(results):
+    print('{0:<15}{1:>12}{2:>12}{3:>14}{4:>14}{5:>14}'.format(
+        'format', 'dump s', 'load s', 'dump peak MB', 'load peak MB',
+        'size MB'))
+    mb = lambda value: 'n/a' if value is None else '{0:.2f}'.format(
+        value / 2**20)
+    for result in results:
+        if result['error'] is not None:
+            print('{0:<15}failed: {1}'.format(result['format'],
+                                              result['error']))
+            continue
+        print('{0:<15}{1:>12.3f}{2:>12.3f}{3:>14}{4:>14}{5:>14}'.format(
+            result['format'], result['dump_seconds'],
+            result['load_seconds'], mb(result['dump_peak_bytes']),
+            mb(result['load_peak_bytes']), mb(result['size_bytes'])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--depth', type=int, default=3,
+                        help='number of levels below the root')
+    parser.add_argument('--width', type=int, default=8,
+                        help='number of children of each node')
+    parser.add_argument('--array-size', type=int, default=1000,
+                        help='number of elements of the array of each node')
+    parser.add_argument('--formats', nargs='+',
+                        help='formats to compare, all available by default')
+    parser.add_argument('--output', choices=['table', 'json', 'csv'],
+                        default='table', help='format of the results')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of runs, the best one is reported')
+    args = parser.parse_args()
+
+    formats, missing = get_formats(args.depth, args.width)
+    names = args.formats or sorted(formats)
+    for name in names:
+        if name not in formats:
+            if name in missing:
+                parser.error('format {0!r} is not available'.format(name))
+            parser.error('unknown format {0!r}'.format(name))
+    if missing and not args.formats:
+        print('skipping unavailable formats: {0}'.format(', '.join(missing)),
+              file=sys.stderr)
+
+    graph = make_graph(args.depth, args.width, args.array_size)
+    nodes = count_nodes(graph)
+    results = []
+    for name in names:
+        dump, load, setup = formats[name]
+        try:
+            result = measure(graph, dump, load, setup, args.repeat)
+        except Exception as e:
+            result = dict.fromkeys(FIELDS)
+            result['error'] = '{0}: {1}'.format(type(e).__name__, e)
+        else:
+            result['error'] = None
+        result['format'] = name
+        result['nodes'] = nodes
+        results.append(result)
+
+    if args.output == 'json':
+        json.dump({'depth': args.depth, 'width': args.width,
+                   'array_size': args.array_size, 'results': results},
+                  sys.stdout, indent=2, sort_keys=True)
+        print()
+    elif args.output == 'csv':
+        writer = csv.DictWriter(sys.stdout, FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+    else:
+        print('{0} nodes'.format(nodes))
+        print_table(results)
+
+
+if __name__ == '__main__':
+    main()
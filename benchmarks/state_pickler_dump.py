@@ -0,0 +1,66 @@
+""" Measure the dump throughput of `StatePickler`.
+
+Usage::
+
+    python benchmarks/state_pickler_dump.py [--nodes N] [--repeat N]
+
+Two graphs of about the same number of nodes are dumped: a wide one (a list
+of small instances) and a deep one (a linked chain of instances, far deeper
+than the recursion limit).
+"""
+from __future__ import division, print_function
+
+import argparse
+import timeit
+
+from apptools.persistence.state_pickler import StatePickler
+
+
+class Node(object):
+
+    def __init__(self, index):
+        self.index = index
+        self.name = 'node'
+        self.pair = (index, 1.5)
+        self.next = None
+
+
+def make_wide(nodes):
+    return [Node(i) for i in range(nodes)]
+
+
+def make_deep(nodes):
+    head = node = Node(0)
+    for i in range(1, nodes):
+        node.next = Node(i)
+        node = node.next
+    return head
+
+
+def measure(graph, repeat):
+    """ Return the best time taken to get the state of `graph`. """
+    best = None
+    for i in range(repeat):
+        elapsed = timeit.timeit(lambda: StatePickler().dump_state(graph),
+                                number=1)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--nodes', type=int, default=20000,
+                        help='number of instances in each graph')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of runs, the best one is reported')
+    args = parser.parse_args()
+
+    print('{0:<8}{1:>12}{2:>16}'.format('graph', 'seconds', 'nodes/s'))
+    for name, make in (('wide', make_wide), ('deep', make_deep)):
+        elapsed = measure(make(args.nodes), args.repeat)
+        print('{0:<8}{1:>12.3f}{2:>16,.0f}'.format(
+            name, elapsed, args.nodes / elapsed))
+
+
+if __name__ == '__main__':
+    main()